@@ -0,0 +1,9 @@
+"""
+Benchmarks for xcfg.  Run from the top of the source tree, e.g.:
+
+    python -m bench.read
+    python -m bench.startup
+    python -m bench.mapped
+    python -m bench.scaling
+    python -m bench.suite -o results.json
+"""
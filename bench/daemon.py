@@ -0,0 +1,75 @@
+"""
+Compare cold xcfg command lines with the same command lines run by the xcfg
+daemon: through the xcfgc client (interpreter start included, as in a login
+script), and as bare round trips on the socket.
+
+    python -m bench.daemon [nodes [runs]]
+"""
+
+import os
+import sys
+import time
+import socket
+import tempfile
+import subprocess
+
+from bench import synth
+
+import xcfgc
+
+NODES = 1000
+RUNS  = 20
+
+TOP   = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def timed(fn, runs):
+    " Mean seconds per call of fn over runs calls "
+    t0 = time.time()
+    for n in range(runs):
+        fn()
+    return (time.time() - t0) / runs
+
+def quiet(argv):
+    devnull = open(os.devnull, "w")
+    try:
+        subprocess.check_call(argv, stdout=devnull, stderr=devnull)
+    finally:
+        devnull.close()
+
+def main(nodes, runs):
+    tmpdir   = tempfile.mkdtemp(prefix="xcfg-bench-")
+    filename = os.path.join(tmpdir, "synth-%d.xcfg" % nodes)
+    sockname = os.path.join(tmpdir, "xcfg.sock")
+    synth.generate_file(filename, nodes)
+    args     = ["load:" + filename, "p"]
+    env      = dict(os.environ, PYLOG="ERROR")
+    daemon   = subprocess.Popen([sys.executable, os.path.join(TOP, "xcfg.py"), "daemon=" + sockname], env=env)
+    try:
+        while not os.path.exists(sockname):
+            time.sleep(0.01)
+        os.environ["XCFG_SOCKET"] = sockname
+        os.environ["PYLOG"]       = "ERROR"
+        xcfgc.request(args) # warm up, parses the file once
+
+        cold   = timed(lambda: quiet([sys.executable, os.path.join(TOP, "xcfg.py")] + args), runs)
+        client = timed(lambda: quiet([sys.executable, os.path.join(TOP, "xcfgc.py")] + args), runs)
+        trip   = timed(lambda: xcfgc.request(args), runs)
+
+        print "%10s %12s %12s" % ("nodes", "path", "ms/call")
+        print "%10d %12s %12.2f" % (nodes, "cold", cold * 1000)
+        print "%10d %12s %12.2f" % (nodes, "xcfgc", client * 1000)
+        print "%10d %12s %12.2f" % (nodes, "roundtrip", trip * 1000)
+    finally:
+        daemon.terminate()
+        daemon.wait()
+        os.remove(filename)
+        os.rmdir(tmpdir)
+
+if __name__ == '__main__':
+    nodes = NODES
+    runs  = RUNS
+    if len(sys.argv) > 1:
+        nodes = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        runs  = int(sys.argv[2])
+    main(nodes, runs)
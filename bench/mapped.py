@@ -0,0 +1,86 @@
+"""
+Memory per host with many worker processes reading the same config: each
+worker either builds its own dictionary (xcfg2dict) or opens the shared map
+(mapped), looks up every key, and reports its proportional set size (PSS,
+shared pages divided between the processes sharing them) while all the
+workers are still alive.  Linux only (/proc/self/smaps_rollup).
+
+    python -m bench.mapped [keys [workers,...]]
+"""
+
+import os
+import sys
+import tempfile
+import subprocess
+
+from bench import synth
+
+KEYS    = 100000
+WORKERS = [1, 8, 32]
+
+TOP     = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD   = """
+import sys, logging
+logging.disable(logging.ERROR)
+sys.path.insert(0, %r)
+import xcfg
+(how, filename) = (%r, %r)
+if how == "dict":
+    d = xcfg.xcfg2dict(filename)
+else:
+    d = xcfg.mapped(filename)
+for k in d.keys():
+    d[k]
+print "ready"
+sys.stdout.flush()
+sys.stdin.readline()
+pss = [l for l in open("/proc/self/smaps_rollup") if l.startswith("Pss:")][0].split()[1]
+print pss
+sys.stdout.flush()
+sys.stdin.read()
+"""
+
+def host_kb(how, filename, workers):
+    " Total PSS in KB of workers processes reading filename the way how says "
+    procs = [subprocess.Popen([sys.executable, "-c", CHILD % (TOP, how, filename)],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE) for n in range(workers)]
+    try:
+        for p in procs:
+            p.stdout.readline()             # all loaded and alive
+        for p in procs:
+            p.stdin.write("go\n")
+            p.stdin.flush()
+        return sum([int(p.stdout.readline()) for p in procs])
+    finally:
+        for p in procs:
+            p.stdin.close()
+            p.wait()
+
+def main(keys, counts):
+    tmpdir   = tempfile.mkdtemp(prefix="xcfg-bench-")
+    filename = os.path.join(tmpdir, "workload.xcfg")
+    synth.workload_file(filename, keys=keys)
+    try:
+        import logging
+        logging.disable(logging.ERROR)
+        sys.path.insert(0, TOP)
+        import xcfg
+        xcfg.compile_map(filename)
+        print "%8s %8s %14s %14s" % ("keys", "workers", "xcfg2dict_kb", "mapped_kb")
+        for workers in counts:
+            print "%8d %8d %14d %14d" % (keys, workers, host_kb("dict", filename, workers),
+                                         host_kb("map", filename, workers))
+    finally:
+        for name in os.listdir(tmpdir):
+            os.remove(os.path.join(tmpdir, name))
+        os.rmdir(tmpdir)
+
+if __name__ == '__main__':
+    keys   = KEYS
+    counts = WORKERS
+    if len(sys.argv) > 1:
+        keys   = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        counts = [int(n) for n in sys.argv[2].split(",")]
+    main(keys, counts)
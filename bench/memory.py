@@ -0,0 +1,68 @@
+"""
+Memory per element of a loaded config, AdvancedConfig against CompactConfig.
+Each measurement runs in a fresh interpreter and holds the loaded tree while
+the resident set size is read.
+
+    python -m bench.memory [nodes ...]
+"""
+
+import os
+import gc
+import sys
+import resource
+import tempfile
+import subprocess
+
+from bench import synth
+
+SIZES = [10000, 100000]
+TYPES = ["AdvancedConfig", "CompactConfig"]
+
+def rss():
+    " Current resident set size in bytes "
+    try:
+        fh = open("/proc/self/statm")
+        try:
+            return int(fh.read().split()[1]) * resource.getpagesize()
+        finally:
+            fh.close()
+    except IOError: # no /proc, peak is the best we have
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def child(nodetype, filename):
+    " Load filename into nodetype and print the bytes it holds "
+    import logging
+    logging.disable(logging.ERROR)
+    import xcfg
+    gc.collect()
+    before = rss()
+    cfg    = getattr(xcfg, nodetype)(filename)
+    gc.collect()
+    print rss() - before
+
+def run(nodetype, filename):
+    out = subprocess.Popen([sys.executable, "-m", "bench.memory", "--child", nodetype, filename],
+                           stdout=subprocess.PIPE).communicate()[0]
+    return int(out)
+
+def main(sizes):
+    tmpdir = tempfile.mkdtemp(prefix="xcfg-bench-")
+    print "%10s %16s %14s %14s" % ("nodes", "type", "bytes", "bytes/node")
+    try:
+        for nodes in sizes:
+            filename = os.path.join(tmpdir, "synth-%d.xcfg" % nodes)
+            synth.generate_file(filename, nodes)
+            for nodetype in TYPES:
+                used = run(nodetype, filename)
+                print "%10d %16s %14d %14d" % (nodes, nodetype, used, used / nodes)
+            os.remove(filename)
+    finally:
+        os.rmdir(tmpdir)
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3])
+    elif len(sys.argv) > 1:
+        main([int(n) for n in sys.argv[1:]])
+    else:
+        main(SIZES)
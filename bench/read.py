@@ -0,0 +1,60 @@
+"""
+Compare the streaming (expat) AdvancedConfig.read with the xml.dom.minidom
+path (AdvancedConfig.readdom) on synthetic configs.  Each measurement runs in
+a fresh interpreter so that peak RSS belongs to one load only.
+
+    python -m bench.read [nodes ...]
+"""
+
+import os
+import sys
+import time
+import resource
+import tempfile
+import subprocess
+
+from bench import synth
+
+SIZES   = [10000, 100000, 1000000]
+LOADERS = ["read", "readdom"]
+
+def child(loader, filename):
+    " Load filename once with the named loader and print seconds and peak KB "
+    import logging
+    logging.disable(logging.ERROR)
+    import xcfg
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0     = time.time()
+    cfg    = xcfg.AdvancedConfig()
+    getattr(cfg, loader)(filename)
+    t1     = time.time()
+    after  = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print "%f %d" % (t1 - t0, after - before)
+
+def run(loader, filename):
+    out = subprocess.Popen([sys.executable, "-m", "bench.read", "--child", loader, filename],
+                           stdout=subprocess.PIPE).communicate()[0]
+    (secs, kb) = out.split()
+    return (float(secs), int(kb))
+
+def main(sizes):
+    tmpdir = tempfile.mkdtemp(prefix="xcfg-bench-")
+    print "%10s %10s %10s %12s" % ("nodes", "loader", "seconds", "peak_kb")
+    try:
+        for nodes in sizes:
+            filename = os.path.join(tmpdir, "synth-%d.xcfg" % nodes)
+            synth.generate_file(filename, nodes)
+            for loader in LOADERS:
+                (secs, kb) = run(loader, filename)
+                print "%10d %10s %10.3f %12d" % (nodes, loader, secs, kb)
+            os.remove(filename)
+    finally:
+        os.rmdir(tmpdir)
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3])
+    elif len(sys.argv) > 1:
+        main([int(n) for n in sys.argv[1:]])
+    else:
+        main(SIZES)
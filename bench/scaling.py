@@ -0,0 +1,66 @@
+"""
+Per key cost of AdvancedConfig dictionary operations as the number of keys
+grows: update, items, exp, clean, and the p command.  Every key refers to
+$ARCH and has a duplicated path item, so exp and clean have work to do.
+Linear scaling shows as a flat us/key column.
+
+    python -m bench.scaling [keys,...]
+"""
+
+import os
+import sys
+import time
+
+KEYS = [1000, 10000, 100000, 300000]
+OPS  = ["update", "items", "exp", "clean", "p"]
+
+TOP  = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def entries(keys):
+    d = dict([("K%d" % n, "/opt/$ARCH/k%d:/usr/lib:/opt/$ARCH/k%d" % (n, n)) for n in range(keys)])
+    d["ARCH"] = "x86_64"
+    return d
+
+def timed(fn):
+    t0 = time.time()
+    fn()
+    return time.time() - t0
+
+def measure(xcfg, keys):
+    " Seconds for each of OPS on keys keys "
+    d       = entries(keys)
+    cfg     = xcfg.AdvancedConfig()
+    seconds = {}
+    seconds["update"] = timed(lambda: cfg.update(d))
+    seconds["items"]  = timed(cfg.items)
+    seconds["exp"]    = timed(cfg.exp)
+    seconds["clean"]  = timed(lambda: cfg.clean(":"))
+
+    cli = xcfg.XcfgCLI()
+    cli.push(cli.stack.update("bench", d))
+    cli.xcfg # flattened before timing
+    saved      = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        seconds["p"] = timed(cli.do_p)
+    finally:
+        sys.stdout.close()
+        sys.stdout = saved
+    return seconds
+
+def main(counts):
+    import logging
+    logging.disable(logging.ERROR)
+    sys.path.insert(0, TOP)
+    import xcfg
+    print "%8s %8s %10s %10s" % ("keys", "op", "seconds", "us/key")
+    for keys in counts:
+        seconds = measure(xcfg, keys)
+        for op in OPS:
+            print "%8d %8s %10.4f %10.2f" % (keys, op, seconds[op], seconds[op] * 1e6 / keys)
+
+if __name__ == '__main__':
+    counts = KEYS
+    if len(sys.argv) > 1:
+        counts = [int(n) for n in sys.argv[1].split(",")]
+    main(counts)
@@ -0,0 +1,60 @@
+"""
+Import time budget for xcfg.  Imports xcfg in fresh interpreters, prints the
+best time, and exits non-zero if it is over budget or if any of the modules
+xcfg defers (interactive mode, DOM, compiled cache) got imported anyway, so
+it can gate a build:
+
+    python -m bench.startup [budget_ms [runs]]
+"""
+
+import os
+import sys
+import subprocess
+import py_compile
+
+BUDGET   = 20.0 # ms, an unloaded machine does well under half of this
+RUNS     = 10
+DEFERRED = ["cmd", "readline", "inspect", "optparse", "tempfile", "hashlib", "xml.dom.minidom"]
+
+TOP      = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD    = """
+import sys, time
+sys.path.insert(0, %r)
+t0 = time.time()
+import xcfg
+t1 = time.time()
+print (t1 - t0) * 1000
+print " ".join([m for m in %r if sys.modules.get(m) is not None])
+"""
+
+def child():
+    " Milliseconds to import xcfg in a fresh interpreter, and deferred modules it imported "
+    out = subprocess.Popen([sys.executable, "-c", CHILD % (TOP, DEFERRED)],
+                           stdout=subprocess.PIPE).communicate()[0]
+    lines = out.split("\n")
+    return (float(lines[0]), lines[1].split())
+
+def main(budget, runs):
+    py_compile.compile(os.path.join(TOP, "xcfg.py")) # time the import, not the compile
+    results = [child() for n in range(runs)]
+    best    = min([ms for (ms, loaded) in results])
+    loaded  = results[0][1]
+    print "import xcfg: %.2f ms (best of %d, budget %.2f ms)" % (best, runs, budget)
+    failed  = False
+    if loaded:
+        print "FAIL: imported at startup: %s" % " ".join(loaded)
+        failed = True
+    if best > budget:
+        print "FAIL: over budget"
+        failed = True
+    return failed
+
+if __name__ == '__main__':
+    budget = BUDGET
+    runs   = RUNS
+    if len(sys.argv) > 1:
+        budget = float(sys.argv[1])
+    if len(sys.argv) > 2:
+        runs   = int(sys.argv[2])
+    sys.exit(main(budget, runs))
@@ -0,0 +1,178 @@
+"""
+Benchmark suite: times xcfg operations over a grid of synthetic workloads
+(see synth.workload) and writes the results to a JSON file, so that runs of
+different versions can be compared.
+
+    python -m bench.suite [options]
+
+Comma separated option values make a grid, e.g.
+
+    python -m bench.suite --keys 1000,10000,100000 --depth 0,3 -o before.json
+
+Every (workload, operation) pair runs --repeat times, each in a fresh
+interpreter; the result keeps the best wall time and the largest peak RSS.
+Operations:
+
+    load     AdvancedConfig.read in load mode
+    merge    AdvancedConfig.read in merge mode, over a loaded copy
+    exp      AdvancedConfig.exp of a loaded file
+    clean    AdvancedConfig.clean of a loaded file
+    todict   AdvancedConfig.todict of a loaded file
+    axpath   AdvancedConfig.axselect of //kN for 200 keys
+    snapshot load_snapshot of a snapshot of the file (see write_snapshot)
+    cli      xcfg load:FILE exp clean p, as a command (interpreter start included)
+
+exp, clean and p work on the entries of the root, so with depth > 0 they
+mostly measure their fixed costs.
+"""
+
+import os
+import sys
+import time
+import json
+import resource
+import tempfile
+import platform
+import optparse
+import subprocess
+
+from bench import synth
+
+OPS       = ["load", "merge", "exp", "clean", "todict", "axpath", "snapshot", "cli"]
+WORKLOAD  = ["keys", "depth", "elements", "pathlen", "refs"]
+DEFAULTS  = {"keys": "1000,10000", "depth": "0,3", "elements": "0.5",
+             "pathlen": "4", "refs": "0.1"}
+
+TOP       = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def peak_kb(who=resource.RUSAGE_SELF):
+    " Peak RSS in KB (ru_maxrss is in bytes on OS X) "
+    peak = resource.getrusage(who).ru_maxrss
+    if sys.platform == "darwin":
+        peak /= 1024
+    return peak
+
+def child(op, filename):
+    " Run op on filename once, print seconds and peak KB "
+    import logging
+    logging.disable(logging.ERROR)
+    sys.path.insert(0, TOP)
+    import xcfg
+
+    if op == "cli":
+        devnull = open(os.devnull, "w")
+        t0 = time.time()
+        subprocess.call([sys.executable, os.path.join(TOP, "xcfg.py"), "load:" + filename, "exp", "clean", "p"],
+                        stdout=devnull, stderr=devnull, env=dict(os.environ, PYLOG="ERROR"))
+        t1 = time.time()
+        print "%f %d" % (t1 - t0, peak_kb(resource.RUSAGE_CHILDREN))
+        return
+
+    cfg = xcfg.AdvancedConfig()
+    if op == "load":
+        t0 = time.time()
+        cfg.read(filename)
+        t1 = time.time()
+    else:
+        cfg.read(filename)
+        if op == "merge":
+            t0 = time.time()
+            cfg.read(filename, mode="merge")
+            t1 = time.time()
+        elif op == "exp":
+            t0 = time.time()
+            cfg.exp()
+            t1 = time.time()
+        elif op == "clean":
+            t0 = time.time()
+            cfg.clean(":")
+            t1 = time.time()
+        elif op == "todict":
+            t0 = time.time()
+            cfg.todict()
+            t1 = time.time()
+        elif op == "snapshot":
+            snap = filename + ".snap"
+            cfg.toSnapshot(snap)
+            t0 = time.time()
+            xcfg.load_snapshot(snap)
+            t1 = time.time()
+            os.remove(snap)
+        elif op == "axpath":
+            keys    = sorted(cfg.todict().keys())
+            queries = ["//" + k for k in keys[::max(1, len(keys) / 200)][:200]]
+            t0 = time.time()
+            for q in queries:
+                cfg.axselect(q)
+            t1 = time.time()
+    print "%f %d" % (t1 - t0, peak_kb())
+
+def run(op, filename):
+    out = subprocess.Popen([sys.executable, "-m", "bench.suite", "--child", op, filename],
+                           stdout=subprocess.PIPE, cwd=TOP).communicate()[0]
+    (secs, kb) = out.split()
+    return (float(secs), int(kb))
+
+def grid(options):
+    " All combinations of the workload option values, as dictionaries "
+    combos = [{}]
+    for name in WORKLOAD:
+        cast   = name in ("keys", "depth", "pathlen") and int or float
+        values = [cast(v) for v in getattr(options, name).split(",")]
+        combos = [dict(c, **{name: v}) for c in combos for v in values]
+    return combos
+
+def main(options):
+    ops     = options.ops.split(",")
+    results = []
+    tmpdir  = tempfile.mkdtemp(prefix="xcfg-bench-")
+    print "%8s %6s %9s %8s %6s %8s %10s %10s" % tuple(WORKLOAD + ["op", "seconds", "peak_kb"])
+    try:
+        for params in grid(options):
+            filename = os.path.join(tmpdir, "workload.xcfg")
+            synth.workload_file(filename, **params)
+            for op in ops:
+                runs = [run(op, filename) for n in range(options.repeat)]
+                secs = min([r[0] for r in runs])
+                kb   = max([r[1] for r in runs])
+                results.append(dict(params, op=op, seconds=secs, peak_kb=kb, repeat=options.repeat))
+                print "%8d %6d %9.2f %8d %6.2f %8s %10.4f %10d" % tuple([params[n] for n in WORKLOAD] + [op, secs, kb])
+            os.remove(filename)
+    finally:
+        os.rmdir(tmpdir)
+
+    report = {"created":  time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "version":  version(),
+              "python":   platform.python_version(),
+              "platform": platform.platform(),
+              "results":  results}
+    fh = open(options.output, "w")
+    try:
+        json.dump(report, fh, indent=1, sort_keys=True)
+        fh.write("\n")
+    finally:
+        fh.close()
+    print "results written to %s" % options.output
+
+def version():
+    " The git revision of the tree being measured, if there is one "
+    try:
+        out = subprocess.Popen(["git", "describe", "--always", "--dirty"], cwd=TOP,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0]
+    except OSError:
+        return None
+    return out.strip() or None
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+    parser = optparse.OptionParser(usage="python -m bench.suite [options]")
+    for name in WORKLOAD:
+        parser.add_option("--" + name, default=DEFAULTS[name],
+                          help="comma separated values [%s]" % DEFAULTS[name])
+    parser.add_option("--ops", default=",".join(OPS), help="operations to time [all]")
+    parser.add_option("--repeat", type="int", default=3, help="runs of each operation [3]")
+    parser.add_option("-o", "--output", default="bench-results.json", help="results file [bench-results.json]")
+    (options, args) = parser.parse_args()
+    main(options)
@@ -0,0 +1,89 @@
+"""
+Synthetic XConfig files for benchmarking.
+
+    python -m bench.synth 100000 > big.xcfg
+
+generate() writes uniform trees of a given size, workload() trees shaped by
+key count, depth, attribute/element mix, path list length and reference
+density (see bench.suite).
+"""
+
+import sys
+import math
+import random
+
+def generate(fh, nodes, fanout=10, attrs=2):
+    """ Write a config with roughly `nodes` elements to fh.  Each group
+        element has `fanout` children: text-only elements and elements
+        carrying `attrs` attributes, alternately.
+    """
+    fh.write('<config\n    root_key="root_value"\n>\n')
+    written = 0
+    group   = 0
+    while written < nodes:
+        fh.write('  <group%d>\n' % group)
+        written += 1
+        idx = 0
+        while idx < fanout and written < nodes:
+            if idx % 2:
+                fh.write('    <text%d_%d> /opt/pkg%d/bin </text%d_%d>\n' % (group, idx, idx, group, idx))
+            else:
+                pairs = " ".join(['a%d_%d_%d="/usr/lib/v%d"' % (group, idx, a, a) for a in range(attrs)])
+                fh.write('    <leaf%d_%d %s/>\n' % (group, idx, pairs))
+            written += 1
+            idx     += 1
+        fh.write('  </group%d>\n' % group)
+        group += 1
+    fh.write('</config>\n')
+
+def workload(fh, keys=1000, depth=2, elements=0.5, pathlen=4, refs=0.1, seed=0):
+    """ Write a config with `keys` leaf entries k0, k1, ... to fh, spread
+        over `depth` levels of group elements (depth 0 puts them all on the
+        root).  A fraction `elements` of the leaves are text-only child
+        elements, the rest attributes.  Values are path lists of `pathlen`
+        items drawn from a pool small enough to repeat some (work for
+        clean), and a fraction `refs` of them start with a reference to an
+        earlier key (work for exp).  The same arguments write the same file.
+    """
+    rnd    = random.Random(seed)
+    fanout = max(2, int(math.ceil(keys ** (1.0 / max(depth, 1)))))
+
+    def value(k):
+        items = ["/opt/p%d/bin" % rnd.randrange(pathlen * 2) for n in range(pathlen)]
+        if k > 0 and rnd.random() < refs:
+            items.insert(0, "$k%d" % rnd.randrange(k))
+        return ":".join(items)
+
+    def group(name, indent, level, start, count):
+        if level >= depth:
+            leaves = [(k, value(k), rnd.random() < elements) for k in range(start, start + count)]
+            attrs  = "".join(['\n%s    k%d="%s"' % (indent, k, v) for (k, v, elem) in leaves if not elem])
+            fh.write('%s<%s%s>\n' % (indent, name, attrs))
+            for (k, v, elem) in leaves:
+                if elem:
+                    fh.write('%s  <k%d> %s </k%d>\n' % (indent, k, v, k))
+        else:
+            fh.write('%s<%s>\n' % (indent, name))
+            size = int(math.ceil(float(count) / fanout))
+            for sub in range(start, start + count, size):
+                group("g%d_%d" % (level + 1, sub), indent + "  ", level + 1, sub, min(size, start + count - sub))
+        fh.write('%s</%s>\n' % (indent, name))
+
+    group("config", "", 0, 0, keys)
+
+def generate_file(filename, nodes, **kw):
+    fh = open(filename, "w")
+    try:
+        generate(fh, nodes, **kw)
+    finally:
+        fh.close()
+
+def workload_file(filename, **kw):
+    fh = open(filename, "w")
+    try:
+        workload(fh, **kw)
+    finally:
+        fh.close()
+
+if __name__ == '__main__':
+    generate(sys.stdout, int(sys.argv[1]))
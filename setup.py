@@ -8,5 +8,5 @@ setup(name='Extended Configurator',
       author='Ian Stokes-Rees',
       author_email='ijstokes@spmetric.com',
       url='https://github.com/ijstokes/xcfg',
-      py_modules=['xcfg'],
+      py_modules=['xcfg', 'xcfgc'],
      )
@@ -0,0 +1,78 @@
+import os
+import logging
+import unittest
+import threading
+
+import xcfg
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class AXPathTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.cfg = xcfg.AdvancedConfig(os.path.join(HERE, "test-001.xcfg"))
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_children(self):
+        self.assertEqual(self.cfg.axselect("/zap/blort"), ["apples"])
+        self.assertEqual(self.cfg.axselect("zip/a/"), ["x"])
+        self.assertEqual(self.cfg.axselect("/zap/nothing"), [])
+
+    def test_descendants(self):
+        self.assertEqual(self.cfg.axselect("//blort"), ["apples"])
+        self.assertEqual(self.cfg.zap.axselect("//wibble"), ["peaches"])
+        self.assertEqual(self.cfg.axselect("//zap/wibble"), ["peaches"])
+
+    def test_wildcard(self):
+        self.assertEqual(self.cfg.axselect("/zap/*"), ["apples", "peaches"])
+        self.assertEqual(self.cfg.axselect("/*/a"), ["x"])
+        self.assertEqual(len(self.cfg.axselect("//*")), len(self.cfg.axselect("/*")) + 4)
+
+    def test_predicates(self):
+        self.assertEqual(self.cfg.axselect("/zip[@a='x']/b"), ["y"])
+        self.assertEqual(self.cfg.axselect('/zip[a="x"][b=y]/b'), ["y"])
+        self.assertEqual(self.cfg.axselect("/*[@blort='apples']/wibble"), ["peaches"])
+        self.assertEqual(self.cfg.axselect("/zip[@a='y']"), [])
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, xcfg.compile_axpath, "/zip[@a")
+        self.assertRaises(ValueError, xcfg.compile_axpath, "/zip//[x]")
+
+class LRUCacheTest(unittest.TestCase):
+
+    def test_eviction(self):
+        cache = xcfg.LRUCache(2)
+        cache["a"] = 1
+        cache["b"] = 2
+        cache.get("a")
+        cache["c"] = 3
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+        self.assertEqual(cache.popoldest(), ("a", 1))
+        self.assertEqual(cache.pop("c"), 3)
+        self.assertEqual(len(cache), 0)
+
+    def test_threads(self):
+        " the linked list stays whole when threads share the cache "
+        cache = xcfg.LRUCache(8)
+        for n in range(4):
+            cache[n] = n
+        def hammer():
+            for n in xrange(20000):
+                cache.get(n % 4)
+        threads = [threading.Thread(target=hammer) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        keys = []
+        link = cache.head[1]
+        while link is not cache.head:
+            keys.append(link[2])
+            link = link[1]
+        self.assertEqual(sorted(keys), [0, 1, 2, 3])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import shutil
+import logging
+import tempfile
+import unittest
+import subprocess
+from StringIO import StringIO
+
+import xcfg
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+XCFG = os.path.join(os.path.dirname(HERE), "xcfg.py")
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmpdir = tempfile.mkdtemp(prefix="xcfg-test-")
+        self.cli    = xcfg.XcfgCLI()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        logging.disable(logging.NOTSET)
+
+    def test_counts_errors(self):
+        " errors are counted even when nothing is logged "
+        script = StringIO("a=1\nnonsense!\nload:%s\nbase:%s\n" % (os.path.join(HERE, "missing.xcfg"),
+                                                                    os.path.join(HERE, "missing.env")))
+        self.assertEqual(xcfg.batch(self.cli, script), 3)
+        self.assertEqual(self.cli.xcfg["a"], "1")
+
+    def test_redirects(self):
+        out    = os.path.join(self.tmpdir, "env.sh")
+        script = StringIO("load:%s  # s1\nsh=bash p > %s\nsh=csh p:^foo >> %s\n" % (os.path.join(HERE, "s1.xcfg"), out, out))
+        self.assertEqual(xcfg.batch(self.cli, script), 0)
+        self.assertEqual(open(out).read(), "export foo=bar\nexport zip=zap\nsetenv foo bar\n")
+
+class PipeTest(unittest.TestCase):
+    " xcfg with commands piped into it "
+
+    def xcfg(self, args, commands):
+        child = subprocess.Popen([sys.executable, XCFG] + args, cwd=HERE,
+                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        (out, err) = child.communicate(commands)
+        return (child.returncode, out)
+
+    def test_interactive_syntax(self):
+        self.assertEqual(self.xcfg([], "load : s1.xcfg\nsh = bash\n\np\n"),
+                         (0, "export foo=bar\nexport zip=zap\n"))
+
+    def test_script(self):
+        self.assertEqual(self.xcfg(["-f", "-"], "load:s1.xcfg sh=bash 'p:^z'\n"),
+                         (0, "export zip=zap\n"))
+        self.assertEqual(self.xcfg(["-f", "-"], "nonsense!\n")[0], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+
+import xcfg
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmpdir = tempfile.mkdtemp(prefix="xcfg-test-")
+        self.source = os.path.join(self.tmpdir, "c.xcfg")
+        self.write('<c a="1"/>')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        logging.disable(logging.NOTSET)
+
+    def write(self, text):
+        fh = open(self.source, "w")
+        fh.write(text)
+        fh.close()
+
+    def read(self, cache):
+        cfg = xcfg.AdvancedConfig()
+        cfg.read(self.source, cache=cache)
+        return cfg.a
+
+    def test_compiled_cache(self):
+        cache = xcfg.CompiledCache(os.path.join(self.tmpdir, "cache"))
+        self.assertEqual(self.read(cache), "1")
+        self.assertEqual(self.read(xcfg.CompiledCache(cache.directory)), "1")
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        self.assertTrue(os.path.exists(cache.path(self.source)))
+
+    def test_next_to_source(self):
+        cache = xcfg.CompiledCache()
+        self.read(cache)
+        self.assertEqual(cache.path(self.source), os.path.join(self.tmpdir, ".c.xcfgc"))
+        self.assertTrue(os.path.exists(cache.path(self.source)))
+
+    def test_same_size_edit(self):
+        " an edit within the mtime resolution, keeping the size, is seen "
+        cache = xcfg.CompiledCache(os.path.join(self.tmpdir, "cache"))
+        self.assertEqual(self.read(cache), "1")
+        self.write('<c a="2"/>')
+        self.assertEqual(self.read(cache), "2")
+        self.assertEqual(self.read(cache), "2")
+
+    def test_unusable_entry(self):
+        cache = xcfg.CompiledCache(os.path.join(self.tmpdir, "cache"))
+        self.read(cache)
+        open(cache.path(self.source), "wb").write("garbage")
+        self.assertEqual(self.read(cache), "1")
+        self.assertEqual(cache.misses, 2)
+
+    def test_parse_cache_same_size_edit(self):
+        cache = xcfg.ParseCache()
+        self.assertEqual(self.read(cache), "1")
+        self.write('<c a="2"/>')
+        self.assertEqual(self.read(cache), "2")
+        self.assertEqual(self.read(cache), "2")
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_parse_cache_default(self):
+        xcfg.parse_cache.invalidate()
+        self.read(False)
+        self.assertEqual(len(xcfg.parse_cache.entries), 0)
+        self.read(None)
+        self.assertEqual(len(xcfg.parse_cache.entries), 1)
+        xcfg.parse_cache.invalidate()
+
+    def test_helpers_parse_once(self):
+        xcfg.parse_cache.invalidate()
+        misses = xcfg.parse_cache.misses
+        self.assertEqual(xcfg.xcfg2dict(self.source), {"a": "1"})
+        self.assertEqual(xcfg.attr2dict(self.source), {"a": "1"})
+        xcfg.xcfg2dict(self.source)
+        xcfg.parsed(self.source)
+        self.assertEqual(xcfg.parse_cache.misses - misses, 1)
+        self.assertEqual(len(xcfg.parse_cache.entries), 1)
+        xcfg.parse_cache.invalidate()
+
+    def test_parse_cache_bounds(self):
+        cache = xcfg.ParseCache(maxsize=1)
+        other = os.path.join(self.tmpdir, "d.xcfg")
+        shutil.copy(self.source, other)
+        cache.events(self.source)
+        cache.events(other)
+        stats = cache.stats()
+        self.assertEqual((stats["entries"], stats["evictions"]), (1, 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import logging
+import unittest
+
+import xcfg
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class CompactConfigTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.cfg = xcfg.CompactConfig(os.path.join(HERE, "test-001.xcfg"))
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_same_as_advanced(self):
+        advanced = xcfg.AdvancedConfig(os.path.join(HERE, "test-001.xcfg"))
+        self.assertEqual(self.cfg.todict(), advanced.todict())
+        self.assertEqual(sorted(self.cfg.keys()), sorted(advanced.keys()))
+        self.assertEqual(self.cfg.axselect("//wibble"), advanced.axselect("//wibble"))
+        self.assertEqual(self.cfg.axselect("/zip[@a='x']/b"), ["y"])
+
+    def test_no_instance_dict(self):
+        self.assertFalse(hasattr(self.cfg, "__dict__"))
+        self.assertFalse(hasattr(self.cfg.zap, "__dict__"))
+
+    def test_shared_layout(self):
+        (one, two) = (xcfg.CompactConfig(), xcfg.CompactConfig())
+        for node in (one, two):
+            node["a"] = "1"
+            node["b"] = "2"
+        self.assertTrue(one._names is two._names)
+        self.assertTrue(one._keys is two._keys)
+
+    def test_entries(self):
+        cfg = self.cfg
+        cfg["read"] = "entry"
+        self.assertEqual(cfg["read"], "entry")
+        self.assertTrue(callable(cfg.read))
+        del cfg["foo"]
+        self.assertFalse("foo" in cfg)
+        self.assertRaises(KeyError, cfg.__delitem__, "foo")
+        self.assertEqual(cfg.get("foo", "none"), "none")
+        self.assertEqual(cfg.pop("bar"), "123")
+
+    def test_wide(self):
+        cfg = xcfg.CompactConfig()
+        for n in range(xcfg.CompactConfig.WIDE * 2):
+            cfg["k%d" % n] = str(n)
+        del cfg["k3"]
+        self.assertEqual(type(cfg._names), dict)
+        self.assertEqual(len(cfg), xcfg.CompactConfig.WIDE * 2 - 1)
+        self.assertEqual(cfg["k40"], "40")
+        self.assertEqual(cfg.todict()["k63"], "63")
+
+    def test_collisions(self):
+        self.cfg.zap.foo = "zap"
+        self.assertEqual(self.cfg.collisions(), {"foo": ["foo", "zap/foo"]})
+
+if __name__ == '__main__':
+    unittest.main()
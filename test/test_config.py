@@ -0,0 +1,45 @@
+import os
+import logging
+import unittest
+
+import xcfg
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class EntriesTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.cfg = xcfg.AdvancedConfig(os.path.join(HERE, "test-001.xcfg"))
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_method_names(self):
+        self.cfg["read"] = "entry"
+        self.cfg.keys = "entry"
+        self.assertEqual(self.cfg["read"], "entry")
+        self.assertEqual(self.cfg["keys"], "entry")
+        self.assertTrue(callable(self.cfg.read))
+        self.assertTrue("read" in self.cfg.keys())
+
+    def test_copy(self):
+        self.cfg["P"] = xcfg.PathList("/a:/b")
+        copy = self.cfg.copy()
+        self.assertEqual(copy.todict(), self.cfg.todict())
+        self.assertEqual(copy.collisions(), self.cfg.collisions())
+        self.assertEqual(sorted(copy.keys()), sorted(self.cfg.keys()))
+        copy.zap.blort = "pears"
+        copy["P"].append("/c")
+        self.assertEqual(self.cfg.zap.blort, "apples")
+        self.assertEqual(self.cfg["P"].render(), "/a:/b")
+
+    def test_copy_other_values(self):
+        " values set from Python which are not leaves are copied too "
+        self.cfg["n"] = 5
+        copy = self.cfg.copy()
+        self.assertEqual(dict(copy.items()), dict(self.cfg.items()))
+        self.assertEqual(copy["n"], 5)
+
+if __name__ == '__main__':
+    unittest.main()
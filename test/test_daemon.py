@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+import errno
+import shutil
+import socket
+import signal
+import tempfile
+import unittest
+import subprocess
+
+import xcfgc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+XCFG = os.path.join(os.path.dirname(HERE), "xcfg.py")
+
+class SocketCheckTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="xcfg-test-")
+        os.chmod(self.tmpdir, 0700)
+        self.path = os.path.join(self.tmpdir, "xcfg.sock")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def listen(self, mode):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.path)
+        os.chmod(self.path, mode)
+        return sock
+
+    def test_private_socket(self):
+        sock = self.listen(0600)
+        try:
+            self.assertEqual(xcfgc.unsafe_socket(self.path), None)
+        finally:
+            sock.close()
+
+    def test_open_socket(self):
+        sock = self.listen(0666)
+        try:
+            self.assertTrue(xcfgc.unsafe_socket(self.path))
+            try:
+                xcfgc.request(["p"], self.path)
+            except socket.error, e:
+                self.assertEqual(e.errno, errno.EPERM)
+            else:
+                self.fail("request sent on an unsafe socket")
+        finally:
+            sock.close()
+
+    def test_open_directory(self):
+        os.chmod(self.tmpdir, 0777)
+        self.assertTrue(xcfgc.unsafe_dir(self.tmpdir))
+        os.chmod(self.tmpdir, 01777)
+        self.assertEqual(xcfgc.unsafe_dir(self.tmpdir), None)
+
+    def test_not_a_socket(self):
+        open(self.path, "w").close()
+        self.assertTrue(xcfgc.unsafe_socket(self.path))
+
+    def test_request_environ(self):
+        os.environ["XCFG_TEST_VAR"] = "x"
+        try:
+            environ = xcfgc.request_environ(["sh=bash", "p"])
+            self.assertTrue("XCFG_TEST_VAR" in environ)
+            self.assertFalse("PATH" in environ)
+            self.assertTrue("PATH" in xcfgc.request_environ(["e:PATH", "p"]))
+            self.assertTrue("PATH" in xcfgc.request_environ(["e", "p"]))
+        finally:
+            del os.environ["XCFG_TEST_VAR"]
+
+class DaemonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="xcfg-test-")
+        self.path   = os.path.join(self.tmpdir, "run", "xcfg.sock")
+        env = dict(os.environ, PYLOG="CRITICAL")
+        self.daemon = subprocess.Popen([sys.executable, XCFG, "daemon=" + self.path], env=env)
+        for n in range(100):
+            if os.path.exists(self.path):
+                break
+            time.sleep(0.05)
+
+    def tearDown(self):
+        os.kill(self.daemon.pid, signal.SIGTERM)
+        self.daemon.wait()
+        shutil.rmtree(self.tmpdir)
+
+    def test_request(self):
+        args = ["load:" + os.path.join(HERE, "s1.xcfg"), "sh=bash", "p"]
+        (status, out, err) = xcfgc.request(args, self.path)
+        self.assertEqual(status, 0)
+        self.assertEqual(out, "export foo=bar\nexport zip=zap\n")
+        self.assertEqual(xcfgc.request(args, self.path), (status, out, err))
+        self.assertEqual(os.stat(os.path.dirname(self.path)).st_mode & 0777, 0700)
+
+if __name__ == '__main__':
+    unittest.main()
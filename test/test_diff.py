@@ -0,0 +1,61 @@
+import os
+import sys
+import shutil
+import logging
+import tempfile
+import unittest
+from StringIO import StringIO
+
+import xcfg
+
+class DiffTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmpdir = tempfile.mkdtemp(prefix="xcfg-test-")
+        self.base   = os.path.join(self.tmpdir, "base.env")
+        fh = open(self.base, "w")
+        fh.write("A=1\nB=2\nC=3\nD=4\n")
+        fh.close()
+        self.cli = xcfg.XcfgCLI()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        logging.disable(logging.NOTSET)
+
+    def output(self, *commands):
+        (stdout, sys.stdout) = (sys.stdout, StringIO())
+        try:
+            for command in commands:
+                self.cli.onecmd(command)
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def test_changed_and_unset(self):
+        out = self.output("base:" + self.base, "A=1", "B=changed", "N=new", "unset:C", "sh=bash", "diff")
+        self.assertEqual(out, "export B=changed\nexport N=new\nunset C\n")
+
+    def test_csh(self):
+        out = self.output("base:" + self.base, "B=changed", "unset:C,D", "sh=csh", "diff")
+        self.assertEqual(out, "setenv B changed\nunsetenv C\nunsetenv D\n")
+
+    def test_regex(self):
+        out = self.output("base:" + self.base, "B=changed", "N=new", "unset:C", "sh=bash", "diff:^[BC]")
+        self.assertEqual(out, "export B=changed\nunset C\n")
+
+    def test_whole_environment(self):
+        " with e loaded, anything missing from it was removed "
+        os.environ["XCFG_TEST_VAR"] = "x"
+        try:
+            out = self.output("base", "e", "unset:XCFG_TEST_VAR", "XCFG_TEST_NEW=y", "sh=bash", "diff")
+        finally:
+            del os.environ["XCFG_TEST_VAR"]
+        self.assertEqual(out, "export XCFG_TEST_NEW=y\nunset XCFG_TEST_VAR\n")
+
+    def test_missing_base(self):
+        self.output("base:" + os.path.join(self.tmpdir, "missing.env"))
+        self.assertEqual(self.cli.errors, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import logging
+import unittest
+
+import xcfg
+
+class ExpanderTest(unittest.TestCase):
+
+    env = {"HOME": "/home/u", "PATH": "/usr/bin", "OUTSIDE": "env"}
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def expand(self, entries, keys=None):
+        return xcfg.Expander(entries, self.env).expand(keys)
+
+    def test_chain(self):
+        " references resolve whatever order the entries are in "
+        entries = {"D": "$C/d", "C": "${B}/c", "B": "$A/b", "A": "/a"}
+        self.assertEqual(self.expand(entries)["D"], "/a/b/c/d")
+
+    def test_environment_and_unknown(self):
+        entries = {"X": "$OUTSIDE:$NOWHERE:$$literal", "Y": "~/y"}
+        self.assertEqual(self.expand(entries), {"X": "env:$NOWHERE:$literal", "Y": os.path.expanduser("~/y")})
+
+    def test_self_reference(self):
+        self.assertEqual(self.expand({"PATH": "/opt/bin:$PATH"})["PATH"], "/opt/bin:/usr/bin")
+
+    def test_cycle(self):
+        " a reference closing a cycle comes from the environment, or is left "
+        result = self.expand({"A": "$B/a", "B": "$A/b"})
+        self.assertTrue(result in ({"A": "$A/b/a", "B": "$A/b"}, {"A": "$B/a", "B": "$B/a/b"}), result)
+
+    def test_keys(self):
+        " only the keys asked for and what they depend on are expanded "
+        result = self.expand({"A": "/a", "B": "$A/b", "C": "$A/c"}, ["B"])
+        self.assertEqual(result, {"A": "/a", "B": "/a/b"})
+
+    def test_exp(self):
+        cfg = xcfg.AdvancedConfig()
+        cfg.update({"B": "$A/b", "A": "/a", "C": xcfg.PathList("$B:/c")})
+        cfg.exp()
+        self.assertEqual((cfg.B, xcfg.valuestr(cfg.C)), ("/a/b", "/a/b:/c"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+import threading
+
+import xcfg
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class FrozenConfigTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.cfg = xcfg.AdvancedConfig(os.path.join(HERE, "test-001.xcfg"))
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_views(self):
+        frozen = self.cfg.freeze()
+        self.assertEqual(frozen.todict(), self.cfg.todict())
+        self.assertEqual(frozen.zap.blort, "apples")
+        self.assertEqual(frozen["wibble"], "peaches")
+        self.assertEqual(frozen.axselect("/zip[@a='x']/b"), ["y"])
+        self.assertEqual(frozen.axpath("//wibble"), "peaches")
+
+    def test_read_only(self):
+        frozen = self.cfg.freeze()
+        self.assertRaises(AttributeError, setattr, frozen, "foo", "x")
+        self.assertRaises(AttributeError, delattr, frozen, "foo")
+        self.cfg.foo = "changed"
+        self.assertEqual(frozen.foo, "abc")
+
+    def test_equal_and_hash(self):
+        (one, two) = (self.cfg.freeze(), xcfg.AdvancedConfig(os.path.join(HERE, "test-001.xcfg")).freeze())
+        self.assertEqual(one, two)
+        self.assertEqual(hash(one), hash(two))
+        self.cfg.foo = "changed"
+        self.assertNotEqual(self.cfg.freeze(), one)
+
+    def test_thaw(self):
+        frozen = self.cfg.freeze()
+        cfg = frozen.thaw()
+        self.assertEqual(cfg.todict(), self.cfg.todict())
+        self.assertEqual(sorted(cfg.keys()), sorted(self.cfg.keys()))
+        cfg.foo = "x"
+        self.assertEqual(frozen.foo, "abc")
+        self.assertEqual(frozen.thaw(xcfg.CompactConfig).freeze(), frozen)
+
+class ConfigHolderTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmpdir = tempfile.mkdtemp(prefix="xcfg-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        logging.disable(logging.NOTSET)
+
+    def test_swap(self):
+        holder = xcfg.ConfigHolder(xcfg.AdvancedConfig(os.path.join(HERE, "s1.xcfg")))
+        before = holder.get()
+        def change(cfg):
+            cfg.foo = "baz"
+            return cfg
+        after = holder.update(change)
+        self.assertTrue(holder.current is after)
+        self.assertEqual((before.foo, after.foo), ("bar", "baz"))
+
+    def test_read(self):
+        holder = xcfg.ConfigHolder()
+        holder.read(os.path.join(HERE, "s1.xcfg"))
+        holder.read(os.path.join(HERE, "s2.xcfg"), "merge")
+        self.assertEqual(holder.current.zip, "zap:bong")
+        current = holder.current
+        self.assertTrue(holder.read(os.path.join(self.tmpdir, "missing.xcfg")) is current)
+
+    def test_concurrent_updates(self):
+        holder = xcfg.ConfigHolder()
+        def add(n):
+            def apply(cfg):
+                cfg["k%d" % n] = str(n)
+                return cfg
+            return apply
+        threads = [threading.Thread(target=holder.update, args=(add(n),)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(holder.current), 8)
+
+    def test_watch(self):
+        path = os.path.join(self.tmpdir, "c.xcfg")
+        open(path, "w").write('<c a="1"/>')
+        watcher = xcfg.ConfigWatcher(path, backend="poll")
+        holder  = xcfg.ConfigHolder()
+        holder.watch(watcher)
+        self.assertEqual(holder.current.a, "1")
+        open(path + ".tmp", "w").write('<c a="2"/>')
+        os.rename(path + ".tmp", path)
+        watcher.check()
+        self.assertEqual(holder.current.a, "2")
+
+if __name__ == '__main__':
+    unittest.main()
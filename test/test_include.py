@@ -0,0 +1,49 @@
+import os
+import logging
+import unittest
+
+import xcfg
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def fixture(name):
+    return os.path.join(HERE, name)
+
+class IncludeTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        xcfg.parse_cache.invalidate()
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_nested_includes(self):
+        cfg = xcfg.AdvancedConfig(fixture("include-001.xcfg"))
+        self.assertEqual(cfg.top, "1")
+        self.assertEqual(cfg.two, "2")
+        self.assertEqual(cfg.three, "3")
+        self.assertEqual(cfg.sub.x, "1")
+        self.assertEqual(cfg.after, "yes")
+
+    def test_contents_of_include_ignored(self):
+        cfg = xcfg.AdvancedConfig(fixture("include-001.xcfg"))
+        self.assertFalse("note" in cfg.keys())
+        self.assertFalse("include" in cfg.keys())
+
+    def test_cycle(self):
+        graph = xcfg.include_graph(fixture("include-002.xcfg"))
+        self.assertEqual(graph[fixture("include-002.xcfg")], [fixture("include-003.xcfg")])
+        self.assertEqual(graph[fixture("include-003.xcfg")], [fixture("include-002.xcfg")])
+        cfg = xcfg.AdvancedConfig(fixture("include-002.xcfg"))
+        self.assertEqual((cfg.two, cfg.three), ("2", "3"))
+
+    def test_stack_replay(self):
+        stack = xcfg.ConfigStack().load(fixture("include-001.xcfg"))
+        stack = stack.update("x=1", {"x": "1"})
+        cfg   = stack.config()
+        self.assertEqual((cfg.two, cfg.x), ("2", "1"))
+        self.assertFalse("note" in cfg.keys())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import logging
+import unittest
+
+import xcfg
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class LeafIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.cfg = xcfg.AdvancedConfig(os.path.join(HERE, "test-001.xcfg"))
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_todict(self):
+        d = self.cfg.todict()
+        self.assertEqual(d["foo"], "abc")
+        self.assertEqual(d["blort"], "apples")
+        self.assertEqual(d["a"], "x")
+        self.assertEqual(self.cfg.zap.todict(), {"blort": "apples", "wibble": "peaches"})
+
+    def test_leaf_changes_update_index(self):
+        index = self.cfg._leafindex()
+        zap   = self.cfg.zap
+        zap.todict()
+        zap.blort = "pears"
+        zap["new"] = "leaf"
+        del self.cfg["foo"]
+        self.assertTrue(self.cfg._leafindex() is index)
+        d = self.cfg.todict()
+        self.assertEqual((d["blort"], d["new"]), ("pears", "leaf"))
+        self.assertFalse("foo" in d)
+        self.assertEqual(zap.todict()["new"], "leaf")
+
+    def test_node_changes(self):
+        self.cfg.todict()
+        zap = self.cfg.zap
+        del self.cfg["zap"]
+        self.assertFalse("blort" in self.cfg.todict())
+        zap.wibble = "plums"
+        self.assertEqual(zap.todict()["wibble"], "plums")
+        self.assertFalse("wibble" in self.cfg.todict())
+        self.cfg.other = zap
+        self.assertEqual(self.cfg.todict()["wibble"], "plums")
+
+    def test_shared_node(self):
+        node = xcfg.AdvancedConfig()
+        node.k = "1"
+        self.cfg.one = node
+        self.cfg.two = node
+        self.cfg.todict()
+        node.k = "2"
+        self.assertEqual(self.cfg.todict()["k"], "2")
+        self.assertEqual(self.cfg.collisions()["k"], ["one/k", "two/k"])
+
+    def test_collisions_last_set_wins(self):
+        self.cfg.todict()
+        self.cfg.zap.foo = "zap"
+        self.assertEqual(self.cfg.todict()["foo"], "zap")
+        self.assertEqual(self.cfg.collisions(), {"foo": ["foo", "zap/foo"]})
+        self.cfg.foo = "top"
+        self.assertEqual(self.cfg.todict()["foo"], "top")
+        self.assertEqual(self.cfg.collisions(), {"foo": ["zap/foo", "foo"]})
+        self.cfg.foo = 5 # not a leaf
+        self.assertEqual(self.cfg.todict()["foo"], "zap")
+        self.assertEqual(self.cfg.collisions(), {})
+
+if __name__ == '__main__':
+    unittest.main()
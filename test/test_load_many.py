@@ -0,0 +1,63 @@
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+
+import xcfg
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class LoadManyTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmpdir = tempfile.mkdtemp(prefix="xcfg-test-")
+        self.paths  = []
+        for n in range(4):
+            path = os.path.join(self.tmpdir, "f%d.xcfg" % n)
+            fh = open(path, "w")
+            fh.write('<c last="%d" p="/p%d"><only%d>yes</only%d></c>' % (n, n, n, n))
+            fh.close()
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        logging.disable(logging.NOTSET)
+
+    def serial(self, paths, mode):
+        cfg = xcfg.AdvancedConfig()
+        for path in paths:
+            cfg.read(path, mode)
+        return cfg.todict()
+
+    def test_order(self):
+        " the result is that of reading the files in turn, pool or not "
+        for mode in ("load", "merge"):
+            for processes in (1, 2):
+                cfg = xcfg.load_many(self.paths, mode, processes=processes)
+                self.assertEqual(cfg.todict(), self.serial(self.paths, mode))
+        cfg = xcfg.load_many(self.paths, "merge", processes=2)
+        self.assertEqual((cfg.last, cfg.p), ("0:1:2:3", "/p0:/p1:/p2:/p3"))
+        self.assertEqual(xcfg.load_many(list(reversed(self.paths)), processes=2).last, "0")
+
+    def test_missing_file(self):
+        paths = self.paths[:2] + [os.path.join(self.tmpdir, "missing.xcfg")] + self.paths[2:]
+        self.assertEqual(xcfg.compile_many(paths, processes=2)[2], None)
+        self.assertEqual(xcfg.load_many(paths, processes=2).todict(), self.serial(self.paths, "load"))
+
+    def test_cache(self):
+        cache = xcfg.ResidentCache()
+        xcfg.load_many(self.paths, cache=cache, processes=2)
+        self.assertEqual((cache.hits, cache.misses), (0, 4))
+        cfg = xcfg.load_many(self.paths, cache=cache, processes=2)
+        self.assertEqual((cache.hits, cache.misses), (4, 4))
+        self.assertEqual(cfg.last, "3")
+
+    def test_stack(self):
+        stack = xcfg.ConfigStack().load_many(self.paths, "merge", processes=2)
+        self.assertEqual(len(stack.layers()), 4)
+        self.assertEqual(stack.config().last, "0:1:2:3")
+
+if __name__ == '__main__':
+    unittest.main()
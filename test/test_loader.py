@@ -0,0 +1,58 @@
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+
+import xcfg
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def fixture(name):
+    return os.path.join(HERE, name)
+
+class LoaderTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmpdir = tempfile.mkdtemp(prefix="xcfg-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        logging.disable(logging.NOTSET)
+
+    def write(self, text):
+        path = os.path.join(self.tmpdir, "c.xcfg")
+        fh = open(path, "w")
+        fh.write(text)
+        fh.close()
+        return path
+
+    def test_tree(self):
+        cfg = xcfg.AdvancedConfig(fixture("test-001.xcfg"))
+        self.assertEqual(cfg.CCP4_SCR, "/tmp")
+        self.assertEqual(cfg.foo, "abc")
+        self.assertEqual(cfg.zip.todict(), {"a": "x", "b": "y"})
+        self.assertEqual(cfg.zap.blort, "apples")
+
+    def test_merge(self):
+        cfg = xcfg.AdvancedConfig(fixture("s1.xcfg"))
+        cfg.read(fixture("s2.xcfg"), "merge")
+        self.assertEqual(cfg.zip, "zap:bong")
+        self.assertEqual((cfg.ping, cfg.HOME), ("pow", "/tmp"))
+
+    def test_namespaces_dropped(self):
+        cfg = xcfg.AdvancedConfig(self.write('<x:c xmlns:x="urn:a" x:k="v"><x:e>t</x:e></x:c>'))
+        self.assertEqual(cfg.todict(), {"k": "v", "e": "t"})
+
+    def test_malformed(self):
+        " elements closed before the error are applied "
+        cfg = xcfg.AdvancedConfig(self.write('<c k="v"><e>t</e><bad></c>'))
+        self.assertEqual(cfg.todict(), {"e": "t"})
+
+    def test_missing(self):
+        cfg = xcfg.AdvancedConfig(os.path.join(self.tmpdir, "missing.xcfg"))
+        self.assertEqual(cfg.keys(), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+
+import xcfg
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class ConfigMapTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmpdir = tempfile.mkdtemp(prefix="xcfg-test-")
+        self.source = os.path.join(self.tmpdir, "test-001.xcfg")
+        shutil.copy(os.path.join(HERE, "test-001.xcfg"), self.source)
+        self.mapfile = self.source + ".map"
+
+    def tearDown(self):
+        xcfg._MAPS.clear()
+        shutil.rmtree(self.tmpdir)
+        logging.disable(logging.NOTSET)
+
+    def test_lookups(self):
+        xcfg.compile_map(self.source)
+        cmap = xcfg.ConfigMap(self.mapfile)
+        try:
+            self.assertEqual(cmap.todict(), xcfg.AdvancedConfig(self.source).todict())
+            self.assertEqual(cmap["blort"], "apples")
+            self.assertEqual(cmap.axpath("/zap/blort"), "apples")
+            self.assertEqual(cmap.axpath("//wibble"), "peaches")
+            self.assertRaises(AttributeError, cmap.axpath, "/zap/nothing")
+            self.assertFalse("" in cmap)
+            self.assertRaises(KeyError, cmap.__getitem__, "")
+            self.assertEqual(cmap.sources()[0][0], self.source)
+        finally:
+            cmap.close()
+
+    def test_not_a_map(self):
+        open(self.mapfile, "w").write("x" * 64)
+        self.assertRaises(ValueError, xcfg.ConfigMap, self.mapfile)
+
+    def test_damaged_map_recompiled(self):
+        xcfg.compile_map(self.source)
+        data = open(self.mapfile, "rb").read()
+        open(self.mapfile, "wb").write(data[:len(data) // 2])
+        self.assertEqual(xcfg.mapped(self.source)["foo"], "abc")
+
+    def test_stale_map_recompiled(self):
+        self.assertEqual(xcfg.mapped(self.source)["foo"], "abc")
+        open(self.source, "w").write('<config foo="changed and longer"/>')
+        self.assertEqual(xcfg.mapped(self.source)["foo"], "changed and longer")
+
+    def test_same_size_edit(self):
+        " an edit in place keeping the size and the mtime still makes the map stale "
+        xcfg.compile_map(self.source)
+        cmap = xcfg.ConfigMap(self.mapfile)
+        try:
+            self.assertFalse(cmap.stale(self.source))
+            st   = os.stat(self.source)
+            text = open(self.source).read()
+            open(self.source, "w").write(text.replace("abc", "xyz"))
+            os.utime(self.source, (st.st_atime, st.st_mtime))
+            self.assertTrue(cmap.stale(self.source))
+            self.assertEqual(cmap.sources()[0][:4], (self.source, st.st_mtime, st.st_size, st.st_ino))
+        finally:
+            cmap.close()
+
+    def test_includes(self):
+        included = os.path.join(self.tmpdir, "inc.xcfg")
+        open(included, "w").write('<c inc="1"/>')
+        open(self.source, "w").write('<c><include href="inc.xcfg"/></c>')
+        self.assertEqual(xcfg.mapped(self.source)["inc"], "1")
+        self.assertEqual([s[0] for s in xcfg.mapped(self.source).sources()], [self.source, included])
+        open(included + ".tmp", "w").write('<c inc="2"/>')
+        os.rename(included + ".tmp", included)
+        self.assertEqual(xcfg.mapped(self.source)["inc"], "2")
+
+    def test_replaced_map_closed(self):
+        old = xcfg.mapped(self.source)
+        open(self.source, "w").write('<config foo="changed and longer"/>')
+        self.assertTrue(xcfg.mapped(self.source) is not old)
+        self.assertRaises(ValueError, old.lookup, "foo")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import os
+import unittest
+
+import xcfg
+
+class EnvOverlayTest(unittest.TestCase):
+
+    def setUp(self):
+        os.environ["XCFG_TEST_VAR"] = "before"
+
+    def tearDown(self):
+        del os.environ["XCFG_TEST_VAR"]
+
+    def test_read_through(self):
+        overlay = xcfg.EnvOverlay(xcfg.AdvancedConfig(), select=xcfg.KeySelector(["XCFG_TEST_*"]))
+        overlay.cover()
+        self.assertEqual(overlay["XCFG_TEST_VAR"], "before")
+        overlay["XCFG_TEST_VAR"] = "set"
+        self.assertEqual(overlay["XCFG_TEST_VAR"], "set")
+        self.assertEqual(os.environ["XCFG_TEST_VAR"], "before")
+        del overlay["XCFG_TEST_VAR"]
+        self.assertFalse("XCFG_TEST_VAR" in overlay.keys())
+        self.assertEqual(os.environ["XCFG_TEST_VAR"], "before")
+
+    def test_select(self):
+        overlay = xcfg.EnvOverlay(xcfg.AdvancedConfig(), select=xcfg.KeySelector(["XCFG_TEST_*"]))
+        self.assertEqual(overlay.keys(), ["XCFG_TEST_VAR"])
+        self.assertRaises(KeyError, overlay.__getitem__, "PATH")
+
+    def test_entries_shadow_environment(self):
+        cfg = xcfg.AdvancedConfig()
+        cfg["XCFG_TEST_VAR"] = "entry"
+        overlay = xcfg.EnvOverlay(cfg, select=xcfg.KeySelector(["XCFG_TEST_*"]))
+        self.assertEqual(overlay["XCFG_TEST_VAR"], "entry")
+        overlay.cover()
+        self.assertEqual(overlay["XCFG_TEST_VAR"], "before")
+
+    def test_env_layer_keeps_environment(self):
+        stack = xcfg.ConfigStack().environ("e", ["XCFG_TEST_VAR"]).snapshot()
+        self.assertEqual(stack.config()["XCFG_TEST_VAR"], "before")
+        os.environ["XCFG_TEST_VAR"] = "after"
+        self.assertEqual(stack.update("x", {"x": "1"}).config()["XCFG_TEST_VAR"], "before")
+
+if __name__ == '__main__':
+    unittest.main()
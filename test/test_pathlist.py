@@ -0,0 +1,51 @@
+import sys
+import logging
+import unittest
+from StringIO import StringIO
+
+import xcfg
+
+class PathListTest(unittest.TestCase):
+
+    def test_ordered_set(self):
+        p = xcfg.PathList("/a:/b:/a")
+        p.append("/c")
+        p.prepend("/b")
+        p.remove("/a")
+        p.extendleft(["/x", "/y"])
+        self.assertEqual(p.render(), "/x:/y:/b:/c")
+        self.assertEqual(len(p), 4)
+        self.assertTrue("/c" in p)
+        self.assertEqual(xcfg.PathList("").render(), "")
+
+    def test_separator(self):
+        self.assertEqual(xcfg.PathList("a;b;a", ";").render(), "a;b")
+
+class ListEditTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.cli = xcfg.XcfgCLI()
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def output(self, *commands):
+        (stdout, sys.stdout) = (sys.stdout, StringIO())
+        try:
+            for command in commands:
+                self.cli.onecmd(command)
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def test_operators(self):
+        out = self.output("P=/a:/b", "P+=/c", "P++=/b", "P-=/a", "P+=/c", "sh=bash", "p")
+        self.assertEqual(out, "export P=/b:/c\n")
+
+    def test_clean(self):
+        out = self.output("P=/a:/b:/a:/b", "clean", "sh=bash", "p")
+        self.assertEqual(out, "export P=/a:/b\n")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+import xcfg
+
+class RenderTest(unittest.TestCase):
+
+    entries = {"ARCH": "x86_64", "ROOT": "/opt/$ARCH", "PATH": "$ROOT/bin:/usr/bin:$ROOT/bin"}
+
+    def test_targets(self):
+        texts = xcfg.render(self.entries, [xcfg.parse_target("bash"), xcfg.parse_target("csh-loc")])
+        self.assertEqual(texts, ["export ARCH=x86_64\nexport PATH=/opt/x86_64/bin:/usr/bin\nexport ROOT=/opt/x86_64\n",
+                                 "set ARCH=x86_64\nset PATH=/opt/x86_64/bin:/usr/bin\nset ROOT=/opt/x86_64\n"])
+
+    def test_arch_matches_default(self):
+        " a target for the ARCH the entries have renders as one without an arch "
+        (plain, arch, other) = xcfg.render(self.entries, [xcfg.parse_target("bash"),
+                                                          xcfg.parse_target("bash@x86_64"),
+                                                          xcfg.parse_target("bash@i686")])
+        self.assertEqual(plain, arch)
+        self.assertTrue("/opt/i686/bin" in other)
+
+    def test_output(self):
+        tmpdir = tempfile.mkdtemp(prefix="xcfg-test-")
+        try:
+            out = os.path.join(tmpdir, "env.sh")
+            (text,) = xcfg.render(self.entries, [xcfg.parse_target("bash=" + out)])
+            self.assertEqual(open(out).read(), text)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_bad_target(self):
+        self.assertRaises(ValueError, xcfg.parse_target, "bash@")
+
+class RenderCommandTest(unittest.TestCase):
+
+    def output(self, *commands):
+        cli = xcfg.XcfgCLI()
+        (stdout, sys.stdout) = (sys.stdout, StringIO())
+        try:
+            for command in commands:
+                cli.onecmd(command)
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def test_exp_and_clean_make_no_difference(self):
+        entries = ["%s=%s" % item for item in RenderTest.entries.items()]
+        plain   = self.output(*(entries + ["render:bash,bash@i686"]))
+        self.assertEqual(self.output(*(entries + ["exp", "clean", "render:bash,bash@i686"])), plain)
+        self.assertTrue("export PATH=/opt/x86_64/bin:/usr/bin\n" in plain)
+        self.assertTrue("export PATH=/opt/i686/bin:/usr/bin\n" in plain)
+
+if __name__ == '__main__':
+    unittest.main()
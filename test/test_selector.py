@@ -0,0 +1,85 @@
+import os
+import sys
+import shutil
+import logging
+import tempfile
+import unittest
+from StringIO import StringIO
+
+import xcfg
+
+class KeySelectorTest(unittest.TestCase):
+
+    def test_patterns(self):
+        sel = xcfg.KeySelector(["HOME", "LC_*", "*_HOME", "re:^PY", "X?"])
+        self.assertEqual(sel.select(["HOME", "LC_ALL", "JAVA_HOME", "PYTHONPATH", "XY", "HOMER", "XYZ", "LC"]),
+                         ["HOME", "LC_ALL", "JAVA_HOME", "PYTHONPATH", "XY"])
+        self.assertEqual(len(sel), 5)
+
+    def test_empty(self):
+        self.assertFalse("HOME" in xcfg.KeySelector())
+
+    def test_inline_flags_stay_local(self):
+        sel = xcfg.KeySelector(["re:(?i)^path$", "re:^LC_"])
+        self.assertTrue("Path" in sel)
+        self.assertTrue("LC_ALL" in sel)
+        self.assertFalse("lc_all" in sel)
+
+    def test_back_references(self):
+        sel = xcfg.KeySelector(["re:^(A)B", "re:^(x)y\\1$"])
+        self.assertTrue("xyx" in sel)
+        self.assertTrue("AB" in sel)
+        self.assertFalse("xyz" in sel)
+
+    def test_same_group_names(self):
+        sel = xcfg.KeySelector(["re:^(?P<x>a)", "re:^(?P<x>b)"])
+        self.assertEqual(sel.select(["ab", "ba", "c"]), ["ab", "ba"])
+
+    def test_many_groups(self):
+        sel = xcfg.KeySelector(["re:^(K%d)$" % n for n in range(150)])
+        self.assertTrue("K149" in sel)
+        self.assertFalse("K150" in sel)
+
+    def test_bad_regex(self):
+        sel = xcfg.KeySelector(["HOME"])
+        self.assertRaises(ValueError, sel.add, "re:(")
+        self.assertRaises(ValueError, sel.add, "[z-a]")
+        self.assertEqual(list(sel), ["HOME"])
+        self.assertTrue("HOME" in sel)
+
+class ListCommandTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmpdir = tempfile.mkdtemp(prefix="xcfg-test-")
+        self.cli    = xcfg.XcfgCLI()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        logging.disable(logging.NOTSET)
+
+    def output(self, *commands):
+        (stdout, sys.stdout) = (sys.stdout, StringIO())
+        try:
+            for command in commands:
+                self.cli.onecmd(command)
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def test_bad_regex_fails(self):
+        out = self.output("sh=bash", "A=1", "B=2", "wl=re:(", "p", "p:(")
+        self.assertEqual(out, "export A=1\nexport B=2\n")
+        self.assertEqual(self.cli.errors, 2)
+
+    def test_bad_line_in_file(self):
+        wl = os.path.join(self.tmpdir, "wl")
+        fh = open(wl, "w")
+        fh.write("A # first\nre:(\n")
+        fh.close()
+        out = self.output("sh=bash", "A=1", "B=2", "wl=B", "wl:" + wl, "p")
+        self.assertEqual(out, "export B=2\n")
+        self.assertEqual(self.cli.errors, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+from StringIO import StringIO
+
+import xcfg
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class WriterTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmpdir = tempfile.mkdtemp(prefix="xcfg-test-")
+        self.cfg    = xcfg.AdvancedConfig(os.path.join(HERE, "test-001.xcfg"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        logging.disable(logging.NOTSET)
+
+    def roundtrip(self, cfg):
+        path = os.path.join(self.tmpdir, "out.xcfg")
+        cfg.toFile(path)
+        return xcfg.AdvancedConfig(path)
+
+    def test_xml_roundtrip(self):
+        cfg = self.roundtrip(self.cfg)
+        self.assertEqual(cfg.todict(), self.cfg.todict())
+        self.assertEqual(sorted(cfg.keys()), sorted(self.cfg.keys()))
+        self.assertEqual(cfg.zip.todict(), {"a": "x", "b": "y"})
+
+    def test_xml_quoting(self):
+        self.cfg["q"] = 'a "b" <c> & d\te'
+        self.cfg.zap.text = "x < y & z"
+        self.cfg.empty = ""
+        cfg = self.roundtrip(self.cfg)
+        self.assertEqual(cfg.q, 'a "b" <c> & d\te')
+        self.assertEqual(cfg.zap.text, "x < y & z")
+        self.assertEqual(cfg.empty, "")
+
+    def test_document_element(self):
+        out = StringIO()
+        self.cfg.toFile(out)
+        self.assertTrue("\n<config " in out.getvalue())
+        out = StringIO()
+        xcfg.write_xml(self.cfg, out, "site")
+        self.assertTrue("\n<site " in out.getvalue())
+
+    def test_unicode(self):
+        self.cfg["u"] = u"caf\xe9"
+        self.assertEqual(self.roundtrip(self.cfg).u, u"caf\xe9")
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.cfg = xcfg.AdvancedConfig(os.path.join(HERE, "test-001.xcfg"))
+        self.cfg.zap.foo = "zap"
+        self.cfg["P"] = xcfg.PathList("/a:/b")
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def snapshot(self):
+        out = StringIO()
+        self.cfg.toSnapshot(out)
+        out.seek(0)
+        return out
+
+    def test_roundtrip(self):
+        cfg = xcfg.load_snapshot(self.snapshot())
+        self.assertEqual(cfg.todict(), self.cfg.todict())
+        self.assertEqual(cfg.collisions(), self.cfg.collisions())
+        self.assertEqual(sorted(cfg.keys()), sorted(self.cfg.keys()))
+        self.assertTrue(isinstance(cfg["P"], xcfg.PathList))
+
+    def test_nodetypes(self):
+        compact = xcfg.load_snapshot(self.snapshot(), xcfg.CompactConfig)
+        self.assertEqual(compact.todict(), self.cfg.todict())
+        frozen = xcfg.load_snapshot(self.snapshot(), xcfg.FrozenConfig)
+        self.assertEqual(frozen, self.cfg.freeze())
+
+    def test_other_values_left_out(self):
+        self.cfg["n"] = 5
+        cfg = xcfg.load_snapshot(self.snapshot())
+        self.assertFalse("n" in cfg.keys())
+        self.assertEqual(sorted([k for (k, v) in cfg.items()]), sorted([k for k in self.cfg.keys() if k != "n"]))
+
+    def test_rejects_garbage(self):
+        self.assertRaises(ValueError, xcfg.load_snapshot, StringIO("not a snapshot"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import sys
+import logging
+import unittest
+from StringIO import StringIO
+
+import xcfg
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class ConfigStackTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.stack = xcfg.ConfigStack().load(os.path.join(HERE, "s1.xcfg"))
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_layers(self):
+        stack = self.stack.update("x", {"foo": "baz"}).delete("unset", ["zip"])
+        self.assertEqual([kind for (label, kind, data) in stack.layers()], ["load", "set", "unset"])
+        cfg = stack.config()
+        self.assertEqual(cfg.foo, "baz")
+        self.assertFalse("zip" in cfg.keys())
+        self.assertEqual(self.stack.config().foo, "bar")
+
+    def test_snapshot_rollback(self):
+        kept  = self.stack.update("a", {"a": "1"}).snapshot()
+        kept.config()
+        later = kept.update("b", {"a": "2", "b": "2"})
+        self.assertEqual(later.config().a, "2")
+        self.assertEqual(kept.config().a, "1")
+        self.assertFalse("b" in kept.config().keys())
+
+    def test_pathlist_copied_on_snapshot(self):
+        kept = self.stack.update("p", {"P": xcfg.PathList("/a:/b")}).snapshot()
+        kept.config()
+        top  = kept.update("q", {"q": "1"}).config()
+        top["P"].append("/c")
+        self.assertEqual(kept.config()["P"].render(), "/a:/b")
+        self.assertEqual(top["P"].render(), "/a:/b:/c")
+
+    def test_missing_file(self):
+        self.assertTrue(self.stack.load(os.path.join(HERE, "missing.xcfg")) is self.stack)
+
+class SnapCommandTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.cli = xcfg.XcfgCLI()
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def output(self, *commands):
+        (stdout, sys.stdout) = (sys.stdout, StringIO())
+        try:
+            for command in commands:
+                self.cli.onecmd(command)
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def test_snap_rollback(self):
+        out = self.output("a=1", "P=/a", "snap", "a=2", "P+=/x", "rollback", "sh=bash", "p")
+        self.assertEqual(out, "export P=/a\nexport a=1\n")
+
+    def test_list_edits_share_a_layer(self):
+        self.output("P=/a", "P+=/b", "P+=/c", "P-=/a")
+        self.assertEqual(len(self.cli.stack.layers()), 2)
+        self.assertEqual(xcfg.valuestr(self.cli.xcfg["P"]), "/b:/c")
+
+if __name__ == '__main__':
+    unittest.main()
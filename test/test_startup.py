@@ -0,0 +1,23 @@
+import os
+import unittest
+import py_compile
+
+from bench import startup
+
+class StartupTest(unittest.TestCase):
+    " import xcfg stays within the budget of bench.startup "
+
+    def setUp(self):
+        py_compile.compile(os.path.join(startup.TOP, "xcfg.py")) # time the import, not the compile
+
+    def test_budget(self):
+        results = [startup.child() for n in range(5)]
+        best    = min([ms for (ms, loaded) in results])
+        self.assertTrue(best <= startup.BUDGET, "import xcfg: %.2f ms, budget %.2f ms" % (best, startup.BUDGET))
+
+    def test_deferred_imports(self):
+        (ms, loaded) = startup.child()
+        self.assertEqual(loaded, [])
+
+if __name__ == '__main__':
+    unittest.main()
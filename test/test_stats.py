@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import shutil
+import logging
+import tempfile
+import unittest
+from StringIO import StringIO
+
+import xcfg
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class StatsTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.environ = os.environ.pop("XCFG_STATS", None)
+        self.cli     = xcfg.XcfgCLI()
+        self.tmpdir  = tempfile.mkdtemp(prefix="xcfg-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        if self.environ is not None:
+            os.environ["XCFG_STATS"] = self.environ
+        logging.disable(logging.NOTSET)
+
+    def run_commands(self, *commands):
+        (stdout, stderr) = (sys.stdout, sys.stderr)
+        (sys.stdout, sys.stderr) = (StringIO(), StringIO())
+        try:
+            for command in commands:
+                self.cli.onecmd(command)
+            return (sys.stdout.getvalue(), sys.stderr.getvalue())
+        finally:
+            (sys.stdout, sys.stderr) = (stdout, stderr)
+
+    def test_counters(self):
+        (out, err) = self.run_commands("stats=on", "load:" + os.path.join(HERE, "s1.xcfg"),
+                                       "x=1", "x=2", "sh=bash", "p", "nonsense!")
+        counts = self.cli.stats.commands
+        self.assertEqual(self.cli.stats.order, ["load", "default", "sh", "p"])
+        self.assertEqual(counts["load"][0], 1)
+        self.assertEqual(counts["load"][2], 2)  # foo and zip
+        self.assertEqual(counts["default"][:1] + counts["default"][2:], [3, 2, 0])
+        self.assertEqual(counts["p"][3], len(out))
+
+    def test_json(self):
+        output = os.path.join(self.tmpdir, "stats.json")
+        self.run_commands("stats=" + output, "x=1", "sh=bash", "p")
+        self.cli.stats.finish()
+        data = json.load(open(output))
+        self.assertEqual(data["order"], ["default", "sh", "p"])
+        self.assertEqual(data["commands"]["p"]["bytes"], len("export x=1\n"))
+
+    def test_report_and_off(self):
+        (out, err) = self.run_commands("stats=on", "x=1", "stats")
+        self.assertTrue(err.startswith("command"), err)
+        self.assertTrue("total" in err)
+        self.run_commands("stats=off")
+        self.assertEqual(self.cli.stats, None)
+        (out, err) = self.run_commands("stats")
+        self.assertEqual(err, "stats: off\n")
+
+    def test_profile(self):
+        (out, err) = self.run_commands("profile=p", "x=1", "p")
+        self.assertTrue("profile of p:" in err)
+        self.assertTrue("function calls" in err)
+
+if __name__ == '__main__':
+    unittest.main()
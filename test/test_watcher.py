@@ -0,0 +1,70 @@
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+
+import xcfg
+
+class ConfigWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmpdir = tempfile.mkdtemp(prefix="xcfg-test-")
+        self.paths  = [self.write("f%d.xcfg" % n, '<c k%d="%d" last="%d"/>' % (n, n, n)) for n in range(4)]
+        self.write("inc.xcfg", '<c inc="1"/>')
+        self.paths.append(self.write("top.xcfg", '<c><include href="inc.xcfg"/></c>'))
+        self.watcher = xcfg.ConfigWatcher(self.paths, backend="poll")
+
+    def tearDown(self):
+        self.watcher.stop()
+        shutil.rmtree(self.tmpdir)
+        logging.disable(logging.NOTSET)
+
+    def write(self, name, text):
+        path = os.path.join(self.tmpdir, name)
+        fh = open(path + ".tmp", "w")
+        fh.write(text)
+        fh.close()
+        os.rename(path + ".tmp", path) # a new inode, as editors save
+        return path
+
+    def test_first_load(self):
+        self.assertEqual(self.watcher.config.last, "3")
+        self.assertEqual(self.watcher.config.inc, "1")
+        self.assertEqual(self.watcher.cache.misses, 6) # each file parsed once
+        self.assertEqual(len(self.watcher.stamps), 6)
+
+    def test_only_changed_files_parsed(self):
+        self.assertEqual(self.watcher.check(), {})
+        self.write("f1.xcfg", '<c k1="one" last="1"/>')
+        self.assertEqual(self.watcher.check(), {"k1": ("1", "one")})
+        self.assertEqual(self.watcher.cache.misses, 7)
+        self.write("inc.xcfg", '<c inc="2"/>')
+        self.assertEqual(self.watcher.check(), {"inc": ("1", "2")})
+        self.assertEqual(self.watcher.cache.misses, 8)
+
+    def test_same_size_edit(self):
+        " an edit in place within the mtime resolution, keeping the size "
+        path = self.paths[0]
+        fh = open(path, "r+")
+        fh.write('<c k0="9"')
+        fh.close()
+        self.assertEqual(self.watcher.check(), {"k0": ("0", "9")})
+
+    def test_subscribe(self):
+        seen = []
+        self.watcher.subscribe(lambda cfg, changes: seen.append((cfg.k2, changes)))
+        old = self.watcher.config
+        self.write("f2.xcfg", '<c k2="two" last="2"/>')
+        self.watcher.check()
+        self.assertEqual(seen, [("two", {"k2": ("2", "two")})])
+        self.assertEqual(old.k2, "2") # a tree once obtained never changes
+
+    def test_missing_file(self):
+        os.unlink(self.paths[0])
+        self.assertEqual(self.watcher.check(), {"k0": ("0", None)})
+        self.assertEqual(self.watcher.check(), {})
+
+if __name__ == '__main__':
+    unittest.main()
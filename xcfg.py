@@ -75,30 +75,35 @@ environment variables); and enables combining in arbitrary order settings from
 files, command line, and environment and outputting some or all of these.
 """
 
-import cmd
+# Only what a one-shot "xcfg file.xcfg" needs is imported here, keep it that
+# way: cmd and readline are imported when the interactive mode starts,
+# xml.dom.minidom by the DOM based methods, tempfile and hashlib by the
+# compiled cache.  python -m bench.startup checks the import time budget.
 import sys
-import optparse
+import gc
 import logging
-import signal
 import re
 import os
-import inspect
-import logging
 import string
-
-try:
-    import readline
-except:
-    pass # this just reduces some of the CLI features that are available
+import time
 
 import UserDict
+import marshal
+import itertools
 
-import xml.dom.minidom
-from   xml.dom         import Node
+import xml.parsers.expat
+from   xml.parsers.expat import ExpatError
 
 (major, minor, patch, note, other) = sys.version_info
 
-level_str = os.environ.get("PYLOG","DEBUG")
+def md5(data=""):
+    " hashlib.md5, imported on first use "
+    global md5
+    try:
+        from hashlib import md5
+    except ImportError:
+        from md5 import new as md5
+    return md5(data)
 
 # Python 2.3 compatible dictionary replacement using %(varname)s
 def j(str, d):
@@ -117,12 +122,18 @@ def i(str):
     return j(str, d)
 
 if (major >= 2) and (minor >= 4):
-    logging.basicConfig(level=logging._levelNames[level_str], stream=sys.stderr, format="%(asctime)s:%(levelname)s:%(module)s:%(lineno)d:%(message)s", datefmt="%s")
     i = lambda _   : string.Template(_).safe_substitute(sys._getframe(1).f_globals, **sys._getframe(1).f_locals)
     j = lambda t,d : string.Template(t).safe_substitute(d)
 else:
     from sets import Set as set
-    logging.basicConfig()
+
+def setup_logging():
+    " Log to stderr at the level named by $PYLOG [DEBUG], for the xcfg command "
+    level_str = os.environ.get("PYLOG","DEBUG")
+    if (major >= 2) and (minor >= 4):
+        logging.basicConfig(level=logging._levelNames[level_str], stream=sys.stderr, format="%(asctime)s:%(levelname)s:%(module)s:%(lineno)d:%(message)s", datefmt="%s")
+    else:
+        logging.basicConfig()
 
 
 class SimpleConfig:
@@ -139,52 +150,319 @@ class INIConfig:
 
     def read(self, filename):
         " Parse an XConfig XML file and return an object with attributes and values "
+        depth = [0]
+        def start(name, attrs):
+            # convert all attributes on a child of the root into a dictionary
+            # for this section, deeper elements are ignored
+            depth[0] += 1
+            if depth[0] == 2:
+                self.d[localname(name)] = attrlist2dict(attrs)
+        def end(name):
+            depth[0] -= 1
+
         try:
-            doc  = xml.dom.minidom.parse(filename)
+            expat_parse(filename, start, end)
         except:
             logging.error('read failed: %s' % filename)
             return
-        root = doc.documentElement
-        # Process children, collecting text and recursing into elements.
-        # Assign as elements of this node.
-        for section_node in root.childNodes:
-            if section_node.nodeType == Node.ELEMENT_NODE:
-                # convert all attributes on this to a dictionary for this section
-                sec = {}
-                idx = 0
-                while idx < section_node.attributes.length:
-                    attr = section_node.attributes.item(idx)
-                    sec[attr.localName] = attr.value
-                    idx += 1
-                self.d[section_node.localName] = sec
         
 class AdvancedConfig(UserDict.DictMixin):
-    """ This is an empty holder class that will have config attributes added to it """
+    """ A config node.  Its entries (leaves and child nodes) are kept in a
+        dictionary, and attribute access is a thin proxy onto it: cfg.foo is
+        cfg["foo"] unless foo is a method, so an entry called read or keys
+        never breaks the node (use cfg["read"] for it).  Keys are the
+        entries in keylist; items(), values(), update() and copy() work on
+        the dictionary directly.
+
+        todict(), collisions() and // queries use a LeafIndex of the
+        subtree, built in one walk when first needed.  Setting or deleting
+        a leaf (which is what xsetattr, __setitem__ and __delitem__ do)
+        stamps it, so that the index can tell which of several leaves with
+        the same name was set last, and updates the indexes built on the
+        node and the nodes above it in place.  Setting or deleting a child
+        node counts a change in the generation the nodes of the tree share,
+        which throws the indexes away.  Entries whose name contains "__"
+        (such as __TEXT) are not indexed, and keylist and the
+        _AdvancedConfig__ attributes are not entries.
+    """
 
     def __getitem__(self, key):
-        if hasattr(self, key):
-            return getattr(self, key)
-        else:
-            raise KeyError(key)
-    
+        return self.__store[key]
+
     def __setitem__(self, key, item):
         self.keylist.add(key)
-        setattr(self, key, item)
-    
+        self.__set(key, item)
+
     def __delitem__(self, key):
+        if key not in self.__store:
+            raise KeyError(key)
         self.keylist.discard(key)
-        delattr(self,key)
-    
+        self.__unset(key)
+
     def keys(self):
         return list(self.keylist)
-    
+
+    # the rest of the dictionary interface, on the store rather than
+    # through __getitem__ as UserDict.DictMixin would
+    def has_key(self, key):
+        return key in self.__store
+
+    __contains__ = has_key
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keylist)
+
+    def iteritems(self):
+        store = self.__store
+        for k in self.keys():
+            yield (k, store[k])
+
+    def items(self):
+        store = self.__store
+        return [(k, store[k]) for k in self.keylist]
+
+    def values(self):
+        store = self.__store
+        return [store[k] for k in self.keylist]
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def get(self, key, default=None):
+        return self.__store.get(key, default)
+
+    def update(self, other=None, **kw):
+        if other is not None:
+            if hasattr(other, "items"):
+                other = other.items()
+            for (k, v) in other:
+                self[k] = v
+        for (k, v) in kw.items():
+            self[k] = v
+
+    def copy(self):
+        """ A new tree with the same entries, keys and name.  Nodes and
+            PathLists are copied, any other value is shared (strings are
+            immutable); the stamps are kept, so todict() picks the same
+            colliding leaves. """
+        cfg = self.__copy([0, False])
+        cfg.__dict__["_AdvancedConfig__NAME"] = self.__dict__.get("_AdvancedConfig__NAME")
+        return cfg
+
+    def __copy(self, tree):
+        " A copy of this subtree, in tree (see __init__) "
+        cfg    = AdvancedConfig()
+        d      = cfg.__dict__
+        store  = d["_AdvancedConfig__store"]
+        d["keylist"]                 = set(self.keylist)
+        d["_AdvancedConfig__stamps"] = self.__stamps.copy()
+        d["_AdvancedConfig__tree"]   = tree
+        for (name, value) in self.__store.iteritems():
+            if isinstance(value, AdvancedConfig):
+                value = value.__copy(tree)
+            elif isinstance(value, PathList):
+                value = snapshot_pathlist([value.sep] + list(value))
+            store[name] = value
+        return cfg
+
     def __init__(self, filename=None):
-        self.keylist = set()
+        # internal attributes are put straight into __dict__ (as they are in
+        # __build), __setattr__ is too slow for something done on every node.
+        # stamps: entry -> when it was set; tree: [generation, indexed]
+        # shared by the nodes of the tree, created when first needed, indexed
+        # is True once a node has an index of this generation; index: (tree,
+        # generation, LeafIndex) of this subtree, see _leafindex; parent,
+        # set when an index walks the node: (node, name, walk) it is the
+        # entry of, False if it was found in several places, see _leaves
+        self.__dict__.update({"keylist"                 : set(),
+                              "_AdvancedConfig__store"  : {},
+                              "_AdvancedConfig__stamps" : {},
+                              "_AdvancedConfig__tree"   : None,
+                              "_AdvancedConfig__index"  : None})
         if filename != None:
             self.read(filename)
 
-    def read(self, filename, mode="load"):
-        " Parse an XConfig XML file and return an object with attributes and values "
+    def __getattr__(self, name):
+        # only called for names which are not methods or internal attributes
+        try:
+            return self.__dict__["_AdvancedConfig__store"][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        if name == "keylist" or name.startswith("_AdvancedConfig__"):
+            self.__dict__[name] = value
+        else:
+            self.__set(name, value)
+
+    def __delattr__(self, name):
+        if name == "keylist" or name.startswith("_AdvancedConfig__"):
+            del self.__dict__[name]
+        elif name not in self.__store:
+            raise AttributeError(name)
+        else:
+            self.keylist.discard(name)
+            self.__unset(name)
+
+    def __set(self, name, value):
+        " Set entry name to value, stamping it and updating (or counting the change for) the indexes "
+        d     = self.__dict__
+        store = d["_AdvancedConfig__store"]
+        old   = store.get(name)
+        store[name] = value
+        if "__" in name:
+            return
+        d["_AdvancedConfig__stamps"][name] = _stamp()
+        tree = d["_AdvancedConfig__tree"]
+        if tree is None:
+            tree = d["_AdvancedConfig__tree"] = [0, False]
+        if isinstance(old, AdvancedConfig) or isinstance(value, AdvancedConfig):
+            tree[0] += 1
+            tree[1]  = False
+            if isinstance(old, AdvancedConfig) and old is not value:
+                old.__dict__.pop("_AdvancedConfig__parent", None)
+                old.__join([0, False]) # detached, it is a tree of its own
+            if isinstance(value, AdvancedConfig):
+                value.__join(tree)
+        elif tree[1]:
+            self.__reindex(tree, name, value)
+
+    def __unset(self, name):
+        old = self.__store.pop(name)
+        if "__" not in name:
+            self.__stamps.pop(name, None)
+            tree = self.__dict__["_AdvancedConfig__tree"]
+            if isinstance(old, AdvancedConfig):
+                if tree is not None:
+                    tree[0] += 1
+                    tree[1]  = False
+                old.__dict__.pop("_AdvancedConfig__parent", None)
+                old.__join([0, False])
+            elif tree is not None and tree[1]:
+                self.__reindex(tree, name, None)
+
+    def __reindex(self, tree, name, value):
+        """ Update the current indexes of this node and the nodes above it
+            for entry name, a leaf set to value (None if it was removed).  If
+            a node on the way is shared, count a change instead. """
+        path = (name,)
+        node = self
+        while True:
+            d    = node.__dict__
+            memo = d["_AdvancedConfig__index"]
+            if memo is not None and memo[0] is tree and memo[1] == tree[0]:
+                memo[2].update(path, value)
+            parent = d.get("_AdvancedConfig__parent")
+            if parent is None:
+                return
+            if parent is False:
+                tree[0] += 1
+                tree[1]  = False
+                return
+            (node, slot) = parent[:2]
+            path = (slot,) + path
+
+    def __entries(self):
+        " (name, value) for the leaves and child nodes of this node "
+        return [(name, value) for (name, value) in self.__store.items() if "__" not in name]
+
+    def __join(self, tree):
+        " Make this subtree part of the tree whose generation is tree "
+        if self.__dict__["_AdvancedConfig__tree"] is tree:
+            return
+        self.__dict__["_AdvancedConfig__tree"] = tree
+        store = self.__store
+        if store: # a node being read is empty when it joins
+            for value in store.itervalues():
+                if isinstance(value, AdvancedConfig):
+                    value.__join(tree)
+
+    def _leafindex(self):
+        " The LeafIndex of this subtree, built again if the tree has changed "
+        d    = self.__dict__
+        tree = d["_AdvancedConfig__tree"]
+        if tree is None:
+            tree = d["_AdvancedConfig__tree"] = [0, False]
+        memo = d["_AdvancedConfig__index"]
+        if memo is None or memo[0] is not tree or memo[1] != tree[0]:
+            memo = d["_AdvancedConfig__index"] = (tree, tree[0], LeafIndex(self))
+            tree[1] = True
+        return memo[2]
+
+    def _leaves(self, path, found, walk):
+        """ Append (stamp, path, value) for every leaf of this subtree to
+            found, and (None, path, node) for the nodes.  The nodes are told
+            their parent on the way, walk (an object for the walk) tells
+            when one is found twice, and so can't say which it is. """
+        stamps = self.__stamps
+        for (name, value) in self.__store.iteritems():
+            if "__" in name:
+                continue
+            if isinstance(value, AdvancedConfig):
+                found.append((None, path + (name,), value))
+                d      = value.__dict__
+                parent = d.get("_AdvancedConfig__parent")
+                if parent is not False:
+                    if parent is not None and parent[2] is walk:
+                        d["_AdvancedConfig__parent"] = False
+                    else:
+                        d["_AdvancedConfig__parent"] = (self, name, walk)
+                value._leaves(path + (name,), found, walk)
+            elif isleaf(value):
+                found.append((stamps.get(name, 0), path + (name,), value))
+        return found
+
+    def collisions(self):
+        """ Leaf names which occur more than once in the tree, as a dictionary
+            of name -> list of paths ("zap/blort"), the one todict() uses last.
+        """
+        return self._leafindex().collisions()
+
+    def read(self, filename, mode="load", cache=None):
+        """ Parse an XConfig XML file and return an object with attributes and values.
+            The file is streamed through XcfgLoader, so no DOM is built.  A
+            malformed file is reported, but elements which closed before the
+            error was found will already have been applied.
+            The event records of the file and of the files it includes are
+            kept in cache, a CompiledCache (parse_cache, the one for the
+            process, by default), and an up to date copy is replayed instead
+            of parsing a file again.  cache=False always parses.
+
+            <include href="file"/> elements are replaced by the contents of
+            the document element of file (see XcfgLoader.include).
+        """
+        if cache is None:
+            cache = parse_cache
+        elif cache is False:
+            cache = None
+        loader = XcfgLoader(self, mode, filename=getattr(filename, "name", filename), cache=cache)
+        try:
+            if cache is not None and not hasattr(filename, "read"):
+                events = cache.lookup(filename)
+                if events is None:
+                    cache.parse(loader, filename)
+                else:
+                    loader.replay(events)
+            else:
+                loader.parse(filename)
+        except (IOError, OSError, ExpatError), e:
+            logging.error('read failed: %s (%s)' % (filename, e))
+            return
+        self.__NAME = loader.name
+
+    def replay(self, events, mode="load", filename=None, cache=None):
+        """ Apply the event record of a file (see compile_file) as read()
+            would, includes are relative to filename (and kept in cache) """
+        loader = XcfgLoader(self, mode, filename=filename, cache=cache)
+        loader.replay(events)
+        self.__NAME = loader.name
+
+    def readdom(self, filename, mode="load"):
+        " Same as read(), but builds an xml.dom.minidom document and walks it "
+        import xml.dom.minidom
         try:
             doc  = xml.dom.minidom.parse(filename)
         except:
@@ -205,46 +483,50 @@ class AdvancedConfig(UserDict.DictMixin):
             setattr(self, attr, val)
             self.keylist.add(attr)
         elif mode=="merge":
-            if hasattr(self, attr):
+            old = self.__store.get(attr)
+            if isleaf(old):
                 # FIXME: separator needs to be configurable
-                setattr(self, attr, getattr(self, attr) + ":" + val.strip()) 
+                setattr(self, attr, valuestr(old) + ":" + val.strip()) 
             else:
                 setattr(self, attr, val)
                 self.keylist.add(attr)
                 
-    def exp(self):
-        """ Expand user and environment variables in all entries"""
-        # FIXME: Cyclical references in environment variables will screw things
-        # up, and unfortunately this is pretty common, e.g. PATH=$PATH:/foo/bar
-        # TODO: implement exp:foo and exp:REGEX
-        # expand system environment first in all dictionary entries
-        for (k,v) in self.items():
-            self[k] = os.path.expandvars(v)
-            self[k] = os.path.expanduser(self[k])
-        # expand config variables second (self-complete values from
-        for (k,v) in self.items():
-            self[k] = j(self[k],self)
-        # second pass to substitute back in values for situations such as:
-        # foo=xyz
-        # first=$second/zip/zap
-        # second=abc/$foo
-        for (k,v) in self.items():
-            self[k] = j(self[k],self)
+    def exp(self, keys=None):
+        """ Expand user and environment variables in all entries, or only in
+            the entries named in keys.  See Expander for the rules.
+        """
+        for (k, v) in self.expanded(keys).items():
+            self[k] = v
+
+    def expanded(self, keys=None):
+        " The values exp() would set, as a dictionary "
+        expanded = Expander(self).expand(keys)
+        if keys is None:
+            return expanded
+        return dict([(k, expanded[k]) for k in keys if k in expanded])
 
     def s(self):
         """ Update environment from object entries """
-        os.environ.update(self)
+        for (k,v) in self.items():
+            os.environ[k] = valuestr(v)
 
 
-    def clean(self, sep):
-        """ Go through all dictionary entries and remove duplicates in each
-            entry based on separator """
-        for (k,v) in self.items():
-            final = []
-            for p in self[k].split(sep):
-                if not p in final:
-                    final.append(p)
-            self[k] = sep.join(final)
+    def clean(self, sep, keys=None):
+        """ Go through all dictionary entries (or only those named in keys)
+            and remove duplicates in each entry based on separator """
+        for (k, v) in self.cleaned(sep, keys).items():
+            self[k] = v
+
+    def cleaned(self, sep, keys=None):
+        " The values clean() would set, as a dictionary "
+        if keys is None:
+            keys = self.keys()
+        result = {}
+        for k in keys:
+            v = valuestr(self[k])
+            if isinstance(v, basestring):
+                result[k] = PathList(v, sep).render()
+        return result
 
     def parse_element(self, node, mode):
         """ An element is referred to by its local name.  It could have attributes,
@@ -269,20 +551,23 @@ class AdvancedConfig(UserDict.DictMixin):
         # Process children, collecting text and recursing into elements.
         # Assign as elements of this node.
         for n in node.childNodes:
-            if n.nodeType == Node.ELEMENT_NODE:
+            if n.nodeType == n.ELEMENT_NODE:
                 hasElements = True
                 if mode=="load":
                     cfg = AdvancedConfig()
                     setattr(self, n.localName, cfg)
                 elif mode=="merge":
-                    if hasattr(self,n.localName):   # already exists
-                        cfg = self.d[n.localName]
+                    old = self.get(n.localName)
+                    if isinstance(old, AdvancedConfig): # already exists
+                        cfg = old
                     else:                           # same as load
                         cfg = AdvancedConfig()
+                        if isinstance(old, basestring): # text is appended to
+                            setattr(cfg, "__TEXT", old)
                         setattr(self, n.localName, cfg)
-	            cfg.parse_element(n, mode)
+                cfg.parse_element(n, mode)
                         
-            elif n.nodeType == Node.TEXT_NODE:
+            elif n.nodeType == n.TEXT_NODE:
                 hasText = True
                 text_list.append(n.nodeValue.strip())
 
@@ -315,21 +600,59 @@ class AdvancedConfig(UserDict.DictMixin):
 
     def axpath(self,path):
         """ Almost XPath query.  Splits on slashes to query AdvancedConfig object.
-            AXPath doesn't support SCS/predicates, and doesn't know anything about
-            axes, namespaces, or attribute identifiers (attributes get munged into
-            the / path syntax).
+            AXPath doesn't know anything about axes other than child (/) and
+            descendant (//), namespaces, or attribute identifiers (attributes
+            get munged into the / path syntax).  Steps may be * and may have
+            [name=value] predicates, e.g.  //zip[a='x']/b
+
+            Returns the first match and raises AttributeError if nothing
+            matches, see axselect() for all of them.
         """
-        path   = path.strip("/") # remove leading and trailing slashes
-        parts  = path.split("/")
-        result = ""
-        if   len(parts) == 0:
-            result = self
-        elif len(parts) == 1:
-            result = getattr(self,parts[0])
-        elif len(parts) > 1:
-            result = AdvancedConfig.axpath(getattr(self, parts[0]), "/".join(parts[1:]))
+        result = self.axselect(path)
+        if not result:
+            raise AttributeError(path)
+        return result[0]
 
-        return result
+    def axselect(self, path):
+        """ List of all the nodes and values matching AXPath path, see
+            axselect() (the function).  Descendant steps look names up in
+            the tree's index.
+        """
+        return axselect(self, path)
+
+    def freeze(self):
+        " An immutable snapshot of this subtree, see FrozenConfig "
+        return freeze(self, self.todict())
+
+    def _children_items(self):
+        " (name, value) for the entries of this node "
+        return self.__entries()
+
+    def _children(self, name):
+        " Entries named name, or all entries for *, for AXPath "
+        if name == "*":
+            return [value for (slot, value) in sorted(self.__entries())]
+        if "__" not in name and name in self.__store:
+            return [self.__store[name]]
+        return []
+
+    def _descendants(self, name):
+        " Nodes and values named name (or all for *) below this node, for AXPath "
+        if name == "*":
+            found = []
+            for (slot, value) in sorted(self.__entries()):
+                found.append(value)
+                if isinstance(value, AdvancedConfig):
+                    found.extend(value._descendants("*"))
+            return found
+        index = self._leafindex()
+        found = []
+        for path in sorted(index.paths.get(name, []) + index.nodes.get(name, [])):
+            node = self
+            for step in path:
+                node = node.__store[step]
+            found.append(node)
+        return found
 
     def convert_text(self):
         """ Converts AdvancedConfig attributes with __TEXT into a simple
@@ -337,380 +660,4001 @@ class AdvancedConfig(UserDict.DictMixin):
             figure out how to "in place" convert a text-only AdvancedConfig
             object into a string (self = text doesn't work).
         """
-        for slot in dir(self):
-            attr = getattr(self,slot)
-            attr_type = type(attr).__name__
-            if attr_type == "instance":
-                if "__TEXT" in dir(attr):
-                    setattr(self, slot, getattr(attr, "__TEXT"))
+        for (slot, attr) in self.__entries():
+            if isinstance(attr, AdvancedConfig):
+                if "__TEXT" in attr.__store:
+                    setattr(self, slot, attr.__store["__TEXT"])
                 else:
-                    AdvancedConfig.convert_text(attr)
+                    attr.convert_text()
 
     def todict(self):
-        """ Munge (technical term) XConfig file into a single dictionary.
-            Creates an AdvancedConfig object and then traverses it in a
-            quasi-depth first fashion (siblings are processed in a random
-            order) assigning all leaf nodes (attribute/string-value) to
-            dictionary entries.  Anything containing "__" will be ignored.
-
-            Basically, if you don't repeat node names anywhere, you'll be
-            fine. If you do, your resulting dictionary may not have the
-            values you expect.
-        """
-        d = {}
-
-        for slot in dir(self):
-            if slot.find("__") >= 0: continue # skip attributes containing "__"
-            attr = getattr(self,slot)
-            attr_type = type(attr).__name__
-            if attr_type == "str" or attr_type == "unicode":
-                d[slot] = attr
-            elif attr_type == "instance":
-                d.update(AdvancedConfig.todict(getattr(self, slot)))
+        """ Munge (technical term) XConfig file into a single dictionary of
+            all leaf nodes (attribute/string-value) in this subtree.  Anything
+            containing "__" will be ignored.
 
-        return d
+            If you repeat node names, the leaf which was set last wins, and
+            collisions() tells you which names are affected.
+        """
+        return self._leafindex().todict()
     
-    def toFile(self, filename):
-        impl = xml.dom.minidom.getDOMImplementation()
+    def toFile(self, out):
+        """ Write this tree as XConfig XML to out (a file name or an open
+            file), see write_xml """
+        write_xml(self, out)
 
-        if hasattr(self, "__NAME"):
-            name = self.__NAME
-        else:
-            name = "xconfig"
-        
-        xcfg_dom  = impl.createDocument(None, name, None)
-        xcfg_root = xcfg_dom.documentElement
-        for entry in dir(self):
-            if entry.startswith("__"):
-                continue
-            attr = getattr(self, entry)
-            if type(attr) == type("abc"):
-                attr = attr.strip()
-                if attr.find("\n") >= 0:
-                    ele = xcfg_dom.createElement(entry)
-                    text = xcfg_dom.createTextNode("\n%s\n" % attr)
-                    ele.appendChild(text)
-                    xcfg_root.appendChild(ele)
-                else:
-                    new_attr = xcfg_dom.createAttribute(entry)
-                    xcfg_root.setAttributeNode(new_attr)
-                    xcfg_root.setAttribute(entry, attr)
-            elif hasattr(attr, "items"):
-                ele = xcfg_dom.createElement(entry)
-                xcfg_root.appendChild(ele)
-                for (k,v) in attr.items():
-                    new_attr = xcfg_dom.createAttribute(k)
-                    ele.setAttributeNode(new_attr)
-                    ele.setAttribute(k, v)
-        
-        out_fh = open(filename, "w")
-        out_fh.write(xcfg_root.toprettyxml(indent="  "))
-        out_fh.write("\n<!-- \n# vim:set sw=20 ts=20 : -->")
-        out_fh.close()
+    def toSnapshot(self, out):
+        " Write this tree as a binary snapshot to out, see write_snapshot "
+        write_snapshot(self, out)
 
-def parsed(filename):
-    " Parse an XConfig XML file and return a dictionary of name/value pairs "
-    xcfg_dict   = {}
-    doc         = xml.dom.minidom.parse(filename)
-    root        = doc.documentElement
-    idx = 0
-    while idx < root.attributes.length:
-        attr = root.attributes.item(idx)
-        xcfg_dict[attr.localName] = attr.value
-        idx += 1
+    def _restore(self, tree, order=None):
+        """ Fill this new, empty node from a snapshot tree (see
+            load_snapshot).  The nodes are built in one pass, without going
+            through __setattr__; order gives the paths of colliding leaves
+            in the order they were set. """
+        self.__build(tree, [0, False])
+        for (key, paths) in (order or {}).items(): # which colliding leaf was set last
+            for path in paths:
+                node = self
+                for step in path[:-1]:
+                    node = node.__store.get(step)
+                    if not isinstance(node, AdvancedConfig):
+                        break
+                else:
+                    if key in node.__stamps:
+                        node.__stamps[key] = _stamp()
 
-    return xcfg_dict
+    def __build(self, tree, generation):
+        (names, values, keys) = tree
+        d      = self.__dict__
+        store  = d["_AdvancedConfig__store"]
+        stamps = d["_AdvancedConfig__stamps"]
+        d["keylist"]               = set(keys)
+        d["_AdvancedConfig__tree"] = generation
+        for idx in range(len(names)):
+            (name, value) = (names[idx], values[idx])
+            if type(value) == tuple:
+                node  = AdvancedConfig()
+                node.__build(value, generation)
+                value = node
+            elif type(value) == list:
+                value = snapshot_pathlist(value)
+            store[name]  = value
+            stamps[name] = _stamp()
 
-def parseo(filename):
-    " Parse an XConfig XML file and return an object with attributes and values "
-    xcfg_obj    = SimpleConfig()
-    doc         = xml.dom.minidom.parse(filename)
-    root        = doc.documentElement
-    idx = 0
-    while idx < root.attributes.length:
-        attr = root.attributes.item(idx)
-        eval("xcfg_obj.%s = %s" % (attr.localName, attr.value))
-        idx += 1
+    def _order(self):
+        " The paths of colliding leaves, in the order they were set, for snapshots "
+        return dict([(k, v) for (k, v) in self._leafindex().paths.items() if len(v) > 1])
 
-    return xcfg_obj
+class CompactConfig(object):
+    """ Memory efficient alternative to AdvancedConfig with the same attribute
+        and dictionary interface, for very large trees.  A node is a slotted
+        object holding a tuple of entry names and a list of values.  Name
+        tuples (and key tuples) are interned in a shared table, so nodes with
+        the same layout share one.  Nodes with more than WIDE entries switch
+        to a dictionary of name -> position (and a set of keys), so that
+        adding an entry stays O(1).  There is no per-tree index: todict(),
+        collisions() and // queries walk the tree.
 
-def attr2dict(filename):
-    """ Parse an XConfig XML file and return a dictionary of name/value pairs
-        from the attributes on the document element.
+        Entries never shadow methods, use cfg["read"] for an entry called read.
+        It does not derive from UserDict.DictMixin: as a classic class, that
+        would give every node a __dict__ again.
     """
-    xcfg_dict   = {}
-    doc         = xml.dom.minidom.parse(filename)
-    root        = doc.documentElement
-    idx = 0
-    while idx < root.attributes.length:
-        attr = root.attributes.item(idx)
-        xcfg_dict[attr.localName] = attr.value
-        idx += 1
 
-    return xcfg_dict
+    __slots__ = ("_names", "_values", "_keys")
+    WIDE      = 32
 
-def xcfg2dict(filename):
-    xcfg = AdvancedConfig(filename)
-    return xcfg.todict()
+    def __init__(self, filename=None):
+        object.__setattr__(self, "_names",  ())
+        object.__setattr__(self, "_values", [])
+        object.__setattr__(self, "_keys",   ())
+        if filename != None:
+            self.read(filename)
 
-class XcfgCLI(cmd.Cmd):
-    """
- foo=bar     : set foo to value bar
- foo+=bar    : append  bar onto foo
- foo++=bar   : prepend bar onto foo
- foo-=bar    : remove all occurances of bar from foo
+    def __find(self, name):
+        " Position of entry name, or -1 "
+        names = self._names
+        if type(names) == dict:
+            return names.get(name, -1)
+        if name in names:
+            return names.index(name)
+        return -1
 
-TODO: Not yet implemented
- foo+=*bar   : append  bar onto foo, *=[:_/\\;]
- foo++=*bar  : prepend bar onto foo, *=[:_/\\;]
- foo-=*bar   : remove all occurances of distinct bar from foo, *=[:_/\\;]
-    """
+    def __getattr__(self, name):
+        idx = self.__find(name)
+        if idx < 0:
+            raise AttributeError(name)
+        return self._values[idx]
 
-    COMMANDS        = "e s p pp load merge clean exp wl bl arch sh env loc reset help exit".split()
-    SHELL_DEFAULT   = "bash"
+    def __setattr__(self, name, value):
+        idx = self.__find(name)
+        if idx >= 0:
+            self._values[idx] = value
+            return
+        names = self._names
+        if type(names) == dict:
+            names[name] = len(self._values)
+        elif len(names) < self.WIDE:
+            object.__setattr__(self, "_names", nametable(names + (name,)))
+        else:
+            names = names + (name,)
+            object.__setattr__(self, "_names", dict(zip(names, range(len(names)))))
+        self._values.append(value)
 
-    def do_e(self, line=""):
-        """ e           : load os environment
- e:foo,bar   : load os environment variables foo and bar
-"""
-        match = re.search("\s*(?P<sep>[-+=:\\;]{0,4})\s*(?P<last>.*)\s*", line)
-        sep   = match.group("sep")
-        last  = match.group("last")
+    def __delattr__(self, name):
+        idx = self.__find(name)
+        if idx < 0:
+            raise AttributeError(name)
+        names = self._names
+        if type(names) == dict:
+            del names[name]
+            for (k, i) in names.items():
+                if i > idx:
+                    names[k] = i - 1
+        else:
+            object.__setattr__(self, "_names", nametable(names[:idx] + names[idx+1:]))
+        del self._values[idx]
 
-        # these have screwy escape codes or are typically multi-line
-        for bad in ['TERMCAP']:
-            if os.environ.has_key(bad): 
-                del os.environ[bad]
+    def __getitem__(self, key):
+        idx = self.__find(key)
+        if idx < 0:
+            raise KeyError(key)
+        return self._values[idx]
 
-        if sep == "":
-            self.xcfg.update(os.environ)
-        elif sep == ":":
-            for v in last.split(","):
-                v = v.strip()
-                try:
-                    self.xcfg[v] = os.environ[v]
-                except:
-                    logging.debug("%s not found in environment" % v)
+    def __setitem__(self, key, item):
+        setattr(self, key, item)
+        keys = self._keys
+        if key not in keys:
+            if type(keys) == set:
+                keys.add(key)
+            elif len(keys) < self.WIDE:
+                object.__setattr__(self, "_keys", nametable(keys + (key,)))
+            else:
+                object.__setattr__(self, "_keys", set(keys + (key,)))
 
-    def do_s(self, line=""):
-        """ s           : set os environment """
-        self.xcfg.s()
+    def __delitem__(self, key):
+        keys = self._keys
+        if type(keys) == set:
+            keys.discard(key)
+        elif key in keys:
+            idx = keys.index(key)
+            object.__setattr__(self, "_keys", nametable(keys[:idx] + keys[idx+1:]))
+        try:
+            delattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
 
-    def do_p(self, line=""):
-        """ p           : print xcfg state (shell compatible syntax)
- p:REGEX     : print xcfg state for keys that match REGEX (shell compatible syntax)
-"""
-        (pre, mid, wrap) = self.sh_syntax()
+    def __names(self):
+        " Entry names, in the order of self._values "
+        names = self._names
+        if type(names) != dict:
+            return names
+        ordered = [None] * len(names)
+        for (name, idx) in names.iteritems():
+            ordered[idx] = name
+        return ordered
 
-        search=""
-        if line.find(":") >= 0:
-            parts  = line.split(":")
-            search = parts[1].strip()
+    def keys(self):
+        return list(self._keys)
 
-        keys = self.xcfg.keys()
-        keys.sort()
-        for k in keys:
-            if line != "": # check against explicit REGEX
-                match = re.search(search,k)
-                if match is None:
-                    continue
-            else: # check against black and white lists
-                if (len(self.bl) > 0) and (k in self.bl):
-                    continue # skip this key, found in black list
-                if (len(self.wl) > 0) and not (k in self.wl): # only output entries that are in white list, skip otherwise
-                    continue # skip this key, not in white list
-            v = self.xcfg[k]
-            if (v.find(" ") >= 0) or (v.find("=") >= 0):
-                w = wrap
-            else:
-                w = ""
-            print "%s%s%s%s%s%s" % (pre, k, mid, w, v, w)
+    # the rest of the dictionary interface, as UserDict.DictMixin has it
+    def has_key(self, key):
+        return key in self._keys
 
-    def do_pp(self, line=""):
-        """ pp          : pretty print xcfg state (shell compatible syntax) """
-        self.do_p(line)
+    __contains__ = has_key
 
-    def do_load(self, line=""):
-        """ load:file   : load XConfig file """
-        parts = line.split()
-        self.xcfg.read(parts[1])
-        
-    def do_merge(self, line=""):
-        """ merge:file   : merge XConfig file """
-        parts       = line.split()
-        self.xcfg.read(parts[1], mode="merge")
+    def __iter__(self):
+        return iter(self.keys())
 
-    def do_wl(self, line=""):
-        """ wl=foo      : white list foo for output 
- wl+=foo     : append foo to white list
- wl:file     : load white list from file
-"""
-        match = re.search("\s*(?P<sep>[-+=:\\;]{0,4})\s*(?P<last>.*)\s*", line)
-        sep   = match.group("sep")
-        last  = match.group("last")
-        if sep == "":
-            pass
-        elif sep == "=":
-            self.wl = [last]
-        elif sep == "+=":
-            self.wl.append(last)
+    def __len__(self):
+        return len(self._keys)
 
-    def do_bl(self, line=""):
-        """ bl=foo      : black list foo from output
- bl+=foo     : append foo to black list
- bl:file     : load black list from file
-"""
-        match = re.search("\s*(?P<sep>[-+=:\\;]{0,4})\s*(?P<last>.*)\s*", line)
-        sep   = match.group("sep")
-        last  = match.group("last")
-        if sep == "":
-            pass
-        elif sep == "=":
-            self.bl = [last]
-        elif sep == "+=":
-            self.bl.append(last)
-        pass
+    def __repr__(self):
+        return repr(dict(self.items()))
 
-    def do_exp(self, line=""):
-        """ exp         : expand all environment variables (e.g. $FOO and ~)
-TODO
- exp:foo     : expand environment variable foo
- exp:REGEX   : expand all environment variables that match REGEX
-"""
-        self.xcfg.exp()
+    def iteritems(self):
+        for k in self.keys():
+            yield (k, self[k])
 
-    def do_clean(self, line=""):
-        """ clean       : clean all environment variables (single occurance of each item)
-TODO
- clean:foo   : clean environment variable foo
- clean:REGEX : clean all environment variables that match REGEX
-"""
-        self.xcfg.clean(self.sep)
+    def items(self):
+        return list(self.iteritems())
 
-    def do_arch(self, line=""):
-        """ arch        : set ARCH based on uname """
-        arch  = "i386" # default
-        opsys = os.uname()[0]   # e.g. Linux, Darwin, etc.
-        proc  = os.uname()[-1]  # e.g. x86_64, i386, i686, ppc, etc.
-        if opsys == "Linux":
-            if proc == "x86_64":
-                arch = "x86_64"
-            else:
-                arch = "i386"
-        if opsys == "Darwin":
-            if proc == "i386":
-                arch = "osx_intel"
+    def values(self):
+        return [v for (k, v) in self.iteritems()]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key, default=None):
+        if key not in self._keys:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        if key not in self._keys and default:
+            return default[0]
+        value = self[key]
+        del self[key]
+        return value
+
+    def update(self, other=None, **kw):
+        if other is not None:
+            if hasattr(other, "keys"):
+                for k in other.keys():
+                    self[k] = other[k]
             else:
-                arch = "osx_ppc"
-        self.xcfg["ARCH"] = arch
+                for (k, v) in other:
+                    self[k] = v
+        for (k, v) in kw.items():
+            self[k] = v
 
-    def do_sh(self, line=""):
-        """ sh=shell    : set shell syntax to shell """
-        parts       = line.split("=")
-        self.shell  = parts[1].strip()
+    def xsetattr(self, attr, val, mode):
+        """ if mode="load", then xsetattr=setattr
+            if mode="merge", then xsetattr appends value with self.sep
+        """
+        if mode == "merge" and self.__find(attr) >= 0 and isleaf(self[attr]):
+            setattr(self, attr, valuestr(self[attr]) + ":" + val.strip())
+        else:
+            self[attr] = val
 
-    def do_sep(self, line=""):
-        """ sep=[:;,]    : set separator for lists"""
-        parts       = line.split("=")
-        self.sep    = parts[1].strip()
+    # these only use the dictionary interface
+    read    = AdvancedConfig.read.im_func
+    replay  = AdvancedConfig.replay.im_func
+    exp     = AdvancedConfig.exp.im_func
+    expanded= AdvancedConfig.expanded.im_func
+    s       = AdvancedConfig.s.im_func
+    clean   = AdvancedConfig.clean.im_func
+    cleaned = AdvancedConfig.cleaned.im_func
+    toFile  = AdvancedConfig.toFile.im_func
+    toSnapshot = AdvancedConfig.toSnapshot.im_func
 
-    def do_env(self, line=""):
-        """ env         : use environment export [default] """
-        self.EXPORT_ENV = True
+    def axpath(self, path):
+        " The first match of AXPath path, see AdvancedConfig.axpath "
+        result = axselect(self, path)
+        if not result:
+            raise AttributeError(path)
+        return result[0]
 
-    def do_loc(self, line=""):
-        """ loc         : use local shell export """
-        self.EXPORT_ENV = False
+    def axselect(self, path):
+        " List of all the nodes and values matching AXPath path "
+        return axselect(self, path)
 
-    def do_reset(self, line=""):
-        """ reset       : reset internal state (dict and xcfg) """
-        self.d          = {} # dictionary of entries
-        self.wl         = [] # white list of entries to print
-        self.bl         = [] # black list of entries to suppress
-        self.sep        = ":"
-        self.xcfg       = AdvancedConfig()
-        self.EXPORT_ENV = True
+    def __entries(self):
+        return [(name, value) for (name, value) in zip(self.__names(), self._values)
+                if name.find("__") < 0]
 
-    def do_exit(self, line=""):
-        """ exit        : exit xcfg """
-        sys.exit(0)
+    def _children_items(self):
+        return self.__entries()
 
-    def do_help(self, cmd):
-        """ help        : print help """
-        funcname = "do_%s" % cmd
-        if funcname in dir(self):
-            func = getattr(self, funcname)
-            if hasattr(func, "__doc__"):
-                print getattr(func, "__doc__")
-        else:
-            for cmd in self.COMMANDS:
-                attr = "do_%s" % cmd
-                if not attr.startswith("do_"): continue
-                func = getattr(self, attr)
-                if hasattr(func, "__doc__"):
-                    print getattr(func, "__doc__")
-            print self.__doc__
+    def freeze(self):
+        " An immutable snapshot of this subtree, see FrozenConfig "
+        return freeze(self)
 
-    def default(self, line):
-        match = re.search("(?P<first>\w+)\s*(?P<sep>[-+=:\\;]{0,4})\s*(?P<last>.*)\s*", line)
-        first = match.group("first")
-        sep   = match.group("sep")
-        last  = match.group("last")
-        if sep == "":
-            pass
-        elif sep == "=":
-            self.xcfg[first] = last
-        elif sep == "+=":
-            if not self.xcfg.has_key(first):
-                self.xcfg[first] = ""
-            self.xcfg[first] += self.sep + last
-        elif sep == "++=":
-            if not self.xcfg.has_key(first):
-                self.xcfg[first] = ""
-            self.xcfg[first] = last + self.sep + self.xcfg[first]
+    def _restore(self, tree, order=None):
+        " Fill this new, empty node from a snapshot tree, see load_snapshot "
+        (names, values, keys) = tree
+        values = list(values)
+        for (idx, value) in enumerate(values):
+            if type(value) == tuple:
+                node = CompactConfig()
+                node._restore(value)
+                values[idx] = node
+            elif type(value) == list:
+                values[idx] = snapshot_pathlist(value)
+        if len(names) > self.WIDE:
+            names = dict(zip(names, range(len(names))))
         else:
-            logging.debug("Invalid syntax: [%s]" % line)
-            pass
+            names = nametable(tuple(names))
+        if len(keys) > self.WIDE:
+            keys = set(keys)
+        else:
+            keys = nametable(tuple(keys))
+        object.__setattr__(self, "_names",  names)
+        object.__setattr__(self, "_values", values)
+        object.__setattr__(self, "_keys",   keys)
 
-    def sh_syntax(self):
-        pre  = ""
-        mid  = "="
-        wrap = ""
-        if hasattr(self, "shell"):
-            shell = self.shell
-        elif os.environ.has_key("SHELL"):
-            shell_path = os.environ["SHELL"]
-            if shell_path.find("csh") > 0:
+    def _children(self, name):
+        if name == "*":
+            return [value for (slot, value) in sorted(self.__entries())]
+        idx = self.__find(name)
+        if name.find("__") < 0 and idx >= 0:
+            return [self._values[idx]]
+        return []
+
+    def _descendants(self, name, found=None):
+        if found is None:
+            found = []
+        for (slot, value) in sorted(self.__entries()):
+            if name == "*" or slot == name:
+                found.append(value)
+            if isinstance(value, CompactConfig):
+                value._descendants(name, found)
+        return found
+
+    def __leaves(self, path, found):
+        " Append (path, value) for every leaf of this subtree to found "
+        for (name, value) in self.__entries():
+            if isinstance(value, CompactConfig):
+                value.__leaves(path + (name,), found)
+            elif isleaf(value):
+                found.append((path + (name,), value))
+        return found
+
+    def todict(self):
+        """ Single dictionary of all the leaf nodes in this subtree.  If names
+            repeat, the leaf found last (in document order) wins. """
+        d = {}
+        for (path, value) in self.__leaves((), []):
+            d[path[-1]] = valuestr(value)
+        return d
+
+    def collisions(self):
+        " Leaf names which occur more than once, see AdvancedConfig.collisions "
+        paths = {}
+        for (path, value) in self.__leaves((), []):
+            paths.setdefault(path[-1], []).append("/".join(path))
+        return dict([(k, v) for (k, v) in paths.items() if len(v) > 1])
+
+class FrozenConfig(object):
+    """ Immutable and hashable snapshot of a config tree, see freeze().  It
+        can be shared between threads without any locking by its readers
+        (axpath() and axselect() share the compiled AXPath cache, which
+        locks for itself).
+
+        Attributes are the tree view, as with AdvancedConfig: child nodes
+        are FrozenConfigs and leaves are strings (PathLists are rendered).
+        The mapping interface is the flat view, the leaves of the whole
+        subtree as todict() returns them.  Two snapshots of equal trees are
+        equal and hash alike.  thaw() makes a mutable copy.
+    """
+
+    __slots__ = ("_tree", "_keys", "_flat", "_hash")
+
+    def __init__(self, entries, keys=(), flat=None):
+        " entries are (name, value) pairs, keys the names a thawed copy has in keys() "
+        object.__setattr__(self, "_tree", dict(entries))
+        object.__setattr__(self, "_keys", frozenset(keys))
+        object.__setattr__(self, "_flat", flat) # built on first use if None
+        object.__setattr__(self, "_hash", None)
+
+    def __getattr__(self, name):
+        try:
+            return self._tree[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FrozenConfig is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError("FrozenConfig is read-only")
+
+    def __flat(self):
+        flat = self._flat
+        if flat is None:
+            flat = {}
+            for (name, value) in self._tree.items():
+                if isinstance(value, FrozenConfig):
+                    flat.update(value.__flat())
+                else:
+                    flat[name] = value
+            object.__setattr__(self, "_flat", flat)
+        return flat
+
+    # the flat view, a read-only mapping
+    def __getitem__(self, key):
+        return self.__flat()[key]
+
+    def get(self, key, default=None):
+        return self.__flat().get(key, default)
+
+    def __contains__(self, key):
+        return key in self.__flat()
+
+    has_key = __contains__
+
+    def __iter__(self):
+        return iter(self.__flat())
+
+    def __len__(self):
+        return len(self.__flat())
+
+    def keys(self):
+        return self.__flat().keys()
+
+    def values(self):
+        return self.__flat().values()
+
+    def items(self):
+        return self.__flat().items()
+
+    def todict(self):
+        " The flat view as a new (mutable) dictionary "
+        return dict(self.__flat())
+
+    # the tree view
+    def entries(self):
+        " (name, value) for the leaves and child nodes of this node, sorted by name "
+        return sorted(self._tree.items())
+
+    def _children_items(self):
+        return self._tree.items()
+
+    def _nodekeys(self):
+        return self._keys
+
+    def thaw(self, nodetype=None):
+        " A mutable copy, an AdvancedConfig unless nodetype is given "
+        cfg = (nodetype or AdvancedConfig)()
+        for (name, value) in self._tree.items():
+            if isinstance(value, FrozenConfig):
+                setattr(cfg, name, value.thaw(nodetype))
+            elif name in self._keys:
+                cfg[name] = value
+            else:
+                setattr(cfg, name, value)
+        return cfg
+
+    def axpath(self, path):
+        " The first match of AXPath path, see AdvancedConfig.axpath "
+        result = axselect(self, path)
+        if not result:
+            raise AttributeError(path)
+        return result[0]
+
+    def axselect(self, path):
+        " List of all the nodes and values matching AXPath path "
+        return axselect(self, path)
+
+    def _children(self, name):
+        if name == "*":
+            return [value for (slot, value) in self.entries()]
+        if name in self._tree:
+            return [self._tree[name]]
+        return []
+
+    def _descendants(self, name, found=None):
+        if found is None:
+            found = []
+        for (slot, value) in self.entries():
+            if name == "*" or slot == name:
+                found.append(value)
+            if isinstance(value, FrozenConfig):
+                value._descendants(name, found)
+        return found
+
+    def __eq__(self, other):
+        return isinstance(other, FrozenConfig) and self._tree == other._tree \
+            and self._keys == other._keys
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash((frozenset(self._tree.items()), self._keys)))
+        return self._hash
+
+    def __repr__(self):
+        return "FrozenConfig(%r)" % (self.entries(),)
+
+def freeze(node, flat=None):
+    """ FrozenConfig snapshot of the tree below node (an AdvancedConfig or a
+        CompactConfig).  flat is the flat view if the caller has it. """
+    entries = []
+    for (name, value) in node._children_items():
+        if isinstance(value, FrozenConfig):
+            entries.append((name, value))
+        elif isinstance(value, CONFIG_TYPES):
+            entries.append((name, freeze(value)))
+        elif isleaf(value):
+            entries.append((name, valuestr(value)))
+    return FrozenConfig(entries, node.keys(), flat)
+
+def nodekeys(node):
+    " Names of the entries of node which are keys, for any of the CONFIG_TYPES "
+    if isinstance(node, FrozenConfig):
+        return node._nodekeys()
+    return node.keys()
+
+def xmlquote(value, attr=False):
+    " value escaped for XML text, or for a double quoted attribute "
+    value = value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    if attr:
+        value = value.replace('"', "&quot;").replace("\n", "&#10;").replace("\r", "&#13;").replace("\t", "&#9;")
+    return value
+
+def outfile(out, mode="wb"):
+    " (file, must close) for out, an open file or a file name "
+    if hasattr(out, "write"):
+        return (out, False)
+    return (open(out, mode), True)
+
+def write_xml(node, out, name=None, indent="  "):
+    """ Write the tree below node as XConfig XML to out (a file name or an
+        open file), streaming it out element by element without building a
+        DOM or the document as one string.  name is the document element,
+        by default the one the tree was read from (or xconfig).
+
+        Reading the file back gives the same tree: the leaves which are
+        keys become attributes, the other leaves text-only elements and
+        nodes elements.  Leaf values are stripped by the loader, and an
+        empty leaf which is not a key is written as an attribute (an empty
+        element would be read back as a node).  Entries are sorted by name.
+    """
+    if name is None:
+        name = getattr(node, "_AdvancedConfig__NAME", None) or "xconfig"
+    (fh, close) = outfile(out)
+    try:
+        fh.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        write_element(fh, node, name, "", indent)
+    finally:
+        if close:
+            fh.close()
+
+def write_element(fh, node, name, prefix, indent):
+    " Write node as the element name, indented by prefix "
+    keys     = set(nodekeys(node))
+    attrs    = []
+    children = []
+    for (slot, value) in sorted(node._children_items()):
+        if isleaf(value):
+            value = valuestr(value)
+            if slot in keys or value.strip() == "":
+                attrs.append(' %s="%s"' % (slot, xmlquote(value, True)))
+            else:
+                children.append((slot, value))
+        elif isinstance(value, CONFIG_TYPES):
+            children.append((slot, value))
+    head = "%s<%s%s" % (prefix, name, "".join(attrs))
+    if not children:
+        fh.write(utf8(head + "/>\n"))
+        return
+    fh.write(utf8(head + ">\n"))
+    inner = prefix + indent
+    for (slot, value) in children:
+        if isinstance(value, basestring):
+            fh.write(utf8("%s<%s>%s</%s>\n" % (inner, slot, xmlquote(value), slot)))
+        else:
+            write_element(fh, value, slot, inner, indent)
+    fh.write(utf8("%s</%s>\n" % (prefix, name)))
+
+def utf8(text):
+    if isinstance(text, unicode):
+        return text.encode("utf-8")
+    return text
+
+SNAPSHOT_MAGIC   = "xcfg-snapshot"
+SNAPSHOT_VERSION = 1
+
+def snapshot_tree(node):
+    """ The marshallable form of the tree below node: a node is a tuple
+        (names, values, keys), a PathList is a list [sep, item...] and a
+        string is itself.  Other values (set from Python) are left out,
+        with their keys. """
+    names   = []
+    values  = []
+    skipped = set()
+    for (slot, value) in node._children_items():
+        if isinstance(value, CONFIG_TYPES):
+            value = snapshot_tree(value)
+        elif isinstance(value, PathList):
+            value = [value.sep] + list(value)
+        elif not isinstance(value, basestring):
+            skipped.add(slot)
+            continue
+        names.append(slot)
+        values.append(value)
+    keys = nodekeys(node)
+    if skipped:
+        keys = [k for k in keys if k not in skipped]
+    return (tuple(names), values, tuple(keys))
+
+def snapshot_pathlist(value):
+    path = PathList("", value[0])
+    path.extend(value[1:])
+    return path
+
+def write_snapshot(node, out):
+    """ Write the tree below node to out (a file name or an open file) as a
+        binary snapshot, which load_snapshot() turns back into the same
+        tree (with the same keys, PathLists and todict()) much faster than
+        the XML can be read.  The format is marshal's, so it is only read
+        by the same Python version.
+    """
+    name  = getattr(node, "_AdvancedConfig__NAME", None)
+    order = getattr(node, "_order", dict)()
+    data  = marshal.dumps((SNAPSHOT_MAGIC, SNAPSHOT_VERSION, name, snapshot_tree(node), order))
+    (fh, close) = outfile(out)
+    try:
+        fh.write(data)
+    finally:
+        if close:
+            fh.close()
+
+def load_snapshot(source, nodetype=None):
+    """ The tree written to source (a file name or an open file) by
+        write_snapshot(), as an AdvancedConfig or as a nodetype (e.g.
+        CompactConfig, or FrozenConfig for a frozen copy).  Raises
+        ValueError if source is not a snapshot this version can read.
+    """
+    if hasattr(source, "read"):
+        data = source.read()
+    else:
+        fh = open(source, "rb")
+        try:
+            data = fh.read()
+        finally:
+            fh.close()
+    try:
+        snap = marshal.loads(data)
+    except (EOFError, ValueError, TypeError):
+        snap = None
+    if type(snap) != tuple or len(snap) != 5 or snap[:2] != (SNAPSHOT_MAGIC, SNAPSHOT_VERSION):
+        raise ValueError("not an xcfg snapshot: %s" % getattr(source, "name", source))
+    (magic, version, name, tree, order) = snap
+    if nodetype is FrozenConfig:
+        return load_snapshot_frozen(tree)
+    cfg = (nodetype or AdvancedConfig)()
+    cfg._restore(tree, order)
+    if name is not None:
+        setattr(cfg, "_AdvancedConfig__NAME", name)
+    return cfg
+
+def load_snapshot_frozen(tree):
+    (names, values, keys) = tree
+    entries = []
+    for (name, value) in zip(names, values):
+        if type(value) == tuple:
+            value = load_snapshot_frozen(value)
+        elif type(value) == list:
+            value = snapshot_pathlist(value).render()
+        entries.append((name, value))
+    return FrozenConfig(entries, keys)
+
+class ConfigHolder(object):
+    """ Holds the current snapshot of a config for any number of threads.
+        Readers take current (or get()) and use that FrozenConfig for as
+        long as they like: a plain attribute read, which never blocks and
+        never sees a partly applied change.  Writers make a whole new
+        snapshot and swap it in with one assignment; read() and update()
+        exclude each other, so concurrent writers don't lose changes.
+    """
+
+    def __init__(self, config=None):
+        import threading
+        self.lock    = threading.Lock()
+        self.current = None
+        if config is not None:
+            self.set(config)
+
+    def get(self):
+        return self.current
+
+    def set(self, config):
+        " Make config current (frozen first if it is not a FrozenConfig), return the snapshot "
+        if not isinstance(config, FrozenConfig):
+            config = config.freeze()
+        self.current = config
+        return config
+
+    def update(self, func):
+        """ Make func(cfg) current, cfg being a mutable copy of the current
+            config (a new AdvancedConfig if there is none), which func may
+            change and return """
+        self.lock.acquire()
+        try:
+            if self.current is None:
+                cfg = AdvancedConfig()
+            else:
+                cfg = self.current.thaw()
+            return self.set(func(cfg))
+        finally:
+            self.lock.release()
+
+    def read(self, filename, mode="load"):
+        """ Read filename over the current config in mode and make the result
+            current.  The file is parsed before anything is applied, so on
+            an error (which is logged) the current snapshot stays.
+        """
+        try:
+            events = compile_file(filename)[2]
+        except (IOError, OSError, ExpatError), e:
+            logging.error('read failed: %s (%s)' % (filename, e))
+            return self.current
+        def apply(cfg):
+            cfg.replay(events, mode, filename)
+            return cfg
+        return self.update(apply)
+
+    def watch(self, watcher):
+        " Follow a ConfigWatcher: its config now (if it has read one), and each reload "
+        if watcher.config is not None:
+            self.set(watcher.config)
+        watcher.subscribe(lambda cfg, changes: self.set(cfg))
+        return watcher
+
+CONFIG_TYPES = (AdvancedConfig, CompactConfig, FrozenConfig)
+
+_nametables = {}
+
+def nametable(names):
+    """ The shared copy of the tuple of names.  The table is emptied when it
+        gets large, which only costs sharing for the layouts seen after that.
+    """
+    table = _nametables.get(names)
+    if table is None:
+        if len(_nametables) > 10000:
+            _nametables.clear()
+        table = _nametables[names] = names
+    return table
+
+class XcfgLoader:
+    """ Event driven (expat) loader which populates an AdvancedConfig tree
+        directly as each element closes, without building a DOM first.  The
+        load/merge semantics are those of AdvancedConfig.parse_element()
+        followed by convert_text(): text-only elements become string
+        attributes of their parent, attributes are assigned with xsetattr()
+        after the child elements, and text wins over attributes and elements.
+
+        Each open element is a frame: [name, attrs, text_list, chunks,
+        hasText, hasElements, node].  The node for an element is only created
+        once it is known to have child elements or once it closes without text.
+
+        If events is a list, a flat record of the document is appended to it:
+        (0, name, attrs) as each element opens and (1, text_list, hasText) as
+        it closes.  replay() applies such a record without any XML parsing.
+
+        Include elements are resolved as they open, see include().  filename
+        is the file being read, which relative hrefs are resolved against,
+        and cache the CompiledCache included files are kept in, if any.
+    """
+
+    def __init__(self, cfg, mode="load", events=None, filename=None, cache=None):
+        self.cfg    = cfg
+        self.nodetype = cfg.__class__ # AdvancedConfig or CompactConfig
+        self.mode   = mode
+        self.name   = None  # local name of the document element
+        self.stack  = []
+        self.cdata  = False
+        self.events = events
+        self.chain  = ()    # files being read, outermost first
+        if isinstance(filename, basestring):
+            self.chain = (os.path.abspath(filename),)
+        self.included = set() # (path, node id) already included in this read
+        self.cache  = cache
+
+    def parse(self, filename):
+        " Stream filename (a path or an open file) into self.cfg "
+        expat_parse(filename, self.start, self.end, self.chars, self.split,
+                    self.start_cdata, self.end_cdata)
+
+    def start(self, name, attrs):
+        name = localname(name)
+        if self.stack:
+            parent = self.stack[-1]
+            if parent[6] is _INCLUDED or parent[6] is _IGNORED:
+                if parent[6] is _INCLUDED and not parent[5]:
+                    logging.warn("ignoring the elements in include %s" % attrlist2dict(parent[1]).get("href"))
+                parent[5] = True
+                node = _IGNORED
+            else:
+                self.split()
+                parent[5] = True
+                if parent[6] is None:
+                    self.materialize(parent, self.stack[-2][6])
+                node = None
+                if name == "include" and self.include(parent[6], attrs):
+                    node = _INCLUDED
+        else:
+            self.name = name
+            node = self.cfg
+        self.stack.append([name, attrs, [], [], False, False, node])
+        if self.events is not None:
+            self.events.append((0, name, attrs))
+
+    def include(self, node, attrs):
+        """ Apply the file named by the href of an include element to node,
+            the element it is in: the attributes and child elements of the
+            included document element become those of node, as if they were
+            written where the include is (so what follows it, and the
+            attributes of node itself, override them in load mode).  The
+            include is applied in the mode of this read, or in the mode
+            given by its mode attribute.
+
+            Included files are kept in the cache of the read, if it has one.
+            A file included again into the same node in one read is skipped,
+            and so are include cycles (which are logged).  What the include
+            element itself contains is ignored, with a warning.  Returns
+            False if the element has no href, it is then an ordinary element.
+        """
+        attrs = attrlist2dict(attrs)
+        href  = attrs.get("href")
+        if href is None:
+            return False
+        path  = include_path(href, self.chain and self.chain[-1] or None)
+        if path in self.chain:
+            logging.error("include cycle: %s" % " -> ".join(self.chain + (path,)))
+            return True
+        if (path, id(node)) in self.included:
+            return True
+        self.included.add((path, id(node)))
+        try:
+            if self.cache is not None:
+                events = self.cache.events(path)
+            else:
+                events = compile_file(path)[2]
+        except (IOError, OSError, ExpatError), e:
+            logging.error('include failed: %s (%s)' % (path, e))
+            return True
+        loader          = XcfgLoader(node, attrs.get("mode", self.mode), cache=self.cache)
+        loader.chain    = self.chain + (path,)
+        loader.included = self.included
+        loader.replay(events)
+        return True
+
+    def chars(self, data):
+        if not self.cdata:
+            frame = self.stack[-1]
+            frame[3].append(data)
+            frame[4] = True
+
+    def split(self, *ignored):
+        """ Comments, CDATA sections and child elements end the current text
+            node, exactly as they do in the DOM """
+        if self.stack:
+            frame = self.stack[-1]
+            if frame[3]:
+                frame[2].append("".join(frame[3]).strip())
+                frame[3] = []
+
+    def start_cdata(self):
+        self.split()
+        self.cdata = True
+
+    def end_cdata(self):
+        self.cdata = False
+
+    def replay(self, events):
+        " Apply a record of events made by an earlier parse "
+        for ev in events:
+            if ev[0] == 0:
+                self.start(ev[1], ev[2])
+            else:
+                frame    = self.stack[-1]
+                frame[2] = list(ev[1])
+                frame[4] = ev[2]
+                self.end(None)
+
+    def end(self, ignored):
+        self.split()
+        frame = self.stack.pop()
+        (name, attrs, text_list, chunks, hasText, hasElements, node) = frame
+        mode  = self.mode
+        if self.events is not None:
+            self.events.append((1, tuple(text_list), hasText))
+        if node is _INCLUDED or node is _IGNORED:
+            if node is _INCLUDED and " ".join(text_list).strip():
+                logging.warn("ignoring the text in include %s" % attrlist2dict(attrs).get("href"))
+            return
+
+        content_cnt = 0
+        if hasText:     content_cnt += 1
+        if hasElements: content_cnt += 1
+        if attrs:       content_cnt += 1
+        if content_cnt > 1:
+            logging.warn("More than 1 type of content in node [%s]" % name)
+
+        text = " ".join(text_list).strip()
+        if len(text) > 0:
+            if hasElements or attrs:
+                logging.warn("Node [%s] has text content. Using this as node value, ignoring elements and attributes" % name)
+            if not self.stack: # the document element keeps its text as __TEXT
+                self.cfg.xsetattr("__TEXT", text, mode)
+            else:
+                self.settext(self.stack[-1][6], name, text)
+            return
+
+        if node is None:
+            node = self.materialize(frame, self.stack[-1][6])
+        idx = 0
+        while idx < len(attrs):
+            node.xsetattr(localname(attrs[idx]), attrs[idx+1], mode)
+            idx += 2
+        if self.stack and hasattr(node, "__TEXT"): # merged over a string
+            setattr(self.stack[-1][6], name, getattr(node, "__TEXT"))
+
+    def materialize(self, frame, parent):
+        " Create (load) or reuse (merge) the AdvancedConfig for frame in parent "
+        name   = frame[0]
+        node   = None
+        if self.mode == "merge":
+            node = parent.get(name)
+            if not isinstance(node, self.nodetype):
+                old  = node
+                node = self.nodetype()
+                if isinstance(old, basestring): # any text is appended to
+                    setattr(node, "__TEXT", old)
+                setattr(parent, name, node)
+        else:
+            node = self.nodetype()
+            setattr(parent, name, node)
+        frame[6] = node
+        return node
+
+    def settext(self, parent, name, text):
+        " A text-only element becomes a string attribute of its parent "
+        if self.mode == "merge":
+            old = parent.get(name)
+            if isinstance(old, self.nodetype):
+                old = getattr(old, "__TEXT", None)
+            if isinstance(old, basestring):
+                text = old + ":" + text
+        setattr(parent, name, text)
+
+class PathList(object):
+    """ The items of a separated list such as PATH, as an ordered set: append,
+        prepend and remove are O(1), an item is only ever held once (at its
+        first position, as clean() would leave it) and the string is only
+        built by render().  Items are kept in a circular doubly linked list
+        of [prev, next, item] links, indexed by item.
+    """
+
+    def __init__(self, value="", sep=":"):
+        self.sep    = sep
+        self.links  = {}
+        self.head   = head = []
+        head       += [head, head, None]
+        if value != "":
+            self.extend(value.split(sep))
+
+    def __iter__(self):
+        link = self.head[1]
+        while link is not self.head:
+            yield link[2]
+            link = link[1]
+
+    def __len__(self):
+        return len(self.links)
+
+    def __contains__(self, item):
+        return item in self.links
+
+    def __str__(self):
+        return str(self.render())
+
+    def __repr__(self):
+        return "PathList(%r, %r)" % (self.render(), self.sep)
+
+    def render(self):
+        return self.sep.join(self)
+
+    def append(self, item):
+        " Add item at the end, unless it is already present "
+        if item not in self.links:
+            last = self.head[0]
+            link = [last, self.head, item]
+            last[1] = self.head[0] = self.links[item] = link
+
+    def prepend(self, item):
+        " Add item at the front, moving it there if it is already present "
+        self.remove(item)
+        first = self.head[1]
+        link  = [self.head, first, item]
+        first[0] = self.head[1] = self.links[item] = link
+
+    def remove(self, item):
+        " Remove item, if it is present "
+        link = self.links.pop(item, None)
+        if link is not None:
+            (prev, next) = (link[0], link[1])
+            prev[1] = next
+            next[0] = prev
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def extendleft(self, items):
+        " Prepend items, keeping their order "
+        items = list(items)
+        items.reverse()
+        for item in items:
+            self.prepend(item)
+
+class LRUCache(object):
+    """ Dictionary holding at most maxsize entries, the least recently used
+        entry is dropped first.  Entries are kept in a circular doubly linked
+        list of [prev, next, key, value] links, most recently used last.
+        Even a lookup moves a link, so every method holds a lock, and the
+        cache can be shared between threads.
+    """
+
+    def __init__(self, maxsize=128):
+        import threading
+        self.maxsize    = maxsize
+        self.links      = {}
+        self.head       = head = []
+        head           += [head, head, None, None]
+        self.lock       = threading.Lock()
+
+    def __len__(self):
+        return len(self.links)
+
+    def __contains__(self, key):
+        return key in self.links
+
+    def get(self, key, default=None):
+        self.lock.acquire()
+        try:
+            link = self.links.get(key)
+            if link is None:
+                return default
+            self.unlink(link)
+            self.append(link)
+            return link[3]
+        finally:
+            self.lock.release()
+
+    def __setitem__(self, key, value):
+        self.lock.acquire()
+        try:
+            link = self.links.get(key)
+            if link is not None:
+                self.unlink(link)
+            link = self.links[key] = [None, None, key, value]
+            self.append(link)
+            while len(self.links) > self.maxsize:
+                self.remove(self.head[1])
+        finally:
+            self.lock.release()
+
+    def pop(self, key, default=None):
+        self.lock.acquire()
+        try:
+            link = self.links.get(key)
+            if link is None:
+                return default
+            self.remove(link)
+            return link[3]
+        finally:
+            self.lock.release()
+
+    def popoldest(self):
+        " Remove the least recently used entry and return (key, value) "
+        self.lock.acquire()
+        try:
+            link = self.head[1]
+            if link is self.head:
+                raise KeyError("popoldest(): cache is empty")
+            self.remove(link)
+            return (link[2], link[3])
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.links.clear()
+            self.head[0] = self.head[1] = self.head
+        finally:
+            self.lock.release()
+
+    # the link operations, called with the lock held
+
+    def remove(self, link):
+        del self.links[link[2]]
+        self.unlink(link)
+
+    def unlink(self, link):
+        link[0][1] = link[1]
+        link[1][0] = link[0]
+
+    def append(self, link):
+        last    = self.head[0]
+        link[0] = last
+        link[1] = self.head
+        last[1] = self.head[0] = link
+
+class KeySelector(object):
+    """ Matches names against a list of patterns, as the white and black
+        lists do.  A pattern is
+
+            NAME        exactly NAME
+            PREFIX*     names starting with PREFIX
+            GLOB        names matching a shell glob with * ? or [...] elsewhere
+            re:REGEX    names in which re.search finds REGEX
+
+        Names go in a set and prefixes in a trie, and the globs and regexes
+        are compiled together into one alternation, so matching costs the
+        same for one pattern or thousands.  A regex with inline flags, such
+        as (?i), is compiled on its own, as in the alternation its flags
+        would apply to every other pattern, and so is one with back
+        references, whose group numbers would change.  Regexes which can't
+        go together (such as two with a group of the same name) are
+        matched one by one.  A regex which does not compile is refused by
+        add() with a ValueError.  "name in selector" matches.
+    """
+
+    def __init__(self, patterns=()):
+        self.patterns = []
+        self.names    = set()
+        self.trie     = {}      # char -> subtrie, None -> True at the end of a prefix
+        self.regexes  = []
+        self.compiled = []      # the regexes, each compiled on its own
+        self.search   = None    # compiled on first use
+        self.extend(patterns)
+
+    def add(self, pattern):
+        " Add pattern, raises ValueError if it is a regex (or glob) which does not compile "
+        if pattern.startswith("re:"):
+            self.addregex(pattern, pattern[3:])
+        elif not _GLOB_RE.search(pattern):
+            self.names.add(pattern)
+        elif pattern.endswith("*") and not _GLOB_RE.search(pattern[:-1]):
+            node = self.trie
+            for c in pattern[:-1]:
+                node = node.setdefault(c, {})
+            node[None] = True
+        else:
+            self.addregex(pattern, glob_regex(pattern))
+        self.patterns.append(pattern)
+
+    def addregex(self, pattern, regex):
+        " Add regex, the regular expression pattern stands for "
+        try:
+            self.compiled.append(re.compile(regex))
+        except re.error, e:
+            raise ValueError("invalid pattern %s: %s" % (pattern, e))
+        self.regexes.append(regex)
+        self.search = None
+
+    def extend(self, patterns):
+        for pattern in patterns:
+            self.add(pattern)
+
+    def load(self, filename):
+        """ Add the patterns in filename: whitespace separated, with # starting
+            a comment.  A ValueError for a bad pattern names its line. """
+        fh = open(filename)
+        try:
+            for (lineno, line) in enumerate(fh):
+                try:
+                    self.extend(line.split("#", 1)[0].split())
+                except ValueError, e:
+                    raise ValueError("%s:%d: %s" % (filename, lineno + 1, e))
+        finally:
+            fh.close()
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __iter__(self):
+        return iter(self.patterns)
+
+    def __repr__(self):
+        return "KeySelector(%r)" % (self.patterns,)
+
+    def __contains__(self, name):
+        if name in self.names:
+            return True
+        node = self.trie
+        if node:
+            for c in name:
+                if None in node:
+                    return True
+                node = node.get(c)
+                if node is None:
+                    break
+            else:
+                if None in node:
+                    return True
+        if self.regexes:
+            if self.search is None:
+                self.compile()
+            return self.search(name) is not None
+        return False
+
+    match = __contains__
+
+    def compile(self):
+        """ Compile the regexes into one, but for those with inline flags or
+            back references, which are matched one by one, as all of them
+            are if the merged regex does not compile """
+        merged   = [r for r in self.regexes if not _UNMERGED_RE.search(r)]
+        searches = [c.search for (r, c) in zip(self.regexes, self.compiled) if _UNMERGED_RE.search(r)]
+        if merged:
+            try:
+                searches.insert(0, re.compile("|".join(["(?:%s)" % r for r in merged])).search)
+            except (re.error, AssertionError): # same group names, over 100 groups (Python 2)
+                searches = [c.search for c in self.compiled]
+        if len(searches) == 1:
+            self.search = searches[0]
+        else:
+            self.search = lambda name: [s for s in searches if s(name)] or None
+
+    def select(self, names):
+        " The names which match, in order "
+        return [name for name in names if name in self]
+
+_GLOB_RE = re.compile(r"[*?\[]")
+_UNMERGED_RE = re.compile(r"(?<!\\)\(\?[iLmsux]+\)|\\[1-9]|\(\?P=") # inline flags, back references
+
+def glob_regex(pattern):
+    " Anchored regular expression for a shell glob with * ? and [...] (or [!...]) "
+    parts = []
+    for token in re.findall(r"\*|\?|\[!?\]?[^\]]*\]|[^*?\[]+|\[", pattern):
+        if token == "*":
+            parts.append(".*")
+        elif token == "?":
+            parts.append(".")
+        elif len(token) > 1 and token.startswith("["):
+            body = token[1:-1]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append("[%s]" % body.replace("\\", "\\\\"))
+        else:
+            parts.append(re.escape(token))
+    return "^(?:%s)\\Z" % "".join(parts)
+
+_AXSTEP_RE = re.compile(r"""(//|/)?(\*|[^/\[\]=@'"\s]+)((?:\[[^\]]*\])*)""")
+_AXPRED_RE = re.compile(r"""\[\s*@?([^\]=@\s]+)\s*=\s*(?:'([^']*)'|"([^"]*)"|([^\]\s]*))\s*\]""")
+_axpath_cache = LRUCache(256)
+
+def axselect(node, path):
+    """ List of all the nodes and values below node matching AXPath path.
+        The path is compiled once (see compile_axpath) and evaluated one step
+        at a time over the list of nodes matched so far.  Nodes provide
+        _children(name) and _descendants(name).
+    """
+    current = [node]
+    for (descendant, name, predicates) in compile_axpath(path):
+        found = []
+        seen  = {}
+        for node in current:
+            if not isinstance(node, CONFIG_TYPES):
+                continue # leaves have no children
+            if descendant:
+                matches = node._descendants(name)
+            else:
+                matches = node._children(name)
+            for match in matches:
+                if id(match) not in seen:
+                    seen[id(match)] = True
+                    found.append(match)
+        for (attr, value) in predicates:
+            found = [n for n in found if isinstance(n, CONFIG_TYPES)
+                                     and [v for v in n._children(attr) if valuestr(v) == value]]
+        current = found
+    return current
+
+def compile_axpath(path):
+    """ Compile an AXPath into a tuple of (descendant, name, predicates) steps,
+        predicates being a tuple of (name, value).  Leading and trailing
+        slashes are ignored, except that a leading // is a descendant step.
+        Compiled paths are kept in an LRU cache.
+    """
+    steps = _axpath_cache.get(path)
+    if steps is not None:
+        return steps
+
+    steps = []
+    text  = path.strip()
+    if text.startswith("/") and not text.startswith("//"):
+        text = text[1:]
+    text  = text.rstrip("/")
+    pos   = 0
+    while pos < len(text):
+        match = _AXSTEP_RE.match(text, pos)
+        if match is None or (pos > 0 and match.group(1) is None):
+            raise ValueError("invalid AXPath at %d: %s" % (pos, path))
+        predicates = []
+        preds      = match.group(3)
+        for pred in _AXPRED_RE.finditer(preds):
+            value = [v for v in pred.group(2, 3, 4) if v is not None][0]
+            predicates.append((pred.group(1), value))
+        if len(_AXPRED_RE.sub("", preds)) > 0:
+            raise ValueError("invalid AXPath predicate %s: %s" % (preds, path))
+        steps.append((match.group(1) == "//", match.group(2), tuple(predicates)))
+        pos = match.end()
+
+    steps = tuple(steps)
+    _axpath_cache[path] = steps
+    return steps
+
+def isleaf(value):
+    " True for the values which are config entries rather than structure "
+    return isinstance(value, (basestring, PathList))
+
+_stamp = itertools.count(1).next # when an AdvancedConfig entry was set, see LeafIndex
+
+class LeafIndex(object):
+    """ Flat index of the leaves of a config tree, built in one walk of an
+        AdvancedConfig subtree.  A path is the tuple of names from the node
+        to a leaf, the last being the leaf name (key).
+
+        leaves  path -> value
+        paths   key  -> list of paths with that key, most recently set last
+        values  key  -> value of the most recently set leaf with that key
+        nodes   name -> list of paths of the sub-configs with that name
+    """
+
+    def __init__(self, node):
+        self.leaves = leaves = {}
+        self.paths  = paths  = {}
+        self.values = values = {}
+        self.nodes  = {}
+        # the index is acyclic, and the collector would otherwise walk the
+        # whole heap several times while it is built
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for (stamp, path, value) in node._leaves((), [], object()):
+                if stamp is None:
+                    self.nodes.setdefault(path[-1], []).append(path)
+                else:
+                    leaves[path] = value
+                    paths.setdefault(path[-1], []).append((stamp, path))
+            for (key, stamped) in paths.iteritems():
+                if len(stamped) > 1:
+                    stamped.sort()
+                paths[key]  = [path for (stamp, path) in stamped]
+                values[key] = leaves[paths[key][-1]]
+        finally:
+            if enabled:
+                gc.enable()
+
+    def update(self, path, value):
+        """ Set the leaf at path to value, as the latest change to the tree,
+            or remove it if value is not a leaf (None when it was deleted) """
+        key   = path[-1]
+        paths = self.paths.get(key)
+        if paths is not None and path in self.leaves:
+            paths.remove(path)
+        if isleaf(value):
+            self.leaves[path] = value
+            if paths is None:
+                paths = self.paths[key] = []
+            paths.append(path)
+            self.values[key] = value
+        else:
+            self.leaves.pop(path, None)
+            if paths:
+                self.values[key] = self.leaves[paths[-1]]
+            elif paths is not None:
+                del self.paths[key]
+                del self.values[key]
+
+    def todict(self):
+        d = self.values.copy()
+        for k in [k for (k, v) in d.iteritems() if type(v) == PathList]:
+            d[k] = d[k].render()
+        return d
+
+    def collisions(self):
+        d = {}
+        for (k, paths) in self.paths.items():
+            if len(paths) > 1:
+                d[k] = ["/".join(p) for p in paths]
+        return d
+
+def valuestr(value):
+    " The string form of a config value, PathLists are rendered "
+    if isinstance(value, PathList):
+        return value.render()
+    return value
+
+class Expander:
+    """ Expands $VAR, ${VAR} and a leading ~ in the string values of a
+        mapping.  Each value is tokenized once, the graph of references
+        between entries is walked depth first and every entry is expanded
+        once, after the entries it refers to, so chains of any length are
+        resolved.  $$ is a literal $.
+
+        A reference is resolved from the mapping first and then from the
+        environment, and is left as written if neither has it.  References
+        which close a cycle, including the common PATH=$PATH:/foo/bar, are
+        resolved from the environment only.
+    """
+
+    VAR_RE = re.compile(r"\$(?:(\$)|(\w+)|\{(\w+)\})")
+
+    def __init__(self, d, env=None):
+        if env is None:
+            env = os.environ
+        self.d      = d
+        self.env    = env
+        self.tokens = {} # key -> list of literal strings and (name, text) references
+
+    def tokenize(self, value):
+        " Split value into literal strings and (name, text) reference tuples "
+        tokens = []
+        pos    = 0
+        for match in self.VAR_RE.finditer(value):
+            if match.start() > pos:
+                tokens.append(value[pos:match.start()])
+            if match.group(1):
+                tokens.append("$")
+            else:
+                tokens.append((match.group(2) or match.group(3), match.group(0)))
+            pos = match.end()
+        if pos < len(value):
+            tokens.append(value[pos:])
+        return tokens
+
+    def refs(self, key):
+        " Names of the entries key refers to "
+        tokens = self.tokens.get(key)
+        if tokens is None:
+            tokens = self.tokenize(os.path.expanduser(valuestr(self.d[key])))
+            self.tokens[key] = tokens
+        return [t[0] for t in tokens if type(t) == tuple and self.isentry(t[0])]
+
+    def isentry(self, key):
+        return key in self.d and isinstance(self.d[key], (basestring, PathList))
+
+    def order(self, keys):
+        """ Entries reachable from keys, each after the entries it refers to.
+            Also returns the set of (key, name) references which close a cycle.
+        """
+        order  = []
+        cycles = set()
+        state  = {} # key -> False while on the stack, True once ordered
+        for root in keys:
+            if root in state or not self.isentry(root):
+                continue
+            state[root] = False
+            stack = [(root, iter(self.refs(root)))]
+            while stack:
+                (k, it) = stack[-1]
+                for r in it:
+                    if r not in state:
+                        state[r] = False
+                        stack.append((r, iter(self.refs(r))))
+                        break
+                    elif state[r] is False:
+                        cycles.add((k, r))
+                else:
+                    state[k] = True
+                    order.append(k)
+                    stack.pop()
+        return (order, cycles)
+
+    def expand(self, keys=None):
+        """ Return a dictionary of expanded values for keys (default: all
+            entries) and for every entry they depend on.
+        """
+        if keys is None:
+            keys = self.d.keys()
+        (order, cycles) = self.order(keys)
+        for (k, r) in cycles:
+            if k == r:
+                logging.debug("%s refers to itself, using the environment" % k)
+            else:
+                logging.warn("cyclic reference to %s in %s, using the environment" % (r, k))
+
+        done = {}
+        env  = self.env
+        for k in order:
+            parts = []
+            for t in self.tokens[k]:
+                if type(t) != tuple:
+                    parts.append(t)
+                elif t[0] in done:
+                    parts.append(done[t[0]])
+                elif t[0] in env:
+                    parts.append(env[t[0]])
+                else:
+                    parts.append(t[1])
+            done[k] = "".join(parts)
+        return done
+
+class CompiledCache:
+    """ On-disk cache of parsed XConfig files.  The compiled form of a file is
+        the XcfgLoader event record, stored with marshal together with the
+        stamp (see file_stamp) and md5 digest of the source, and the time it
+        was stored.  An entry is used as is when the stamp matches; if only
+        the stat information changed, the digest decides and the entry is
+        refreshed.  A file changed less than RACY seconds before its entry
+        was stored may change again without a new mtime, so the digest is
+        checked for it too, until the entry is refreshed later than that.
+        Entries are written to a temporary file and renamed into place, so
+        readers never see a partial entry.
+
+        Compiled files go into directory if it is given, and otherwise next
+        to the source as .<name>c.
+    """
+
+    VERSION = (2,) + tuple(sys.version_info[:2]) # marshal is version specific
+    RACY    = 2.0 # seconds, the coarsest mtime resolution of common filesystems
+
+    def __init__(self, directory=None):
+        self.directory  = directory
+        self.hits       = 0
+        self.misses     = 0
+
+    def path(self, filename):
+        " Name of the compiled file for filename "
+        filename = os.path.abspath(filename)
+        if self.directory is None:
+            (head, tail) = os.path.split(filename)
+            return os.path.join(head, ".%sc" % tail)
+        return os.path.join(self.directory, md5(filename).hexdigest() + ".xcfgc")
+
+    def events(self, filename):
+        " The event record of filename, from the compiled copy if it is current "
+        events = self.lookup(filename)
+        if events is None:
+            compiled = compile_file(filename)
+            self.update(compiled)
+            events   = compiled[2]
+        return events
+
+    def lookup(self, filename):
+        " The event record of filename if there is a current compiled copy, else None "
+        filename = os.path.abspath(filename)
+        stamp    = file_stamp(filename)
+        cpath    = self.path(filename)
+        entry    = self.fetch(cpath)
+
+        if entry is not None and (entry[1] != stamp or stamp[1] >= entry[4] - self.RACY):
+            if entry[2] == file_digest(filename):   # touched, not changed
+                entry = (self.VERSION, stamp, entry[2], entry[3], time.time())
+                self.store(cpath, entry)
+            else:
+                entry = None
+
+        if entry is None:
+            return None
+        self.count(True)
+        return entry[3]
+
+    def count(self, hit):
+        " Count a hit (or a miss) "
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def parse(self, loader, filename):
+        """ Parse filename with loader, an XcfgLoader, which records the
+            events as it applies them, and store the record: a miss costs
+            one parse, not a compile_file() and a replay """
+        filename = os.path.abspath(filename)
+        stamp    = file_stamp(filename)
+        loader.events = []
+        fh       = DigestFile(open(filename, "rb"))
+        try:
+            loader.parse(fh)
+        finally:
+            fh.close()
+        self.update((stamp, fh.hexdigest(), loader.events))
+
+    def update(self, compiled):
+        " Store the (stamp, digest, events) result of compile_file() "
+        (stamp, digest, events) = compiled
+        self.count(False)
+        self.store(self.path(stamp[0]), (self.VERSION, stamp, digest, events, time.time()))
+
+    def fetch(self, cpath):
+        " Return the entry stored in cpath, or None if it is missing or unusable "
+        try:
+            fh = open(cpath, "rb")
+            try:
+                entry = marshal.load(fh)
+            finally:
+                fh.close()
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return None
+        if type(entry) != tuple or len(entry) != 5 or entry[0] != self.VERSION:
+            return None
+        return entry
+
+    def store(self, cpath, entry):
+        " Atomically replace cpath with entry, failure only costs a reparse "
+        directory = os.path.dirname(cpath)
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            import tempfile
+            (fd, tmp) = tempfile.mkstemp(dir=directory, prefix=".xcfgc-")
+            fh = os.fdopen(fd, "wb")
+            try:
+                marshal.dump(entry, fh)
+            finally:
+                fh.close()
+            os.rename(tmp, cpath)
+        except (IOError, OSError, ValueError), e:
+            logging.debug("could not write compiled cache %s: %s" % (cpath, e))
+
+class ResidentCache(CompiledCache):
+    """ CompiledCache kept in memory, for a long running process such as the
+        xcfg daemon.  Entries are keyed by the absolute source path and are
+        revalidated against the stamp (and then the digest) on each use.
+    """
+
+    def __init__(self):
+        CompiledCache.__init__(self)
+        self.entries = {}
+
+    def path(self, filename):
+        return os.path.abspath(filename)
+
+    def fetch(self, cpath):
+        return self.entries.get(cpath)
+
+    def store(self, cpath, entry):
+        self.entries[cpath] = entry
+
+class ParseCache(ResidentCache):
+    """ ResidentCache bounded to maxsize files and maxbytes of source XML
+        (in memory, event records take around ten times the size of their
+        source), dropping the least recently used entries first.  A file
+        bigger than maxbytes is not kept.  It is safe to share between
+        threads.
+
+        parse_cache is the one AdvancedConfig.read(), includes and the
+        module level helpers (xcfg2dict, attr2dict, ...) share by default,
+        so asking for several views of one file parses it once.
+    """
+
+    def __init__(self, maxsize=256, maxbytes=4*1024*1024):
+        import threading
+        ResidentCache.__init__(self)
+        self.entries        = LRUCache(sys.maxint)  # bounded here, to keep bytes right
+        self.maxsize        = maxsize
+        self.maxbytes       = maxbytes
+        self.bytes          = 0
+        self.evictions      = 0
+        self.invalidations  = 0
+        self.lock           = threading.RLock()
+
+    def fetch(self, cpath):
+        self.lock.acquire()
+        try:
+            return self.entries.get(cpath)
+        finally:
+            self.lock.release()
+
+    def count(self, hit):
+        self.lock.acquire()
+        try:
+            CompiledCache.count(self, hit)
+        finally:
+            self.lock.release()
+
+    def store(self, cpath, entry):
+        self.lock.acquire()
+        try:
+            old = self.entries.pop(cpath)
+            if old is not None:
+                self.bytes -= old[1][2]
+            if entry[1][2] > self.maxbytes:
+                return
+            self.entries[cpath] = entry
+            self.bytes += entry[1][2]
+            while len(self.entries) > self.maxsize or self.bytes > self.maxbytes:
+                (key, old) = self.entries.popoldest()
+                self.bytes     -= old[1][2]
+                self.evictions += 1
+        finally:
+            self.lock.release()
+
+    def invalidate(self, filename=None):
+        " Forget filename, or every file "
+        self.lock.acquire()
+        try:
+            if filename is None:
+                self.invalidations += len(self.entries)
+                self.entries.clear()
+                self.bytes = 0
+                return
+            old = self.entries.pop(self.path(filename))
+            if old is not None:
+                self.bytes         -= old[1][2]
+                self.invalidations += 1
+        finally:
+            self.lock.release()
+
+    def stats(self):
+        " Counters and sizes, as a dictionary "
+        self.lock.acquire()
+        try:
+            stats = {"hits":          self.hits,
+                     "misses":        self.misses,
+                     "entries":       len(self.entries),
+                     "bytes":         self.bytes,
+                     "evictions":     self.evictions,
+                     "invalidations": self.invalidations}
+        finally:
+            self.lock.release()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = lookups and float(stats["hits"]) / lookups or 0.0
+        return stats
+
+class DigestFile:
+    " Read-only file wrapper which computes the md5 digest of what is read "
+
+    def __init__(self, fh):
+        self.fh     = fh
+        self.digest = md5()
+
+    def read(self, size=-1):
+        data = self.fh.read(size)
+        self.digest.update(data)
+        return data
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+    def close(self):
+        self.fh.close()
+
+def file_digest(filename):
+    " md5 hex digest of the contents of filename "
+    fh = DigestFile(open(filename, "rb"))
+    try:
+        while fh.read(65536):
+            pass
+    finally:
+        fh.close()
+    return fh.hexdigest()
+
+_INCLUDED = object() # node of an include element which was resolved
+_IGNORED  = object() # node of an element inside such an include
+
+parse_cache = ParseCache() # event records of the files read by this process
+
+def include_path(href, including=None):
+    " Absolute path of include href, relative to the directory of file including "
+    href = os.path.expanduser(href)
+    if including is not None:
+        href = os.path.join(os.path.dirname(including), href)
+    return os.path.abspath(href)
+
+def include_graph(filename, cache=None):
+    """ The include graph of filename, as {path: [included paths]} for filename
+        and each file it reaches (directly or not), paths being absolute and
+        in document order.  Files which can't be read map to None.  With a
+        CompiledCache, the event records are taken from (and kept in) it,
+        so only files which changed are parsed. """
+    graph = {}
+    todo  = [os.path.abspath(filename)]
+    while todo:
+        path = todo.pop()
+        if path in graph:
+            continue
+        try:
+            if cache is not None:
+                events = cache.events(path)
+            else:
+                events = compile_file(path)[2]
+        except (IOError, OSError, ExpatError), e:
+            graph[path] = None
+            continue
+        graph[path] = []
+        depth       = 0
+        skip        = 0 # depth of the include being read, its contents are ignored
+        for ev in events:
+            if ev[0] == 0:
+                href = depth > 0 and not skip and ev[1] == "include" and attrlist2dict(ev[2]).get("href")
+                depth += 1
+                if href:
+                    graph[path].append(include_path(href, path))
+                    skip = depth
+            else:
+                if depth == skip:
+                    skip = 0
+                depth -= 1
+        todo.extend(reversed(graph[path]))
+    return graph
+
+class XcfgRecorder(XcfgLoader):
+    " Records the events of a document (see XcfgLoader) without applying them "
+
+    def __init__(self):
+        XcfgLoader.__init__(self, None, events=[])
+
+    def start(self, name, attrs):
+        name = localname(name)
+        if self.stack:
+            self.split()
+        else:
+            self.name = name
+        self.stack.append([name, attrs, [], [], False, False, None])
+        self.events.append((0, name, attrs))
+
+    def end(self, ignored):
+        self.split()
+        frame = self.stack.pop()
+        self.events.append((1, tuple(frame[2]), frame[4]))
+
+def file_stamp(filename):
+    """ (absolute path, mtime, size, inode, ctime) of filename: a file
+        replaced by another (as editors save) gets a new inode, and one
+        changed in place a new ctime as well as a new mtime """
+    filename = os.path.abspath(filename)
+    st       = os.stat(filename)
+    return (filename, st.st_mtime, st.st_size, st.st_ino, st.st_ctime)
+
+def compile_file(filename):
+    """ Parse filename into (stamp, digest, events): stamp is file_stamp()
+        as it was before reading, digest the md5 of the contents and events
+        the record which AdvancedConfig.replay() applies.
+    """
+    stamp    = file_stamp(filename)
+    recorder = XcfgRecorder()
+    fh       = DigestFile(open(stamp[0], "rb"))
+    try:
+        recorder.parse(fh)
+    finally:
+        fh.close()
+    return (stamp, fh.hexdigest(), recorder.events)
+
+def _compile_marshalled(filename):
+    """ compile_file() for a worker process.  The result goes back marshalled,
+        which is much cheaper to pass between processes than pickling the
+        events, and errors go back as strings to be reported like read() does.
+    """
+    try:
+        return (True, marshal.dumps(compile_file(filename)))
+    except (IOError, OSError, ExpatError), e:
+        return (False, str(e))
+
+PARALLEL_BYTES = 1024*1024 # below this much XML a process pool costs more than it saves
+
+def load_many(paths, mode="load", cfg=None, cache=None, processes=None):
+    """ Read the XConfig files in paths into cfg (a new AdvancedConfig by
+        default) and return it.  Files are parsed concurrently in a process
+        pool and then applied one by one in the order given, so the result
+        is the same as reading them in turn: the last file wins in load
+        mode, and merge mode appends in path order.
+
+        The pool is only used for more than one file needing a parse and
+        PARALLEL_BYTES or more of XML, unless processes is given (processes=1
+        always parses here).  With a CompiledCache, current compiled copies
+        are used and only the other files are parsed.
+    """
+    if cfg is None:
+        cfg = AdvancedConfig()
+    for (path, events) in zip(paths, compile_many(paths, cache, processes)):
+        if events is not None:
+            cfg.replay(events, mode, path)
+    return cfg
+
+def compile_many(paths, cache=None, processes=None):
+    """ The event records of the files in paths, None for those which could
+        not be read (they are logged), parsed as load_many() describes """
+    records = [None] * len(paths) # events, or None if the file needs a parse
+    todo    = []
+    for (idx, path) in enumerate(paths):
+        if cache is not None:
+            try:
+                records[idx] = cache.lookup(path)
+            except (IOError, OSError):
+                pass # parsing will report it
+        if records[idx] is None:
+            todo.append(idx)
+
+    results = None
+    if len(todo) > 1 and processes != 1:
+        size = 0
+        for idx in todo:
+            try:
+                size += os.path.getsize(paths[idx])
+            except OSError:
+                pass
+        if processes is not None or size >= PARALLEL_BYTES:
+            try:
+                import multiprocessing
+                pool = multiprocessing.Pool(min(processes or multiprocessing.cpu_count(), len(todo)))
+                try:
+                    results = pool.map(_compile_marshalled, [paths[idx] for idx in todo])
+                finally:
+                    pool.close()
+                    pool.join()
+            except (ImportError, OSError), e:
+                logging.debug("parsing serially, no process pool: %s" % e)
+    if results is None:
+        results = [_compile_marshalled(paths[idx]) for idx in todo]
+
+    for (idx, (ok, result)) in zip(todo, results):
+        if not ok:
+            logging.error('read failed: %s (%s)' % (paths[idx], result))
+            continue
+        compiled = marshal.loads(result)
+        if cache is not None:
+            cache.update(compiled)
+        records[idx] = compiled[2]
+    return records
+
+def root_names(events):
+    """ Names an event record (see compile_file) sets on the node it is
+        applied to: the attributes and child elements of the document
+        element.  None if an include there may set others. """
+    names = set()
+    depth = 0
+    for ev in events:
+        if ev[0] == 1:
+            depth -= 1
+            continue
+        depth += 1
+        attrs = ev[2]
+        if depth == 1:
+            names.update([localname(attrs[idx]) for idx in range(0, len(attrs), 2)])
+        elif depth == 2:
+            if ev[1] == "include" and "href" in attrs[::2]:
+                return None
+            names.add(ev[1])
+    return names
+
+class EnvOverlay(UserDict.DictMixin):
+    """ The entries of cfg (a config tree) over the variables of the
+        environment which pass select (a KeySelector, None for all of them).
+        Variables are read through from environ (os.environ as it is when
+        read, by default) and never copied: setting an entry sets it in cfg,
+        deleting one hides the variable, and the environment itself is not
+        changed.  keys() only lists names, so a command reading a few
+        entries reads only those variables.  Variables in SKIP are never
+        shown.
+
+        The rest of the tree interface is cfg's.
+    """
+
+    SKIP = frozenset(["TERMCAP"]) # screwy escape codes, or typically multi-line
+
+    def __init__(self, cfg, environ=None, select=None):
+        self.cfg     = cfg
+        self.environ = environ
+        self.select  = select
+        self.hidden  = set()    # variables deleted from the overlay
+        self.own     = self.entries() # names cfg has, they shadow the environment
+
+    def entries(self):
+        " Names of the keys and entries of cfg "
+        return set(self.cfg.keys()) | set([k for (k, v) in self.cfg._children_items()])
+
+    def env(self):
+        if self.environ is None:
+            return os.environ
+        return self.environ
+
+    def shows(self, key):
+        " The variable key is in the environment and shown "
+        return key in self.env() and key not in self.hidden and key not in self.SKIP and \
+            (self.select is None or key in self.select)
+
+    def variables(self):
+        " Names of the variables shown "
+        env    = self.env()
+        select = self.select
+        if select is not None and not select.trie and not select.regexes:
+            names = [k for k in select.names if k in env] # only names, don't look at the rest
+        else:
+            names = env.keys()
+            if select is not None:
+                names = select.select(names)
+        return [k for k in names if k not in self.hidden and k not in self.SKIP]
+
+    def cover(self, select=None):
+        """ Show the variables passing select (all of them for None) over
+            the entries set so far, as copying them into cfg would """
+        env = self.env()
+        for k in list(self.own):
+            if k in env and k not in self.SKIP and (select is None or k in select):
+                del self.cfg[k]
+                self.own.discard(k)
+        if select is None:
+            self.hidden.clear()
+            self.select = None
+        else:
+            self.hidden = set([k for k in self.hidden if k not in select])
+            if self.select is not None:
+                self.select = KeySelector(list(self.select) + list(select))
+
+    def __getitem__(self, key):
+        if key in self.own:
+            return self.cfg[key]
+        if self.shows(key):
+            return self.env()[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.own or self.shows(key)
+
+    has_key = __contains__
+
+    def __setitem__(self, key, item):
+        self.cfg[key] = item
+        self.own.add(key)
+
+    def __delitem__(self, key):
+        found = self.shows(key)
+        if found:
+            self.hidden.add(key)
+        if key in self.own:
+            del self.cfg[key]
+            self.own.discard(key)
+        elif not found:
+            raise KeyError(key)
+
+    def keys(self):
+        keys = self.cfg.keys()
+        own  = set(keys)
+        return keys + [k for k in self.variables() if k not in own]
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.cfg, name)
+
+    def replay(self, events, mode="load", filename=None):
+        """ Apply an event record to cfg.  Merging appends to the values it
+            finds, so the variables it may merge into are copied first. """
+        names = root_names(events)
+        if mode == "merge":
+            for k in (names is None and self.variables() or names or ()):
+                if k not in self.own and self.shows(k):
+                    self[k] = self.env()[k]
+        self.cfg.replay(events, mode, filename)
+        if names is None:
+            self.own = self.entries()
+        else:
+            self.own.update(names)
+
+    def expanded(self, keys=None):
+        """ The values exp() would set, as a dictionary.  Variables which
+            expand to themselves are left out, they stay in the environment. """
+        expanded = Expander(self, self.env()).expand(keys)
+        own      = self.own
+        if keys is not None:
+            keys = set(keys)
+        return dict([(k, v) for (k, v) in expanded.items()
+                     if (keys is None or k in keys) and (k in own or v != self[k])])
+
+    def exp(self, keys=None):
+        for (k, v) in self.expanded(keys).items():
+            self[k] = v
+
+    def cleaned(self, sep, keys=None):
+        " The values clean() would set, as a dictionary, but for variables which are clean "
+        if keys is None:
+            keys = self.keys()
+        own    = self.own
+        result = {}
+        for k in keys:
+            v = valuestr(self[k])
+            if isinstance(v, basestring):
+                c = PathList(v, sep).render()
+                if k in own or c != v:
+                    result[k] = c
+        return result
+
+    def clean(self, sep, keys=None):
+        for (k, v) in self.cleaned(sep, keys).items():
+            self[k] = v
+
+    def copy(self):
+        " An overlay of a copy of cfg (see copy_tree) over the same variables "
+        overlay        = EnvOverlay(copy_tree(self.cfg), self.environ, self.select)
+        overlay.hidden = set(self.hidden)
+        overlay.own    = set(self.own)
+        return overlay
+
+    def s(self):
+        " Update the environment from the entries, shown variables are there already "
+        keys = self.cfg.keys()
+        if self.environ is not None:
+            keys = self.keys()
+        for k in keys:
+            os.environ[k] = valuestr(self[k])
+
+    def todict(self):
+        d = self.cfg.todict()
+        for k in self.variables():
+            if k not in self.own:
+                d[k] = self.env()[k]
+        return d
+
+class ConfigStack(object):
+    """ A config as a stack of immutable layers: files (their event records,
+        applied in load or merge mode), sets of entries, removals of entries
+        and views of the environment (see EnvOverlay).  Stacks are
+        persistent: push() and friends return a new stack on top of this one
+        and never change it, so keeping a stack is an O(1) snapshot and going
+        back to it an O(1) rollback.
+
+        config() flattens the layers into a nodetype tree and memoizes it.
+        The tree is built on the tree of the nearest stack below which has
+        one, applying only the new layers: it is taken over when that stack
+        is not kept (see snapshot()), so a stack used like a single config
+        costs what the config would, and copied when it is, so each kept
+        stack holds on to its own tree and is never replayed from the
+        bottom.  The tree (an EnvOverlay over one, above an env layer) is
+        shared, treat it as read-only.
+    """
+
+    def __init__(self, layer=None, below=None, nodetype=AdvancedConfig):
+        self.layer    = layer   # (label, kind, data), None at the bottom
+        self.below    = below
+        self.nodetype = nodetype
+        self.kept     = False   # snapshot() was called, don't take over memo
+        self.memo     = None
+
+    def push(self, label, kind, data):
+        " This stack with layer (label, kind, data) on top, see apply() for kinds "
+        return ConfigStack((label, kind, data), self, self.nodetype)
+
+    def update(self, label, entries):
+        " This stack with a layer setting entries (a mapping) on top "
+        return self.push(label, "set", dict(entries))
+
+    def delete(self, label, keys):
+        " This stack with a layer removing the entries named in keys on top "
+        return self.push(label, "unset", tuple(keys))
+
+    def environ(self, label, patterns=None):
+        """ This stack with a layer showing the environment variables which
+            match patterns (KeySelector patterns, None for all) on top.  The
+            layer holds a copy of the environment as it is now, so that
+            later changes to it (by s, say) don't change this stack. """
+        if patterns is not None:
+            patterns = tuple(patterns)
+        return self.push(label, "env", (patterns, dict(os.environ)))
+
+    def load(self, filename, mode="load", cache=None):
+        """ This stack with filename on top, applied in load or merge mode.
+            If it can't be read, the error is logged and this stack returned.
+        """
+        try:
+            if cache is not None:
+                events = cache.events(filename)
+            else:
+                events = compile_file(filename)[2]
+        except (IOError, OSError, ExpatError), e:
+            logging.error('read failed: %s (%s)' % (filename, e))
+            return self
+        return self.push(filename, mode, events)
+
+    def load_many(self, paths, mode="load", cache=None, processes=None):
+        " This stack with the files in paths on top, parsed as load_many() does "
+        stack = self
+        for (path, events) in zip(paths, compile_many(paths, cache, processes)):
+            if events is not None:
+                stack = stack.push(path, mode, events)
+        return stack
+
+    def snapshot(self):
+        " Keep this stack: its flattened tree will not be taken over, returns self "
+        self.kept = True
+        return self
+
+    def layers(self):
+        " The (label, kind, data) layers, from the bottom up "
+        result = []
+        stack  = self
+        while stack is not None:
+            if stack.layer is not None:
+                result.append(stack.layer)
+            stack = stack.below
+        result.reverse()
+        return result
+
+    def config(self):
+        " The layers flattened into one tree (memoized, read-only) "
+        if self.memo is not None:
+            return self.memo
+        pending = []
+        stack   = self
+        while stack is not None and stack.memo is None:
+            pending.append(stack)
+            stack = stack.below
+        if stack is None:
+            cfg = self.nodetype()
+        elif stack.kept:
+            cfg = copy_tree(stack.memo)
+        else:
+            (cfg, stack.memo) = (stack.memo, None)
+        pending.reverse()
+        for stack in pending:
+            cfg = self.apply(cfg, stack.layer)
+            if stack.kept and stack is not self:
+                stack.memo = cfg
+                cfg        = copy_tree(cfg)
+        self.memo = cfg
+        return cfg
+
+    def apply(self, cfg, layer):
+        """ Apply layer to cfg and return it.  Kinds are load and merge (data
+            is an event record, see compile_file), set (data maps keys to
+            values), unset (data is a tuple of keys) and env (data is
+            (patterns, environ): None or a tuple of KeySelector patterns,
+            and a copy of the environment).  An env layer returns cfg in an
+            EnvOverlay over its environ, which the layers above are applied
+            to. """
+        if layer is None:
+            return cfg
+        (label, kind, data) = layer
+        if kind == "env":
+            (patterns, environ) = data
+            if isinstance(cfg, EnvOverlay):
+                cfg.environ = environ
+            else:
+                cfg = EnvOverlay(cfg, environ, KeySelector())
+            if patterns is None:
+                cfg.cover()
+            else:
+                cfg.cover(KeySelector(patterns))
+            return cfg
+        if kind == "set":
+            for (k, v) in data.items():
+                cfg[k] = v
+        elif kind == "unset":
+            present = set(cfg.keys())
+            for k in data:
+                if k in present:
+                    del cfg[k]
+        else:
+            cfg.replay(data, kind, label)
+        return cfg
+
+def copy_tree(cfg):
+    """ A new tree with the entries of cfg (an AdvancedConfig, CompactConfig
+        or EnvOverlay), for a ConfigStack to go on from.  PathLists are
+        copied, strings are shared. """
+    if isinstance(cfg, (AdvancedConfig, EnvOverlay)):
+        return cfg.copy()
+    tree = cfg.__class__()
+    tree._restore(snapshot_tree(cfg))
+    if cfg.get("__TEXT") is not None:
+        setattr(tree, "__TEXT", cfg.get("__TEXT"))
+    return tree
+
+def leafdiff(old, new):
+    """ The leaves which differ between two todict() results, as
+        {key: (old value, new value)}, None standing for a missing leaf """
+    changes = {}
+    for (k, v) in old.items():
+        if new.get(k) != v:
+            changes[k] = (v, new.get(k))
+    for (k, v) in new.items():
+        if k not in old:
+            changes[k] = (None, v)
+    return changes
+
+class ConfigWatcher:
+    """ Keeps a config read from filenames (applied in order in mode, as
+        load_many() would) up to date with the files, for long running
+        programs.  config is the current tree; a reload builds a new tree
+        and replaces it, so a tree once obtained never changes under its
+        reader.
+
+        check() looks for changed files (the file_stamp() of the files and
+        of everything they include, and their digest if they changed within
+        the mtime resolution, see CompiledCache) and reloads if there are
+        any.  Only changed files are parsed again, the others (and the
+        include graph) come from their event records.  Callbacks given to subscribe() are then called with
+        the new tree and the changed leaves, as leafdiff() returns them.
+
+        start() checks in a background thread, every interval seconds, and
+        straight away on inotify events when pyinotify is installed
+        (backend "auto" or "inotify"; "poll" only polls).
+    """
+
+    def __init__(self, filenames, mode="load", interval=1.0, nodetype=AdvancedConfig, backend="auto"):
+        if isinstance(filenames, basestring):
+            filenames = [filenames]
+        self.filenames  = [os.path.abspath(f) for f in filenames]
+        self.mode       = mode
+        self.interval   = interval
+        self.nodetype   = nodetype
+        self.backend    = backend
+        self.cache      = ResidentCache()
+        self.callbacks  = []
+        self.stamps     = {}
+        self.config     = None
+        self.thread     = None
+        self.reload()
+
+    def subscribe(self, callback):
+        " Call callback(config, changes) after each reload which changed leaves "
+        self.callbacks.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self.callbacks.remove(callback)
+
+    def files(self):
+        " The watched files: filenames and all the files they include "
+        files = []
+        for filename in self.filenames:
+            for path in include_graph(filename, self.cache).keys():
+                if path not in files:
+                    files.append(path)
+        return files
+
+    def stamp(self, path):
+        " The file_stamp() of path as it was read, or now if it wasn't, None if it is missing "
+        entry = self.cache.entries.get(path)
+        if entry is not None:
+            return entry[1]
+        try:
+            return file_stamp(path)
+        except OSError:
+            return None
+
+    def changed(self):
+        " The watched files which changed since the last reload "
+        changed = []
+        for (path, stamp) in self.stamps.items():
+            try:
+                current = file_stamp(path)
+            except OSError:
+                current = None
+            if current != stamp:
+                changed.append(path)
+            elif path in self.cache.entries and self.cache.lookup(path) is None:
+                changed.append(path) # changed again within the mtime resolution
+        return changed
+
+    def check(self):
+        " Reload if a watched file changed, return the changes (see leafdiff) "
+        if self.changed():
+            return self.reload()
+        return {}
+
+    def reload(self):
+        " Read the files again (parsing only changed ones), notify and return the changes "
+        # the files are stamped before they are read (see compile_file), so
+        # an edit made meanwhile shows at the next check
+        files = self.files()
+        for path in set(self.cache.entries) - set(files): # no longer included
+            del self.cache.entries[path]
+        self.stamps = dict([(path, self.stamp(path)) for path in files])
+        cfg = self.nodetype()
+        for path in self.filenames:
+            try:
+                events = self.cache.events(path)
+            except (IOError, OSError, ExpatError), e:
+                logging.error('read failed: %s (%s)' % (path, e))
+                continue
+            cfg.replay(events, self.mode, path, self.cache)
+        (old, self.config) = (self.config, cfg)
+        if old is None:
+            return {}
+        changes = leafdiff(old.todict(), cfg.todict())
+        if changes:
+            for callback in list(self.callbacks):
+                try:
+                    callback(cfg, changes)
+                except Exception:
+                    logging.exception("config change callback failed")
+        return changes
+
+    def start(self):
+        " Check in a background thread until stop() "
+        import threading
+        self.stopping = threading.Event()
+        self.thread   = threading.Thread(target=self.run, name="xcfg-watcher")
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        notifier = self.notifier()
+        while not self.stopping.isSet():
+            if notifier is None:
+                self.stopping.wait(self.interval)
+            elif notifier.check_events(int(self.interval * 1000)):
+                notifier.read_events()
+                notifier.process_events()
+            if self.stopping.isSet():
+                break
+            try:
+                self.check()
+            except Exception:
+                logging.exception("config reload failed")
+
+    def notifier(self):
+        " A pyinotify Notifier on the directories of the watched files, or None "
+        if self.backend == "poll":
+            return None
+        try:
+            import pyinotify
+        except ImportError:
+            if self.backend == "inotify":
+                logging.warn("pyinotify is not installed, polling instead")
+            return None
+        manager = pyinotify.WatchManager()
+        mask    = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO | pyinotify.IN_CREATE | \
+                  pyinotify.IN_DELETE | pyinotify.IN_ATTRIB
+        for directory in set([os.path.dirname(path) for path in self.stamps]):
+            manager.add_watch(directory, mask)
+        return pyinotify.Notifier(manager, lambda event: None)
+
+class _StopParsing(Exception):
+    " Raised from an expat handler to abandon the rest of a document "
+    pass
+
+_localnames = {}
+
+def localname(name):
+    """ Strip the namespace URI expat prefixes onto qualified names.  Names
+        are interned, so every element and attribute of the same name shares
+        one string. """
+    local = _localnames.get(name)
+    if local is None:
+        if len(_localnames) > 10000:
+            _localnames.clear()
+        local = name[name.rfind(" ")+1:]
+        try:
+            local = intern(str(local))
+        except UnicodeError:
+            pass
+        _localnames[name] = local
+    return local
+
+def attrlist2dict(attrs):
+    " Convert an expat ordered attribute list into a dictionary "
+    d   = {}
+    idx = 0
+    while idx < len(attrs):
+        d[localname(attrs[idx])] = attrs[idx+1]
+        idx += 2
+    return d
+
+def expat_parse(filename, start, end, chars=None, split=None,
+                start_cdata=None, end_cdata=None):
+    """ Run an expat parser with the given handlers over filename (a path or
+        an open file).  Names are reported as "uri localname" when namespaced
+        and attributes as an ordered [name, value, ...] list.
+    """
+    parser = xml.parsers.expat.ParserCreate(namespace_separator=" ")
+    parser.buffer_text          = True
+    parser.ordered_attributes   = True
+    parser.StartElementHandler  = start
+    parser.EndElementHandler    = end
+    if chars is not None:
+        parser.CharacterDataHandler = chars
+    if split is not None:
+        parser.CommentHandler               = split
+        parser.ProcessingInstructionHandler = split
+    if start_cdata is not None:
+        parser.StartCdataSectionHandler = start_cdata
+        parser.EndCdataSectionHandler   = end_cdata
+
+    if hasattr(filename, "read"):
+        parser.ParseFile(filename)
+    else:
+        fh = open(filename, "rb")
+        try:
+            parser.ParseFile(fh)
+        finally:
+            fh.close()
+
+def root_attributes(filename):
+    """ Return a dictionary of the attributes on the document element.  The
+        file goes through parse_cache, so that other views of it need no
+        parse.  Of a file too big for it to keep, or a malformed one, only
+        the start tag of the document element is parsed.
+    """
+    if not hasattr(filename, "read"):
+        try:
+            if os.path.getsize(filename) <= parse_cache.maxbytes:
+                return attrlist2dict(parse_cache.events(filename)[0][2])
+        except (IOError, OSError, ExpatError):
+            pass    # expat_parse reports it, if the start tag has it
+    found = {}
+    def start(name, attrs):
+        found.update(attrlist2dict(attrs))
+        raise _StopParsing()
+    def end(name):
+        pass
+
+    try:
+        expat_parse(filename, start, end)
+    except _StopParsing:
+        pass
+    return found
+
+def parsed(filename):
+    " Parse an XConfig XML file and return a dictionary of name/value pairs "
+    return root_attributes(filename)
+
+def parseo(filename):
+    " Parse an XConfig XML file and return an object with attributes and values "
+    xcfg_obj    = SimpleConfig()
+    for (name, value) in root_attributes(filename).items():
+        eval("xcfg_obj.%s = %s" % (name, value))
+
+    return xcfg_obj
+
+def attr2dict(filename):
+    """ Parse an XConfig XML file and return a dictionary of name/value pairs
+        from the attributes on the document element.
+    """
+    return root_attributes(filename)
+
+def xcfg2dict(filename, cache=None):
+    """ Parse an XConfig XML file and return its flat dictionary of leaf
+        names, read() as with cache (parse_cache by default) """
+    xcfg = AdvancedConfig()
+    xcfg.read(filename, cache=cache)
+    return xcfg.todict()
+
+MAP_MAGIC  = "XCFGMAP2"
+MAP_HEADER = 16 # magic, slots, keys
+
+def map_records(node, path=""):
+    " (key, value) for the leaves below node, keyed by path (/a/b/c) "
+    records = []
+    for (slot, value) in node._children_items():
+        if isinstance(value, CONFIG_TYPES):
+            records.extend(map_records(value, path + "/" + slot))
+        elif isleaf(value):
+            records.append((path + "/" + slot, valuestr(value)))
+    return records
+
+def write_map(cfg, out, sources=()):
+    """ Write the leaves of cfg to out (a file name or an open file) as a
+        ConfigMap: each leaf under its path (/a/b/c) and under its todict()
+        key, in records found through an open addressing hash table (crc32
+        of the key, linear probing).  sources are the file_stamp()s of the
+        files cfg was read from, the main one first, each with the md5
+        digest of the file appended, for ConfigMap.stale().
+
+        Layout, all integers little endian unsigned 32 bit:
+            header   "XCFGMAP2", slots, keys
+            table    slots x (hash, record offset), offset 0 is a free slot
+            records  (key length, value length, key, value), UTF-8
+        The record with the empty key lists the sources, one
+        "path\tmtime\tsize\tinode\tctime\tdigest" a line.
+    """
+    import struct
+    from zlib import crc32
+    flat    = cfg.todict()
+    records = map_records(cfg) + flat.items()
+    records.append(("", "\n".join(["%s\t%r\t%d\t%d\t%r\t%s" % stamp for stamp in sources])))
+    slots   = 8
+    while slots < 2 * len(records):
+        slots *= 2
+    table   = [(0, 0)] * slots
+    chunks  = []
+    offset  = MAP_HEADER + 8 * slots
+    for (key, value) in records:
+        (key, value) = (utf8(key), utf8(value))
+        h   = crc32(key) & 0xffffffffL
+        idx = h & (slots - 1)
+        while table[idx][1]:
+            idx = (idx + 1) & (slots - 1)
+        table[idx] = (h, offset)
+        chunks.append(struct.pack("<II", len(key), len(value)) + key + value)
+        offset += 8 + len(key) + len(value)
+    if offset > 0xffffffffL:
+        raise ValueError("config too large for a map: %d bytes" % offset)
+    (fh, close) = outfile(out)
+    try:
+        fh.write(struct.pack("<8sII", MAP_MAGIC, slots, len(flat)))
+        fh.write("".join([struct.pack("<II", h, off) for (h, off) in table]))
+        for chunk in chunks:
+            fh.write(chunk)
+    finally:
+        if close:
+            fh.close()
+
+def compile_map(filename, mapfile=None, mode="load"):
+    """ Read filename (following its includes) and write it as a ConfigMap
+        to mapfile (filename + ".map" by default), replacing any old map in
+        one rename so that readers never see a partial file.  Returns the
+        map file name.  Raises IOError, OSError or ExpatError if filename
+        can't be read.
+    """
+    filename = os.path.abspath(filename)
+    mapfile  = mapfile or filename + ".map"
+    cache    = ResidentCache() # each file is parsed once, and stamped before reading
+    graph    = include_graph(filename, cache)
+    events   = cache.events(filename)
+    others   = [path for path in graph.keys() if path != filename and graph[path] is not None]
+    sources  = []
+    for path in [filename] + others:
+        entry = cache.entries[path]
+        sources.append(entry[1] + (entry[2],))
+    cfg = AdvancedConfig()
+    cfg.replay(events, mode, filename, cache)
+    tmpfile = "%s.%d.tmp" % (mapfile, os.getpid())
+    try:
+        write_map(cfg, tmpfile, sources)
+        os.rename(tmpfile, mapfile)
+    finally:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+    return mapfile
+
+class ConfigMap(object):
+    """ Read-only view of a config written by write_map()/compile_map().
+        The file is mmapped and keys are looked up in place, so processes
+        mapping the same file share one copy of it in the page cache and
+        opening it costs the same for any size.  Values are unicode, as
+        they are from the XML.
+
+        The mapping interface is the flat view (todict() keys), axpath()
+        resolves leaf paths: /a/b/c (or a/b/c) relative to the document
+        element, and //c, which is the todict() value of c.  Other AXPath
+        queries need the tree, see AdvancedConfig.axselect.
+
+        Opening a file which is not a map, or is truncated, raises
+        ValueError, and so does a lookup which runs into a damaged record.
+    """
+
+    def __init__(self, mapfile):
+        import mmap, struct
+        from zlib import crc32
+        self.mapfile = mapfile
+        fh = open(mapfile, "rb")
+        try:
+            self.mm      = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) # ValueError if empty
+            self.written = os.fstat(fh.fileno()).st_mtime
+        finally:
+            fh.close() # the mapping stays valid
+        self.settled = set() # sources checked on their digest for good, see stale()
+        self.crc32  = crc32
+        self.pair   = struct.Struct("<II").unpack_from
+        try:
+            if len(self.mm) < MAP_HEADER:
+                self.corrupt("no header")
+            (magic, self.slots, self.nkeys) = struct.unpack_from("<8sII", self.mm, 0)
+            if magic != MAP_MAGIC:
+                raise ValueError("not an xcfg map: %s" % mapfile)
+            if self.slots < 8 or self.slots & (self.slots - 1) or MAP_HEADER + 8 * self.slots > len(self.mm):
+                self.corrupt("bad table")
+            self.sources()
+        except ValueError:
+            self.mm.close()
+            raise
+
+    def corrupt(self, what):
+        raise ValueError("corrupt xcfg map: %s (%s)" % (self.mapfile, what))
+
+    def close(self):
+        self.mm.close()
+
+    def lookup(self, key):
+        " The value stored under key (a path or a todict() key), or None "
+        key  = utf8(key)
+        (mm, pair, mask) = (self.mm, self.pair, self.slots - 1)
+        end  = len(mm)
+        h    = self.crc32(key) & 0xffffffffL
+        idx  = h & mask
+        for probe in xrange(self.slots):
+            (slot_hash, offset) = pair(mm, MAP_HEADER + 8 * idx)
+            if offset == 0:
+                return None
+            if slot_hash == h:
+                if offset + 8 > end:
+                    self.corrupt("record offset")
+                (klen, vlen) = pair(mm, offset)
+                start = offset + 8
+                if start + klen + vlen > end:
+                    self.corrupt("record length")
+                if mm[start:start+klen] == key:
+                    try:
+                        return mm[start+klen:start+klen+vlen].decode("utf-8")
+                    except UnicodeError:
+                        self.corrupt("record value")
+            idx = (idx + 1) & mask
+        self.corrupt("full table")
+
+    def records(self):
+        " (key, value) for every record, in file order "
+        (mm, pair) = (self.mm, self.pair)
+        offset = MAP_HEADER + 8 * self.slots
+        end    = len(mm)
+        while offset < end:
+            if offset + 8 > end:
+                self.corrupt("record offset")
+            (klen, vlen) = pair(mm, offset)
+            start  = offset + 8
+            if start + klen + vlen > end:
+                self.corrupt("record length")
+            yield (mm[start:start+klen].decode("utf-8"), mm[start+klen:start+klen+vlen].decode("utf-8"))
+            offset = start + klen + vlen
+
+    def __getitem__(self, key):
+        if not key or key.startswith("/"): # leaf paths, and the sources record
+            raise KeyError(key)
+        value = self.lookup(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return bool(key) and not key.startswith("/") and self.lookup(key) is not None
+
+    has_key = __contains__
+
+    def keys(self):
+        return [key for (key, value) in self.records() if key and not key.startswith("/")]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return self.nkeys
+
+    def items(self):
+        return [(key, value) for (key, value) in self.records() if key and not key.startswith("/")]
+
+    def todict(self):
+        return dict(self.items())
+
+    def axpath(self, path):
+        " The leaf at path (see the class), raises AttributeError if there is none "
+        if path.startswith("//"):
+            value = path[2:].find("/") < 0 and self.get(path[2:]) or None
+        else:
+            value = self.lookup("/" + path.lstrip("/"))
+        if value is None:
+            raise AttributeError(path)
+        return value
+
+    def sources(self):
+        """ (path, mtime, size, inode, ctime, digest) of the files the map was
+            compiled from, the main one first: their file_stamp() before
+            they were read, and their md5 digest """
+        record = self.lookup("")
+        if record is None:
+            self.corrupt("no sources")
+        stamps = []
+        for line in record.splitlines():
+            try:
+                (path, mtime, size, inode, ctime, digest) = line.split("\t")
+                stamps.append((path, float(mtime), int(size), int(inode), float(ctime), digest))
+            except ValueError:
+                self.corrupt("sources")
+        return stamps
+
+    def stale(self, filename=None):
+        """ True if a source file changed (or went) since the map was
+            compiled, or if it was not compiled from filename.  A file is
+            compared on its file_stamp(), and on its digest too if it was
+            changed less than CompiledCache.RACY seconds before the map
+            was written, as it may have changed again without a new mtime.
+        """
+        sources = self.sources()
+        if filename is not None and (not sources or sources[0][0] != os.path.abspath(filename)):
+            return True
+        for source in sources:
+            path = source[0]
+            try:
+                stamp = file_stamp(path)
+            except OSError:
+                return True
+            if stamp != source[:5]:
+                return True
+            if stamp[1] >= self.written - CompiledCache.RACY and path not in self.settled:
+                if file_digest(path) != source[5]:
+                    return True
+                if time.time() > stamp[1] + CompiledCache.RACY:
+                    self.settled.add(path) # any later change has a new mtime
+        return False
+
+_MAPS = {} # map file -> ConfigMap, for mapped()
+
+def mapped(filename, mapfile=None):
+    """ ConfigMap of filename, for worker processes in place of xcfg2dict():
+        the map (filename + ".map" by default) is compiled if it is missing,
+        stale or damaged, and is opened once per process.
+    """
+    mapfile = os.path.abspath(mapfile or filename + ".map")
+    cmap    = _MAPS.get(mapfile)
+    if cmap is not None:
+        if not cmap.stale(filename):
+            return cmap
+        del _MAPS[mapfile]
+        cmap.close()
+    try:
+        cmap = ConfigMap(mapfile) # another process may have compiled it already
+    except EnvironmentError:
+        cmap = None
+    except ValueError, e:
+        logging.warn("%s, compiling it again" % e)
+        cmap = None
+    if cmap is not None and cmap.stale(filename):
+        cmap.close()
+        cmap = None
+    if cmap is None:
+        compile_map(filename, mapfile)
+        cmap = ConfigMap(mapfile)
+    _MAPS[mapfile] = cmap
+    return cmap
+
+class CountingWriter:
+    " Write-through file wrapper which counts the bytes written "
+
+    def __init__(self, fh):
+        self.fh     = fh
+        self.bytes  = 0
+
+    def write(self, data):
+        self.bytes += len(data)
+        self.fh.write(data)
+
+    def flush(self):
+        self.fh.flush()
+
+class CommandStats:
+    """ Per command accounting for XcfgCLI: calls, wall time, root keys
+        touched (added, removed or changed) and bytes printed, see
+        XcfgCLI.do_stats.  Commands named in profile also run under
+        cProfile, with the profile printed on stderr after each call.
+        The report goes to stderr, or as JSON to output if it is given.
+
+        Counting touched keys compares the root entries before and after
+        each command, which costs time in proportion to the config; none of
+        this is done unless stats are on.
+    """
+
+    def __init__(self, output=None, profile=()):
+        self.output   = output
+        self.profile  = list(profile)
+        self.commands = {} # name -> [calls, seconds, keys, bytes]
+        self.order    = []
+
+    def measure(self, cli, name, func, *args):
+        " Call func(*args) for cli command name, and account for it "
+        before     = self.snapshot(cli)
+        out        = CountingWriter(sys.stdout)
+        sys.stdout = out
+        t0         = time.time()
+        try:
+            if name in self.profile:
+                return self.profiled(name, func, *args)
+            return func(*args)
+        finally:
+            elapsed    = time.time() - t0
+            sys.stdout = out.fh
+            self.record(name, elapsed, self.touched(before, self.snapshot(cli)), out.bytes)
+
+    def profiled(self, name, func, *args):
+        import cProfile
+        import pstats
+        prof = cProfile.Profile()
+        try:
+            return prof.runcall(func, *args)
+        finally:
+            sys.stderr.write("profile of %s:\n" % name)
+            pstats.Stats(prof, stream=sys.stderr).sort_stats("cumulative").print_stats(25)
+
+    def snapshot(self, cli):
+        entries = {}
+        for (k, v) in cli.xcfg.items():
+            if isleaf(v):
+                entries[k] = valuestr(v)
+            else:
+                entries[k] = id(v)
+        return entries
+
+    def touched(self, before, after):
+        count = 0
+        for (k, v) in before.items():
+            if after.get(k, v) != v or k not in after:
+                count += 1
+        for k in after:
+            if k not in before:
+                count += 1
+        return count
+
+    def record(self, name, seconds, keys, nbytes):
+        if name not in self.commands:
+            self.commands[name] = [0, 0.0, 0, 0]
+            self.order.append(name)
+        counts     = self.commands[name]
+        counts[0] += 1
+        counts[1] += seconds
+        counts[2] += keys
+        counts[3] += nbytes
+
+    def report(self, fh=None):
+        " Print the summary table on fh [stderr] "
+        fh = fh or sys.stderr
+        fh.write("%-10s %8s %10s %8s %10s\n" % ("command", "calls", "seconds", "keys", "bytes"))
+        total = [0, 0.0, 0, 0]
+        for name in self.order:
+            counts = self.commands[name]
+            fh.write("%-10s %8d %10.4f %8d %10d\n" % tuple([name] + counts))
+            total  = [a + b for (a, b) in zip(total, counts)]
+        fh.write("%-10s %8d %10.4f %8d %10d\n" % tuple(["total"] + total))
+
+    def dump(self, filename):
+        " Write the counters to filename as JSON "
+        import json
+        data = {}
+        for (name, counts) in self.commands.items():
+            data[name] = dict(zip(("calls", "seconds", "keys", "bytes"), counts))
+        fh = open(filename, "w")
+        try:
+            json.dump({"commands": data, "order": self.order}, fh, indent=1, sort_keys=True)
+            fh.write("\n")
+        finally:
+            fh.close()
+
+    def finish(self):
+        " Report at the end of a command line: to the JSON output if set, else stderr "
+        if self.output is None:
+            self.report()
+        else:
+            self.dump(self.output)
+
+def shell_syntax(shell, export=True):
+    " (pre, mid, wrap) of a variable assignment in shell (csh, anything else is bash) "
+    if shell == "csh":
+        if export:
+            return ("setenv ", " ", '"')
+        return ("set ", "=", '"')
+    if export:
+        return ("export ", "=", '"')
+    return ("", "=", '"')
+
+def env_line(syntax, key, value):
+    " The assignment of value to key, in the (pre, mid, wrap) syntax "
+    (pre, mid, wrap) = syntax
+    if (value.find(" ") >= 0) or (value.find("=") >= 0):
+        w = wrap
+    else:
+        w = ""
+    return "%s%s%s%s%s%s" % (pre, key, mid, w, value, w)
+
+def host_arch():
+    " The ARCH of this machine, as the arch command sets it "
+    arch  = "i386" # default
+    opsys = os.uname()[0]   # e.g. Linux, Darwin, etc.
+    proc  = os.uname()[-1]  # e.g. x86_64, i386, i686, ppc, etc.
+    if opsys == "Linux":
+        if proc == "x86_64":
+            arch = "x86_64"
+        else:
+            arch = "i386"
+    if opsys == "Darwin":
+        if proc == "i386":
+            arch = "osx_intel"
+        else:
+            arch = "osx_ppc"
+    return arch
+
+class RenderTarget(object):
+    """ One output of render(): the shell syntax, exported or local
+        variables, the ARCH to render for (None for the config as it is) and
+        the file to write (None to return the text only) """
+
+    def __init__(self, shell="bash", export=True, arch=None, output=None):
+        self.shell  = shell
+        self.export = export
+        self.arch   = arch
+        self.output = output
+
+    def __repr__(self):
+        return "RenderTarget(%r, %r, %r, %r)" % (self.shell, self.export, self.arch, self.output)
+
+_TARGET_RE = re.compile(r"^(?P<shell>\w+)(?P<scope>-loc|-env)?(?:@(?P<arch>[\w.+-]+))?(?:=(?P<output>.+))?$")
+
+def parse_target(spec):
+    """ RenderTarget for spec, SHELL[-loc][@ARCH][=FILE]: e.g. csh-loc,
+        bash@x86_64=x86_64.sh.  Raises ValueError if spec is not one. """
+    match = _TARGET_RE.match(spec.strip())
+    if match is None:
+        raise ValueError("invalid render target: %s" % spec)
+    output = match.group("output")
+    if output is not None:
+        output = os.path.expanduser(output)
+    return RenderTarget(match.group("shell"), match.group("scope") != "-loc", match.group("arch"), output)
+
+PARALLEL_ENTRIES = 20000 # below this many entries a process pool costs more than it saves
+
+_render_job = None # (entries, targets, sep, select) for _render_group, inherited by forked workers
+
+def render(entries, targets, sep=":", select=None, processes=None):
+    """ Render the entries (a mapping of names to string values, e.g. the
+        root of a config) for each of targets (RenderTargets) in one pass,
+        and return the texts, in the order of targets.  Targets with an
+        output file are also written to it.
+
+        The entries are given unexpanded, and are expanded and cleaned
+        (with sep) once per distinct arch, as exp and clean would: for a
+        target with an arch ARCH is set to it first, the others keep the
+        ARCH of the entries.  Targets which only differ in shell syntax and
+        scope share that work and cost one formatting each.  select(keys)
+        returns the keys to render, in order (by default all of them,
+        sorted).
+
+        The arch groups are rendered in a process pool if there are several
+        and processes is more than 1, or if it is None and there are at
+        least PARALLEL_ENTRIES entries.
+    """
+    groups = []
+    byarch = {}
+    for (idx, target) in enumerate(targets):
+        if target.arch not in byarch:
+            byarch[target.arch] = []
+            groups.append((target.arch, byarch[target.arch]))
+        byarch[target.arch].append(idx)
+
+    global _render_job
+    _render_job = (entries, targets, sep, select or sorted)
+    results     = None
+    try:
+        if len(groups) > 1 and processes != 1 and (processes is not None or len(entries) >= PARALLEL_ENTRIES):
+            try:
+                import multiprocessing
+                pool = multiprocessing.Pool(min(processes or multiprocessing.cpu_count(), len(groups)))
+                try:
+                    results = pool.map(_render_group, groups)
+                finally:
+                    pool.close()
+                    pool.join()
+            except (ImportError, OSError), e:
+                logging.debug("rendering serially, no process pool: %s" % e)
+        if results is None:
+            results = [_render_group(group) for group in groups]
+    finally:
+        _render_job = None
+
+    texts = [None] * len(targets)
+    for result in results:
+        for (idx, text) in result:
+            texts[idx] = text
+    for (target, text) in zip(targets, texts):
+        if target.output is not None:
+            fh = open(target.output, "w")
+            try:
+                fh.write(utf8(text))
+            finally:
+                fh.close()
+    return texts
+
+def _render_group(group):
+    " [(index, text)] for the targets of one arch group of render() "
+    (arch, indices) = group
+    (entries, targets, sep, select) = _render_job
+    entries = dict(entries)
+    if arch is not None:
+        entries["ARCH"] = arch
+    entries.update(Expander(entries).expand())
+    for (k, v) in entries.items():
+        entries[k] = PathList(v, sep).render()
+    keys  = [k for k in select(entries.keys()) if isinstance(entries.get(k), basestring)]
+    texts = []
+    for idx in indices:
+        syntax = shell_syntax(targets[idx].shell, targets[idx].export)
+        texts.append((idx, "".join([env_line(syntax, k, entries[k]) + "\n" for k in keys])))
+    return texts
+
+class XcfgCLI:
+    """
+ foo=bar     : set foo to value bar
+ foo+=bar    : append  bar onto foo
+ foo++=bar   : prepend bar onto foo
+ foo-=bar    : remove all occurances of bar from foo
+ foo+=*bar   : append  bar onto foo, *=[:\\;]
+ foo++=*bar  : prepend bar onto foo, *=[:\\;]
+ foo-=*bar   : remove all occurances of distinct bar from foo, *=[:\\;]
+
+Lists are kept in order with one occurance of each item, the separator is
+the one set with sep= unless * gives it explicitly.
+    """
+
+    COMMANDS        = "e s p pp render diff base unset snap rollback layers load merge includes cache clean exp wl bl arch sh env loc reset stats profile daemon help exit".split()
+    SHELL_DEFAULT   = "bash"
+
+    def do_e(self, line=""):
+        """ e           : load os environment (read through, nothing is copied until it is changed)
+ e:foo,bar   : load os environment variables foo and bar (each may be NAME, PREFIX*, a glob or re:REGEX)
+"""
+        match = re.search("\s*(?P<sep>[-+=:\\;]{0,4})\s*(?P<last>.*)\s*", line)
+        sep   = match.group("sep")
+        last  = match.group("last")
+
+        if sep == "":
+            self.push(self.stack.environ("e"))
+        elif sep == ":":
+            patterns = [v.strip() for v in last.split(",") if v.strip()]
+            try:
+                KeySelector(patterns)
+            except ValueError, e:
+                self.failed(str(e))
+                return
+            for v in patterns:
+                if not _GLOB_RE.search(v) and not v.startswith("re:") and v not in os.environ:
+                    logging.debug("%s not found in environment" % v)
+            self.push(self.stack.environ("e:" + last.strip(), patterns))
+
+    def do_s(self, line=""):
+        """ s           : set os environment """
+        self.xcfg.s()
+
+    def do_p(self, line=""):
+        """ p           : print xcfg state (shell compatible syntax)
+ p:REGEX     : print xcfg state for keys that match REGEX (shell compatible syntax)
+"""
+        syntax = self.sh_syntax()
+
+        for k in self.selected(line, self.xcfg.keys()):
+            v = valuestr(self.xcfg[k])
+            if not isinstance(v, basestring):
+                continue # an element replaced this key, it has no value to print
+            print env_line(syntax, k, v)
+
+    def do_diff(self, line=""):
+        """ diff        : print only what differs from the environment (or base): changed entries, and unset for removed ones
+ diff:REGEX  : print only what differs from the environment (or base), for keys that match REGEX
+"""
+        syntax  = self.sh_syntax()
+        base    = self.base
+        if base is None:
+            base = os.environ
+        present = set(self.xcfg.keys())
+
+        for k in self.selected(line, present):
+            v = valuestr(self.xcfg[k])
+            if not isinstance(v, basestring) or base.get(k) == v:
+                continue
+            print env_line(syntax, k, v)
+
+        # with the whole environment loaded anything missing was removed,
+        # otherwise only what unset: removed
+        environ = False
+        unsets  = set()
+        for (label, kind, data) in self.stack.layers():
+            if kind == "env" and data[0] is None:
+                environ = True
+            elif kind == "unset":
+                unsets.update(data)
+        removed = [k for k in base.keys() if k not in present and
+                   (environ and k not in EnvOverlay.SKIP or k in unsets)]
+        unset   = self.unset_syntax()
+        for k in self.selected(line, removed):
+            print "%s %s" % (unset, k)
+
+    def selected(self, line, keys):
+        """ The keys to print, sorted: those matching p:REGEX or diff:REGEX if
+            line gives one, else those passing the black and white lists """
+        search=""
+        if line.find(":") >= 0:
+            parts  = line.split(":")
+            search = parts[1].strip()
+
+        keys = list(keys)
+        keys.sort()
+        if line != "": # check against explicit REGEX
+            try:
+                match = re.compile(search).search
+            except re.error, e:
+                self.failed("invalid pattern %s: %s" % (search, e))
+                return []
+            return [k for k in keys if match(k) is not None]
+        # check against black and white lists (KeySelectors)
+        if len(self.bl) > 0:
+            keys = [k for k in keys if k not in self.bl]
+        if len(self.wl) > 0:
+            keys = [k for k in keys if k in self.wl]
+        return keys
+
+    def do_unset(self, line=""):
+        """ unset:foo,bar : remove entries foo and bar (diff unsets them in the shell) """
+        match = re.search("\s*(?P<sep>[-+=:\\;]{0,4})\s*(?P<last>.*)\s*", line)
+        if match.group("sep") != ":":
+            return
+        keys = [k.strip() for k in match.group("last").split(",")]
+        self.push(self.stack.delete("unset:" + ",".join(keys), keys))
+
+    def do_base(self, line=""):
+        """ base        : diff against the environment as it is now
+ base:file   : diff against the environment saved in file (output of env or env -0)
+"""
+        match = re.search("\s*(?P<sep>[-+=:\\;]{0,4})\s*(?P<last>.*)\s*", line)
+        if match.group("sep") == ":":
+            filename = match.group("last").strip()
+            try:
+                self.base = read_environ(os.path.expanduser(filename))
+            except (IOError, OSError), e:
+                self.failed('read failed: %s (%s)' % (filename, e))
+        else:
+            self.base = dict(os.environ)
+
+    def do_render(self, line=""):
+        """ render:T1,T2 : print (or write) several targets in one pass, each SHELL[-loc][@ARCH][=FILE], e.g.
+               csh-loc                local csh variables, printed
+               bash@x86_64=x86_64.sh  ARCH=x86_64, written to x86_64.sh
+             every target is expanded and cleaned (exp and clean before render make no difference)
+"""
+        match = re.search("\s*(?P<sep>[-+=:\\;]{0,4})\s*(?P<last>.*)\s*", line)
+        if match.group("sep") != ":":
+            return self.invalid("render" + line)
+        try:
+            targets = [parse_target(spec) for spec in match.group("last").split(",") if spec.strip()]
+        except ValueError, e:
+            return self.failed(str(e))
+        cfg     = self.unexpanded()
+        entries = {}
+        for k in cfg.keys():
+            v = valuestr(cfg[k])
+            if isinstance(v, basestring):
+                entries[k] = v
+        texts = render(entries, targets, self.sep, lambda keys: self.selected("", keys))
+        for (target, text) in zip(targets, texts):
+            if target.output is None:
+                sys.stdout.write(utf8(text))
+
+    def unexpanded(self):
+        """ The config without the layers pushed by exp and clean, which
+            render does again for each arch """
+        layers = self.stack.layers()
+        if not [l for l in layers if l[1] == "set" and l[0] in ("exp", "clean")]:
+            return self.xcfg
+        stack = ConfigStack(nodetype=self.stack.nodetype)
+        for layer in layers:
+            if not (layer[1] == "set" and layer[0] in ("exp", "clean")):
+                stack = stack.push(*layer)
+        return stack.config()
+
+    def do_pp(self, line=""):
+        """ pp          : pretty print xcfg state (shell compatible syntax) """
+        self.do_p(line)
+
+    def do_load(self, line=""):
+        """ load:file   : load XConfig file
+ load:f1,f2  : load XConfig files f1, f2, ... (parsed in parallel, applied in order)
+"""
+        self.read(self.filearg(line), "load")
+        
+    def do_merge(self, line=""):
+        """ merge:file   : merge XConfig file
+ merge:f1,f2  : merge XConfig files f1, f2, ... (parsed in parallel, applied in order)
+"""
+        self.read(self.filearg(line), "merge")
+
+    def filearg(self, line):
+        " The file(s) of load:file or merge:file "
+        match = re.search("\s*(?P<sep>[-+=:\\;]{0,4})\s*(?P<last>.*)\s*", line)
+        return match.group("last").strip()
+
+    def do_includes(self, line=""):
+        """ includes:file : print the include tree of XConfig file (on stderr) """
+        match = re.search("\s*(?P<sep>[-+=:\;]{0,4})\s*(?P<last>.*)\s*", line)
+        if match.group("sep") != ":":
+            return
+        root  = os.path.abspath(os.path.expanduser(match.group("last").strip()))
+        graph = include_graph(root)
+        todo  = [(root, ())]
+        while todo:
+            (path, chain) = todo.pop()
+            note = ""
+            if path in chain:
+                note = " (cycle)"
+            elif graph.get(path) is None:
+                note = " (unreadable)"
+            sys.stderr.write("%s%s%s\n" % ("  " * len(chain), path, note))
+            if not note:
+                todo.extend([(child, chain + (path,)) for child in reversed(graph[path])])
+
+    def read_files(self, files):
+        " Load the files named on the command line "
+        if len(files) == 1:
+            self.loaded(self.stack.load(files[0], cache=self.cache), files)
+        else:
+            self.loaded(self.stack.load_many(files, cache=self.cache), files)
+
+    def read(self, files, mode):
+        " Read a file, or a comma separated list of files "
+        if files.find(",") < 0 or os.path.isfile(files):
+            self.loaded(self.stack.load(files, mode, self.cache), [files])
+        else:
+            files = files.split(",")
+            self.loaded(self.stack.load_many(files, mode, self.cache), files)
+
+    def loaded(self, stack, files):
+        """ Push stack, which has a layer on top of the current one for each
+            of files which could be read: the others count as errors (the
+            stack has logged them) """
+        pushed = 0
+        below  = stack
+        while below is not self.stack:
+            pushed += 1
+            below   = below.below
+        self.errors += len(files) - pushed
+        self.push(stack)
+
+    def do_cache(self, line=""):
+        """ cache       : print compiled cache hit/miss counters (on stderr)
+ cache=on    : keep compiled XConfig files next to the source files
+ cache=DIR   : keep compiled XConfig files in directory DIR
+ cache=off   : always parse XConfig files [default, see also $XCFG_CACHE]
+"""
+        match = re.search("\s*(?P<sep>[-+=:\\;]{0,4})\s*(?P<last>.*)\s*", line)
+        sep   = match.group("sep")
+        last  = match.group("last").strip()
+        if sep == "":
+            if self.cache is None:
+                sys.stderr.write("cache: off\n")
+            else:
+                sys.stderr.write("cache: %d hits, %d misses\n" % (self.cache.hits, self.cache.misses))
+        elif sep == "=":
+            if last in ("", "off", "0"):
+                self.cache = None
+            elif last in ("on", "1"):
+                self.cache = CompiledCache()
+            else:
+                self.cache = CompiledCache(os.path.expanduser(last))
+
+    def do_wl(self, line=""):
+        """ wl=foo      : white list foo for output (foo may be NAME, PREFIX*, a glob or re:REGEX)
+ wl+=foo     : append foo to white list
+ wl:file     : load white list from file (patterns separated by white space, # comments)
+"""
+        self.wl = self.keylist(self.wl, line)
+
+    def do_bl(self, line=""):
+        """ bl=foo      : black list foo from output (foo may be NAME, PREFIX*, a glob or re:REGEX)
+ bl+=foo     : append foo to black list
+ bl:file     : load black list from file (patterns separated by white space, # comments)
+"""
+        self.bl = self.keylist(self.bl, line)
+
+    def keylist(self, selector, line):
+        " The white or black list selector after wl/bl line "
+        match = re.search("\s*(?P<sep>[-+=:\\;]{0,4})\s*(?P<last>.*)\s*", line)
+        sep   = match.group("sep")
+        last  = match.group("last").strip()
+        try:
+            if sep == "=":
+                selector = KeySelector([last])
+            elif sep == "+=":
+                selector.add(last)
+            elif sep == ":":
+                loaded = KeySelector()
+                try:
+                    loaded.load(os.path.expanduser(last))
+                except (IOError, OSError), e:
+                    self.failed('read failed: %s (%s)' % (last, e))
+                    return selector
+                selector = loaded
+        except ValueError, e:
+            self.failed(str(e))
+        return selector
+
+    def do_exp(self, line=""):
+        """ exp         : expand all environment variables (e.g. $FOO and ~)
+ exp:foo     : expand environment variable foo
+ exp:REGEX   : expand all environment variables that match REGEX
+"""
+        if line.find(":") >= 0:
+            self.push(self.stack.update("exp", self.xcfg.expanded(self.matching(line.split(":", 1)[1].strip()))))
+        else:
+            self.push(self.stack.update("exp", self.xcfg.expanded()))
+
+    def do_clean(self, line=""):
+        """ clean       : clean all environment variables (single occurance of each item)
+ clean:foo   : clean environment variable foo
+ clean:REGEX : clean all environment variables that match REGEX
+"""
+        if line.find(":") >= 0:
+            self.push(self.stack.update("clean", self.xcfg.cleaned(self.sep, self.matching(line.split(":", 1)[1].strip()))))
+        else:
+            self.push(self.stack.update("clean", self.xcfg.cleaned(self.sep)))
+
+    def do_arch(self, line=""):
+        """ arch        : set ARCH based on uname """
+        self.push(self.stack.update("arch", {"ARCH": host_arch()}))
+
+    def do_sh(self, line=""):
+        """ sh=shell    : set shell syntax to shell """
+        parts       = line.split("=")
+        self.shell  = parts[1].strip()
+
+    def do_sep(self, line=""):
+        """ sep=[:;,]    : set separator for lists"""
+        parts       = line.split("=")
+        self.sep    = parts[1].strip()
+
+    def do_env(self, line=""):
+        """ env         : use environment export [default] """
+        self.EXPORT_ENV = True
+
+    def do_loc(self, line=""):
+        """ loc         : use local shell export """
+        self.EXPORT_ENV = False
+
+    def do_reset(self, line=""):
+        """ reset       : reset internal state (dict and xcfg) """
+        self.d          = {} # dictionary of entries
+        self.wl         = KeySelector() # white list of entries to print
+        self.bl         = KeySelector() # black list of entries to suppress
+        self.sep        = ":"
+        self.push(ConfigStack()) # the config, as layers, see push()
+        self.snaps      = {}    # name -> ConfigStack saved by snap
+        self.EXPORT_ENV = True
+        self.base       = None  # environment diff compares with, None for os.environ
+
+    def do_snap(self, line=""):
+        """ snap        : save the config state (O(1), see rollback)
+ snap=NAME   : save the config state as NAME
+"""
+        match = re.search("\s*(?P<sep>[-+=:\\;]{0,4})\s*(?P<last>.*)\s*", line)
+        self.snaps[match.group("last").strip()] = self.stack.snapshot()
+
+    def do_rollback(self, line=""):
+        """ rollback    : go back to the config state saved by snap
+ rollback=NAME : go back to the config state saved by snap=NAME
+"""
+        match = re.search("\s*(?P<sep>[-+=:\\;]{0,4})\s*(?P<last>.*)\s*", line)
+        name  = match.group("last").strip()
+        if name not in self.snaps:
+            return self.failed("no snap named [%s]" % name)
+        self.push(self.snaps[name])
+
+    def do_layers(self, line=""):
+        """ layers      : print the layers of the config state, bottom first (on stderr) """
+        for (label, kind, data) in self.stack.layers():
+            sys.stderr.write("%-6s %s\n" % (kind, label))
+
+    def push(self, stack):
+        """ Make stack the config state.  Commands never change the config,
+            they push a layer on the stack, and self.xcfg is the stack
+            flattened when it is next needed (see __getattr__). """
+        self.stack    = stack
+        self.listedit = None # (stack, line, edits) of the list edit layer, see pathlist()
+        self.__dict__.pop("xcfg", None)
+
+    def __getattr__(self, name):
+        if name == "xcfg":
+            self.xcfg = self.stack.config()
+            return self.xcfg
+        raise AttributeError(name)
+
+    def do_stats(self, line=""):
+        """ stats       : print per command calls, seconds, keys touched and bytes printed (on stderr)
+ stats=on    : count, and print the counters on stderr when the command line is done
+ stats=FILE  : count, and write the counters to FILE as JSON when the command line is done
+ stats=off   : stop counting [default, see also $XCFG_STATS]
+"""
+        match = re.search("\s*(?P<sep>[-+=:\\;]{0,4})\s*(?P<last>.*)\s*", line)
+        sep   = match.group("sep")
+        last  = match.group("last").strip()
+        if sep == "":
+            if self.stats is None:
+                sys.stderr.write("stats: off\n")
+            else:
+                self.stats.report()
+        elif sep == "=":
+            if last in ("", "off", "0"):
+                self.stats = None
+                if "onecmd" in self.__dict__:
+                    del self.onecmd
+                return
+            output = None
+            if last not in ("on", "1"):
+                output = os.path.expanduser(last)
+            if self.stats is None:
+                self.stats  = CommandStats(output)
+                self.onecmd = self.measured_onecmd # instead of testing self.stats on every command
+            else:
+                self.stats.output = output
+
+    def do_profile(self, line=""):
+        """ profile=CMD : run command CMD (e.g. load, exp, p) under cProfile, print the profile (on stderr)
+ profile+=CMD: profile command CMD too
+"""
+        match = re.search("\s*(?P<sep>[-+=:\\;]{0,4})\s*(?P<last>.*)\s*", line)
+        sep   = match.group("sep")
+        names = [name.strip() for name in match.group("last").split(",") if name.strip()]
+        if sep == "":
+            return
+        if self.stats is None:
+            self.do_stats("= on")
+        if sep == "=":
+            self.stats.profile = names
+        elif sep == "+=":
+            self.stats.profile.extend(names)
+
+    def measured_onecmd(self, line):
+        " onecmd() accounted for in self.stats, see do_stats "
+        name = re.match(r"\s*(\w*)", line).group(1)
+        if name == "stats":
+            return self.__class__.onecmd(self, line)
+        if not hasattr(self, "do_" + name):
+            name = "default"
+        return self.stats.measure(self, name, self.__class__.onecmd, self, line)
+
+    def do_daemon(self, line=""):
+        """ daemon      : serve xcfg commands on a Unix socket (see xcfgc.py)
+ daemon=PATH : serve xcfg commands on the Unix socket PATH [default: $XCFG_SOCKET]
+"""
+        match = re.search("\s*(?P<sep>[-+=:\\;]{0,4})\s*(?P<last>.*)\s*", line)
+        path  = match.group("last").strip()
+        if path == "":
+            path = socket_path()
+        try:
+            XcfgServer(os.path.expanduser(path)).serve()
+        except EnvironmentError, e: # socket.error included
+            self.failed("daemon failed: %s" % e)
+
+    def do_exit(self, line=""):
+        """ exit        : exit xcfg """
+        sys.exit(0)
+
+    def do_EOF(self, line=""):
+        " End of input (^D) leaves the interactive mode "
+        print
+        return True
+
+    def do_help(self, cmd):
+        """ help        : print help """
+        funcname = "do_%s" % cmd
+        if funcname in dir(self):
+            func = getattr(self, funcname)
+            if hasattr(func, "__doc__"):
+                print getattr(func, "__doc__")
+        else:
+            for cmd in self.COMMANDS:
+                attr = "do_%s" % cmd
+                if not attr.startswith("do_"): continue
+                func = getattr(self, attr)
+                if hasattr(func, "__doc__"):
+                    print getattr(func, "__doc__")
+            print self.__doc__
+
+    def default(self, line):
+        match = re.search("(?P<first>\w+)\s*(?P<sep>[-+=:\\;]{0,4})\s*(?P<last>.*)\s*", line)
+        if match is None:
+            return self.invalid(line)
+        first = match.group("first")
+        sep   = match.group("sep")
+        last  = match.group("last")
+        op    = re.match(r"(\+\+=|\+=|-=|=)?(.*)", sep)
+        (sep, extra) = (op.group(1), op.group(2))
+        listsep = self.sep
+        if extra in (":", ";", "\\") and sep != "=":
+            listsep = extra         # foo+=:bar, explicit list separator
+        else:
+            last = extra + last     # e.g. CFLAGS+=-O2, the rest is value
+        if sep == "=":
+            self.push(self.stack.update(line, {first: last}))
+        elif sep in ("+=", "++=", "-="):
+            value = self.pathlist(first, listsep, line)
+            if sep == "+=":
+                value.extend(last.split(listsep))
+            elif sep == "++=":
+                value.extendleft(last.split(listsep))
+            else:
+                for item in last.split(listsep):
+                    value.remove(item)
+        else:
+            self.invalid(line)
+
+    def failed(self, message):
+        """ Report that a command failed: message is logged at error level,
+            and counted in self.errors (see batch) """
+        logging.error(message)
+        self.errors += 1
+
+    def invalid(self, line):
+        """ A line which is neither a command nor an assignment: an error in
+            a script (see batch), ignored otherwise """
+        if self.strict:
+            self.failed("invalid command: %s" % line)
+        else:
+            logging.debug("Invalid syntax: [%s]" % line)
+
+    def pathlist(self, key, sep, line):
+        """ The PathList of key, split on sep, for the list edit line to
+            change in place.  Consecutive edits of key share one layer: while
+            the layer pushed for the last edit is on top and not kept by
+            snap, nothing else can see its PathList, so it is edited in place
+            (as is the flattened tree holding it) and each edit is O(1).
+            Otherwise the value is copied into a new PathList in a new layer.
+        """
+        stack = self.stack
+        if self.listedit is not None and self.listedit[0] is stack and not stack.kept:
+            (label, kind, data) = stack.layer
+            value = data.get(key)
+            if data.keys() == [key] and isinstance(value, PathList) and value.sep == sep:
+                count = self.listedit[2] + 1
+                self.listedit = (stack, self.listedit[1], count)
+                stack.layer   = ("%s (+%d)" % (self.listedit[1], count), kind, data)
+                return value
+        value = self.xcfg.get(key, "")
+        if not isleaf(value):
+            value = ""
+        value = PathList(valuestr(value), sep)
+        self.push(stack.update(line, {key: value}))
+        self.listedit = (self.stack, line, 0)
+        return value
+
+    def matching(self, search):
+        " The key named search, or if there is no such key, all keys matching REGEX search "
+        keys = self.xcfg.keys()
+        if search in keys:
+            return [search]
+        try:
+            pattern = re.compile(search)
+        except re.error, e:
+            self.failed("invalid pattern %s: %s" % (search, e))
+            return []
+        return [k for k in keys if pattern.search(k)]
+
+    def shell_name(self):
+        " The shell to print for: set by sh=, else guessed from $SHELL "
+        if hasattr(self, "shell"):
+            shell = self.shell
+        elif os.environ.has_key("SHELL"):
+            shell_path = os.environ["SHELL"]
+            if shell_path.find("csh") > 0:
                 shell = "csh"
             else:
                 shell = self.SHELL_DEFAULT
         else:
             shell = self.SHELL_DEFAULT
-        
-        wrap = '"'
-        if shell == "csh":
-            if self.EXPORT_ENV:
-                pre="setenv "
-                mid=" "
-            else:
-                pre="set "
-                mid="="
-        else: # default to bash syntax
-            mid="="
-            if self.EXPORT_ENV:
-                pre="export "
-            else:
-                pre=""
+        return shell
 
-        return (pre, mid, wrap)
+    def unset_syntax(self):
+        " The command removing a variable, in the syntax of sh_syntax() "
+        if self.shell_name() == "csh" and self.EXPORT_ENV:
+            return "unsetenv"
+        return "unset"
 
-    def __init__(self):
+    def sh_syntax(self):
+        " (pre, mid, wrap) for the shell set by sh= and the scope set by env/loc "
+        return shell_syntax(self.shell_name(), self.EXPORT_ENV)
+
+    def onecmd(self, line):
+        """ Run one command line: the leading word names the command, as with
+            cmd.Cmd, anything else goes to default() """
+        line  = line.strip()
+        match = re.match(r"\w*", line)
+        func  = getattr(self, "do_" + match.group(0), None)
+        if match.group(0) == "" or func is None:
+            return self.default(line)
+        return func(line[match.end():].strip())
+
+    def cmdloop(self, intro=None):
+        " Interactive mode, with the line editing and completion of cmd.Cmd "
+        import cmd
+        try:
+            import readline
+        except:
+            pass # this just reduces some of the CLI features that are available
+        class InteractiveCLI(self.__class__, cmd.Cmd):
+            onecmd = cmd.Cmd.onecmd.im_func
+        self.__class__ = InteractiveCLI
         cmd.Cmd.__init__(self)
+        cmd.Cmd.cmdloop(self, intro)
+
+    def __init__(self):
+        self.errors = 0 # commands which failed, see failed()
         self.do_reset()
+        self.cache = None
+        self.do_cache("= " + os.environ.get("XCFG_CACHE", "off"))
+        self.stats = None
+        self.strict = False # scripts report invalid commands as errors
+        if os.environ.get("XCFG_STATS"):
+            self.do_stats("= " + os.environ["XCFG_STATS"])
+        if os.environ.get("XCFG_PROFILE"):
+            self.do_profile("= " + os.environ["XCFG_PROFILE"])
         
 
+def read_environ(filename):
+    """ The environment saved in filename by env (one NAME=value a line,
+        lines without = continue the previous value) or env -0 """
+    fh = open(filename)
+    try:
+        data = fh.read()
+    finally:
+        fh.close()
+    environ = {}
+    if data.find("\0") >= 0:
+        for entry in data.split("\0"):
+            if entry.find("=") > 0:
+                (k, v) = entry.split("=", 1)
+                environ[k] = v
+        return environ
+    k = None
+    for entry in data.splitlines():
+        match = re.match(r"([A-Za-z_][A-Za-z0-9_]*)=(.*)", entry)
+        if match is not None:
+            (k, v) = match.groups()
+            environ[k] = v
+        elif k is not None:
+            environ[k] += "\n" + entry
+    return environ
+
+def run(cli, args):
+    """ Run the command line arguments args (without the program name) in
+        cli: leading -f script options run those scripts (- is stdin, see
+        batch), leading arguments naming files are read next, then each
+        argument is run as a command.  Files alone are read and printed.
+        Exits with status 1 if a script had errors.
+    """
+    args    = list(args)
+    errors  = 0
+    scripts = False
+    while len(args) > 1 and args[0] == "-f":
+        errors += run_script(cli, args[1])
+        scripts = True
+        del args[:2]
+    files = []
+    while args and os.path.isfile(args[0]):
+        files.append(args.pop(0))
+    found_file = len(files) > 0
+    if found_file and cli.stats is not None:
+        cli.stats.measure(cli, "load", cli.read_files, files)
+    elif found_file:
+        cli.read_files(files)
+
+    if args: # there are still commands left, so continue with them
+        for part in args:
+            cli.onecmd(part)
+    else: # it was just a list of files to read in
+        if found_file:
+            cli.onecmd("arch")
+            cli.onecmd("exp")
+            cli.onecmd("clean")
+            cli.onecmd("p")
+        elif not scripts: # nothing left, and no files found, so just print help
+            cli.onecmd("help")
+    if cli.stats is not None:
+        cli.stats.finish()
+    if errors:
+        sys.exit(1)
+
+def run_script(cli, name):
+    " batch() the script file name (- for stdin) in cli, return the number of errors "
+    if name == "-":
+        return batch(cli, sys.stdin, "<stdin>")
+    try:
+        fh = open(os.path.expanduser(name))
+    except IOError, e:
+        logging.error("script failed: %s (%s)" % (name, e))
+        return 1
+    try:
+        return batch(cli, fh, name)
+    finally:
+        fh.close()
+
+def interact(cli, fh):
+    """ Run the lines read from fh in cli as the interactive mode would,
+        each as one command (load : s1.xcfg, sh = bash), but without its
+        prompt: this is what commands piped into xcfg get.  Scripts in the
+        command line syntax are run by -f (see batch).
+    """
+    for line in fh:
+        if line.strip() != "" and cli.onecmd(line):
+            break
+
+class ScriptFilter(logging.Filter):
+    " Prefixes what is logged while a script runs with the script line "
+
+    def __init__(self):
+        logging.Filter.__init__(self)
+        self.where  = None
+
+    def filter(self, record):
+        if self.where is not None:
+            record.msg  = "%s: %s" % (self.where, record.getMessage())
+            record.args = ()
+        return True
+
+def script_line(line):
+    """ The commands of a script line and where their output goes, as
+        (commands, file or None, append) """
+    import shlex
+    words    = shlex.split(line, comments=True)
+    commands = []
+    target   = None
+    append   = False
+    while words:
+        word = words.pop(0)
+        if word.startswith(">"):
+            append = word.startswith(">>")
+            target = word.lstrip(">") or (words and words.pop(0)) or None
+            if target is None:
+                raise ValueError("no file after %s" % word)
+        else:
+            commands.append(word)
+    return (commands, target, append)
+
+def batch(cli, fh, name="<script>"):
+    """ Run the xcfg script read from fh in cli, non-interactively.  Each
+        line holds commands as they are given to xcfg on the command line,
+        quoted as in the shell, with # comments:
+
+            load:site.xcfg e PATH+=/opt/bin
+            sh=bash p > env.sh
+            sh=csh p:^PATH > env.csh
+
+        "> file" (or ">> file" to append) sends what the commands of its
+        line print to file.  Errors, including invalid commands, are
+        logged as name:line: message, at error level, and the script
+        carries on.  Returns the number of errors, which are counted as
+        they happen (by cli.failed() and here), whatever the log level.
+    """
+    report = ScriptFilter()
+    logger = logging.getLogger()
+    logger.addFilter(report)
+    strict = cli.strict
+    cli.strict = True
+    errors = cli.errors
+    try:
+        lineno = 0
+        for line in fh:
+            lineno += 1
+            report.where = "%s:%d" % (name, lineno)
+            try:
+                (commands, target, append) = script_line(line)
+                out = None
+                if target is not None:
+                    out = open(os.path.expanduser(target), append and "a" or "w")
+                    (stdout, sys.stdout) = (sys.stdout, out)
+                try:
+                    for command in commands:
+                        cli.onecmd(command)
+                finally:
+                    if out is not None:
+                        sys.stdout = stdout
+                        out.close()
+            except Exception, e:
+                cli.failed("%s: %s" % (e.__class__.__name__, e))
+    finally:
+        logger.removeFilter(report)
+        cli.strict = strict
+    return cli.errors - errors
+
+def socket_path():
+    " The xcfg daemon socket, see xcfgc.socket_path() "
+    import xcfgc
+    return xcfgc.socket_path()
+
+class XcfgServer:
+    """ Runs xcfg command lines for clients on a Unix socket, keeping the
+        parsed XConfig files in a ResidentCache between requests.
+
+        A request is the marshalled tuple (args, environ, cwd) of a client
+        command line, and the client closes its side once it is sent.  Each
+        request runs in a fresh XcfgCLI, as run() would from the command
+        line, with the environment and working directory of the client.  The
+        reply is the marshalled tuple (status, stdout, stderr).  Requests are
+        served one at a time.  The socket is only accessible to its owner,
+        in a directory nobody else can write to, and the daemon refuses to
+        start (or to remove a stale socket) if either isn't safely theirs.
+    """
+
+    def __init__(self, path):
+        self.path   = path
+        self.cache  = ResidentCache()
+        self.sock   = None
+
+    def bind(self):
+        import socket
+        import xcfgc
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.lexists(directory):
+            os.mkdir(directory, 0700)
+        problem = xcfgc.unsafe_dir(directory)
+        if problem is not None:
+            raise socket.error("refusing to listen in %s: %s" % (directory, problem))
+        if os.path.lexists(self.path):
+            problem = xcfgc.unsafe_socket(self.path)
+            if problem is not None:
+                raise socket.error("refusing to replace %s: %s" % (self.path, problem))
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                try:
+                    probe.connect(self.path)
+                except socket.error:
+                    os.unlink(self.path) # left over from a daemon that died
+                else:
+                    raise socket.error("xcfg daemon already running on %s" % self.path)
+            finally:
+                probe.close()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask     = os.umask(077)
+        try:
+            self.sock.bind(self.path)
+        finally:
+            os.umask(umask)
+        self.sock.listen(16)
+
+    def serve(self):
+        " Serve requests until interrupted "
+        self.bind()
+        import signal
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        logging.info("xcfg daemon listening on %s" % self.path)
+        try:
+            while True:
+                (conn, addr) = self.sock.accept()
+                try:
+                    try:
+                        request = marshal.loads(recvall(conn))
+                        conn.sendall(marshal.dumps(self.handle(*request)))
+                    except (EOFError, ValueError, TypeError), e:
+                        logging.error("bad request: %s" % e)
+                    except IOError, e:
+                        logging.debug("client went away: %s" % e)
+                finally:
+                    conn.close()
+        finally:
+            self.sock.close()
+            os.unlink(self.path)
+
+    def handle(self, args, environ, cwd):
+        " Run the command line args as the client would, return (status, stdout, stderr) "
+        from cStringIO import StringIO
+        out     = StringIO()
+        err     = StringIO()
+        saved   = (sys.stdout, sys.stderr, dict(os.environ), os.getcwd(), sys.stdin)
+        logger  = logging.getLogger()
+        handler = logging.StreamHandler(err)
+        if logger.handlers:
+            handler.setFormatter(logger.handlers[0].formatter)
+        handlers        = logger.handlers
+        logger.handlers = [handler]
+        status          = 0
+        try:
+            try:
+                os.chdir(cwd)
+                os.environ.clear()
+                os.environ.update(environ)
+                (sys.stdout, sys.stderr) = (out, err)
+                sys.stdin     = StringIO("") # -f - reads nothing, the client's stdin isn't sent
+                cli           = XcfgCLI()
+                cli.cache     = self.cache # cache=... in args still applies
+                cli.do_daemon = self.nested
+                run(cli, args)
+            except SystemExit, e:
+                status = e.code or 0
+            except Exception, e:
+                import traceback
+                traceback.print_exc(file=err)
+                status = 1
+        finally:
+            (sys.stdout, sys.stderr) = saved[:2]
+            sys.stdin = saved[4]
+            os.environ.clear()
+            os.environ.update(saved[2])
+            os.chdir(saved[3])
+            logger.handlers = handlers
+        if not isinstance(status, int):
+            err.write("%s\n" % status)
+            status = 1
+        return (status, out.getvalue(), err.getvalue())
+
+    def nested(self, line=""):
+        sys.stderr.write("xcfg: already running as a daemon\n")
+
+def recvall(conn):
+    " Everything conn sends until it closes its side "
+    chunks = []
+    while True:
+        data = conn.recv(65536)
+        if not data:
+            return "".join(chunks)
+        chunks.append(data)
+
 class SignalHandler:
     def __init__(self):
+        import signal
         signal.signal(signal.SIGINT, self)
         return
  
@@ -721,37 +4665,15 @@ class SignalHandler:
  
 if __name__ == '__main__':
 
+    setup_logging()
     bh          = SignalHandler()
     cli         = XcfgCLI()
     cli.prompt  = "xcfg: "
 
     if len(sys.argv) > 1:
-        found_file = False
-        cfg_fp = sys.argv[1]
-        while os.path.isfile(cfg_fp):
-            found_file = True
-            cli.xcfg.read(cfg_fp)
-            del(sys.argv[1]) # remove it from the arguments list
-            try:
-                cfg_fp = sys.argv[1]
-            except:
-                break
-
-        if len(sys.argv) > 1: # there are still commands left, so continue with them
-            for part in sys.argv[1:]:
-                match = re.search("(?P<first>\w+)(?P<sep>[-+=:\\;]{0,4})(?P<last>.*)", part)
-                first = match.group("first")
-                sep   = match.group("sep")
-                last  = match.group("last")
-                cli.onecmd("%s %s %s" % (first, sep, last))
-        else: # it was just a list of files to read in
-            if found_file:
-                cli.onecmd("arch")
-                cli.onecmd("exp")
-                cli.onecmd("clean")
-                cli.onecmd("p")
-            else: # nothing left, and no files found, so just print help
-                cli.onecmd("help")
+        run(cli, sys.argv[1:])
+    elif not sys.stdin.isatty(): # commands piped in, run them as if typed
+        interact(cli, sys.stdin)
     else:
         print "Type help for a list of commands"
         cli.cmdloop()                             
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+xcfgc: thin client for the xcfg daemon
+
+Runs an xcfg command line in a running xcfg daemon, which keeps the parsed
+XConfig files in memory, so that
+
+    eval `xcfgc load:s1.xcfg load:s2.xcfg p`
+
+only pays for starting a small interpreter and one round trip on a Unix
+socket.  Start the daemon with
+
+    xcfg daemon &
+
+If no daemon is listening (or there are no arguments, for the interactive
+mode, or a script is read from stdin with -f -) xcfgc runs xcfg.py itself,
+so it can always be used in place of xcfg.
+
+This module only imports what it needs to talk to the daemon, keep it that way.
+"""
+
+import os
+import sys
+import stat
+import errno
+import socket
+import marshal
+
+# Environment variables xcfg reads for itself, sent with every request
+ENVIRON_KEYS     = ("HOME", "SHELL", "PYLOG", "TMPDIR")
+# Commands which read the environment as a whole: e loads it, diff and base
+# compare with it, and exp and render resolve $VAR references from it
+ENVIRON_COMMANDS = ("e", "diff", "base", "exp", "render")
+
+def socket_path():
+    """ The xcfg daemon socket: $XCFG_SOCKET, or xcfg.sock in the private
+        directory socket_dir() """
+    return os.environ.get("XCFG_SOCKET") or os.path.join(socket_dir(), "xcfg.sock")
+
+def socket_dir():
+    """ $XDG_RUNTIME_DIR, or xcfg-UID in $TMPDIR (created mode 0700 by the
+        daemon) """
+    return os.environ.get("XDG_RUNTIME_DIR") or \
+        os.path.join(os.environ.get("TMPDIR", "/tmp"), "xcfg-%d" % os.getuid())
+
+def unsafe_dir(path):
+    """ Why the directory path can't be trusted to hold the daemon socket,
+        or None: it must be owned by this user (or root) and, unless it is
+        sticky like /tmp, writable by nobody else """
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        return "%s is not a directory" % path
+    if st.st_uid not in (os.getuid(), 0):
+        return "%s is owned by uid %d" % (path, st.st_uid)
+    if st.st_mode & 022 and not st.st_mode & stat.S_ISVTX:
+        return "%s is writable by others" % path
+    return None
+
+def unsafe_socket(path):
+    """ Why the daemon socket path can't be trusted, or None: it must be a
+        socket owned by this user, only accessible to them, in a safe
+        directory (see unsafe_dir).  Raises OSError if it doesn't exist. """
+    st = os.lstat(path)
+    if not stat.S_ISSOCK(st.st_mode):
+        return "%s is not a socket" % path
+    if st.st_uid != os.getuid():
+        return "%s is owned by uid %d" % (path, st.st_uid)
+    if st.st_mode & 077:
+        return "%s is accessible to others (mode %o)" % (path, stat.S_IMODE(st.st_mode))
+    return unsafe_dir(os.path.dirname(os.path.abspath(path)))
+
+def command_word(arg):
+    " The command an xcfg argument runs, as XcfgCLI.onecmd() reads it "
+    arg = arg.strip()
+    end = 0
+    while end < len(arg) and (arg[end].isalnum() or arg[end] == "_"):
+        end += 1
+    return (arg[:end], arg[end:].strip())
+
+def request_environ(args):
+    """ The part of the environment the xcfg command line args needs: all of
+        it if a command reads it as a whole (or a script, whose commands
+        aren't known here, or files alone, which are expanded), else only the
+        variables xcfg reads for itself and those named by e:NAME,... """
+    environ = os.environ
+    if "-f" in args or not [a for a in args if not os.path.isfile(a)]:
+        return dict(environ)
+    keys = list(ENVIRON_KEYS) + [k for k in environ if k.startswith("XCFG_")]
+    for arg in args:
+        (word, rest) = command_word(arg)
+        if word == "e" and rest.startswith(":"):
+            names = [n.strip() for n in rest[1:].split(",") if n.strip()]
+            for name in names:
+                if not (name.replace("_", "").isalnum() and name in environ):
+                    return dict(environ) # PREFIX*, a glob or re:REGEX
+            keys.extend(names)
+        elif word == "base" and rest.startswith((":", "=")):
+            continue # compares with a saved environment
+        elif word in ENVIRON_COMMANDS:
+            return dict(environ)
+    return dict([(k, environ[k]) for k in keys if k in environ])
+
+def request(args, path=None):
+    """ Run the xcfg command line args in the daemon listening on path and
+        return (status, stdout, stderr).  Raises socket.error if there is no
+        daemon, or with errno EPERM if the socket is not safely this user's
+        (see unsafe_socket), before anything is sent.
+    """
+    path = path or socket_path()
+    try:
+        problem = unsafe_socket(path)
+    except OSError, e:
+        raise socket.error(e.errno, e.strerror)
+    if problem is not None:
+        raise socket.error(errno.EPERM, problem)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        sock.sendall(marshal.dumps((list(args), request_environ(args), os.getcwd())))
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            chunks.append(data)
+    finally:
+        sock.close()
+    if not chunks:
+        raise socket.error("xcfg daemon closed the connection")
+    return marshal.loads("".join(chunks))
+
+def fallback(args):
+    " Run xcfg.py in this process' place "
+    xcfg = os.path.join(os.path.dirname(os.path.abspath(__file__)), "xcfg.py")
+    os.execv(sys.executable, [sys.executable, xcfg] + list(args))
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if not args or "-" in args: # stdin isn't sent to the daemon
+        fallback(args)
+    try:
+        (status, out, err) = request(args)
+    except socket.error, e:
+        if e.errno == errno.EPERM:
+            sys.stderr.write("xcfgc: not using the daemon: %s\n" % e.strerror)
+        fallback(args)
+    sys.stdout.write(out)
+    sys.stderr.write(err)
+    sys.exit(status)